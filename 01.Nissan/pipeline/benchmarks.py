@@ -0,0 +1,319 @@
+"""
+Benchmark suite: time and memory of the pipeline stages at several scales.
+
+Cases (one stage each; its input is prepared once per scale, not timed):
+- synthetic data: generate_synthetic_warranty_data, synthetic_warranty_rows
+- demo pipeline: clean_data → build_features → classify → export_results
+- Nissan rules on generated production-schema rows (pipeline.nissan_synthetic):
+  BR Contract check (7.7), subpart filter (8.2), Power BI aggregate (9,
+  claims store write + materialized view)
+
+Each case runs `repeats` times untraced (the fastest run is kept) and once
+more under tracemalloc for its Python / numpy peak (py_peak_mb); records
+come from pipeline.run_profile.profile_stage and are saved the same way
+as the run log (save_profile). A result regresses against the baseline
+when wall_s or py_peak_mb grows by more than the threshold and by more
+than MIN_DELTA (so millisecond / sub-MB noise is not reported).
+
+CLI (from 01.Nissan):
+    python -m pipeline.benchmarks --scales 10k 1M            # compare with the baseline
+    python -m pipeline.benchmarks --scales 10k --update-baseline
+Exit code 1 when a case regressed.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pipeline.claims_store import materialize_claims, write_claims_months
+from pipeline.classifier import classify
+from pipeline.clean_normalize import clean_data
+from pipeline.date_normalize import clean_vehicle_mfd_column
+from pipeline.exporter import export_results
+from pipeline.feature_engineering import build_features
+from pipeline.load_data import load_synthetic_data
+from pipeline.nissan_rules import apply_subpart_filter, check_burden_ratio_frame
+from pipeline.nissan_synthetic import (
+    EZKL_CATALOGUE,
+    NISSAN_CONTRACTS,
+    SUBPARTS,
+    TEMPLATE_COLUMNS,
+    generate_nissan_sheets,
+)
+from pipeline.part_groups import build_prefix_index
+from pipeline.run_profile import profile_stage, profile_table, save_profile
+from pipeline.synthetic_data import generate_synthetic_warranty_data, synthetic_warranty_rows
+
+# Named data scales (rows); plain integers work as well
+BENCHMARK_SCALES = {"10k": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+
+# Baseline kept next to the code (one record per case and scale)
+DEFAULT_BASELINE = Path(__file__).resolve().parents[1] / "benchmarks" / "baseline.json"
+
+# Relative growth that counts as a regression, and the absolute floor per metric
+REGRESSION_THRESHOLD = 0.25
+MIN_DELTA = {"wall_s": 0.02, "py_peak_mb": 2.0}
+
+CLAIM_DATE = pd.Timestamp("2025-11-01")
+
+
+# ============================================================
+# INPUTS (prepared once per scale)
+# ============================================================
+
+def nissan_rule_rows(n_rows: int, random_state: int = 0) -> pd.DataFrame:
+    """
+    About n_rows rows of the monthly objection file, with the columns the
+    7.7 / 8.2 rules read as they are after section 6: EZKL Name from the
+    Bosch P/N, contract burden ratios merged, SAP Date, Vehicle MFD parsed.
+    """
+    # ~1.6 rows per claim (main part + subparts)
+    sheets = generate_nissan_sheets(
+        CLAIM_DATE, n_ps_rows=1_000, n_new_claims=max(20, round(n_rows / 1.6)), random_state=random_state
+    )
+    df = sheets["new"]
+
+    ezkl_by_prefix = {entry[0]: name for name, entry in EZKL_CATALOGUE.items()}
+    contracts = pd.DataFrame(
+        [(ezkl, standard, current, pd.Timestamp(since)) for ezkl, (standard, current, since) in NISSAN_CONTRACTS.items()],
+        columns=["EZKL Name", "Standard Burden Ratio", "Current Burden Ratio", "New BR Date"],
+    )
+    df["EZKL Name"] = df["Bosch Parts No."].str[:7].map(ezkl_by_prefix)
+    df = df.merge(contracts, on="EZKL Name", how="left")
+    df["Bosch Parts Name"] = df["Bosch Parts Name"].str.lower()
+    df["SAP Date"] = df["EDP Date"]
+    df["Vehicle MFD"] = clean_vehicle_mfd_column(df["Vehicle MFD"])
+    return df
+
+
+def _nissan_results(rows: pd.DataFrame) -> pd.DataFrame:
+    """Monthly results for the aggregate: template columns, AI_DATE, a claim decision."""
+    results = rows.assign(AI_DATE=CLAIM_DATE, claim=(rows["Total Claimed Amount"] > 100_000).astype(int))
+    return results[[c for c in TEMPLATE_COLUMNS if c in results.columns]]
+
+
+INPUTS = {
+    "demo_raw": lambda n, get: load_synthetic_data(n),
+    "demo_clean": lambda n, get: clean_data(get("demo_raw")),
+    "demo_features": lambda n, get: build_features(get("demo_clean")),
+    "demo_scored": lambda n, get: classify(get("demo_features")),
+    "nissan_rows": lambda n, get: nissan_rule_rows(n),
+    "nissan_results": lambda n, get: _nissan_results(get("nissan_rows")),
+}
+
+
+# ============================================================
+# CASES
+# ============================================================
+
+_SUBPART_INDEX = build_prefix_index(list(SUBPARTS.items()), verbose=False)
+
+
+def _claims_aggregate(results: pd.DataFrame, work_dir: Path) -> pd.DataFrame:
+    write_claims_months(results, work_dir / "store", verbose=False)
+    all_claims, _ = materialize_claims(work_dir / "store", work_dir / "AI_validated_claims.parquet", formats=("parquet",))
+    return all_claims
+
+
+# name, input (INPUTS key or None), run(data, n_rows, work_dir)
+BENCHMARK_CASES = [
+    {"name": "generate_synthetic_warranty_data", "input": None, "run": lambda data, n, work: generate_synthetic_warranty_data(n)},
+    {"name": "synthetic_warranty_rows", "input": None, "run": lambda data, n, work: synthetic_warranty_rows(0, n, n)},
+    {"name": "clean_data", "input": "demo_raw", "run": lambda data, n, work: clean_data(data)},
+    {"name": "build_features", "input": "demo_clean", "run": lambda data, n, work: build_features(data)},
+    {"name": "classify", "input": "demo_features", "run": lambda data, n, work: classify(data)},
+    {"name": "export_results", "input": "demo_scored", "run": lambda data, n, work: export_results(data, work / "results.csv")},
+    {"name": "check_burden_ratio_frame", "input": "nissan_rows", "run": lambda data, n, work: check_burden_ratio_frame(data)},
+    {
+        "name": "apply_subpart_filter",
+        "input": "nissan_rows",
+        "run": lambda data, n, work: apply_subpart_filter(data, _SUBPART_INDEX),
+    },
+    {"name": "claims_aggregate", "input": "nissan_results", "run": lambda data, n, work: _claims_aggregate(data, work)},
+]
+
+
+def parse_scale(scale) -> int:
+    """'10k' / '1M' / '10M' (BENCHMARK_SCALES) or a row count."""
+    if isinstance(scale, str) and scale in BENCHMARK_SCALES:
+        return BENCHMARK_SCALES[scale]
+    return int(scale)
+
+
+def _rows(value) -> int | None:
+    return len(value) if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)) else None
+
+
+def _timed(case: dict, data, n_rows: int, work_dir, trace: bool) -> dict:
+    """One profiled run of a case in a fresh work directory."""
+    records = []
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        if trace:
+            tracemalloc.start()
+        try:
+            with profile_stage(records, case["name"], rows_in=_rows(data) or n_rows) as record:
+                record["rows_out"] = _rows(case["run"](data, n_rows, Path(tmp)))
+        finally:
+            if trace:
+                tracemalloc.stop()
+    return records[0]
+
+
+def run_benchmarks(
+    scales=("10k",),
+    cases=None,
+    repeats: int = 3,
+    trace_memory: bool = True,
+    work_dir=None,
+    verbose: bool = True,
+) -> list[dict]:
+    """
+    Run the cases (names, default all) at every scale. Returns one record
+    per (case, scale): best-of-repeats wall_s / cpu_s, py_peak_mb from a
+    traced run (trace_memory), rows and scale.
+    """
+    selected = [case for case in BENCHMARK_CASES if cases is None or case["name"] in cases]
+    unknown = set(cases or []) - {case["name"] for case in BENCHMARK_CASES}
+    if unknown:
+        raise ValueError(f"Unknown benchmark cases {sorted(unknown)} (use {[c['name'] for c in BENCHMARK_CASES]})")
+
+    results = []
+    for scale in scales:
+        n_rows = parse_scale(scale)
+        prepared = {}
+
+        def get(name):
+            if name not in prepared:
+                prepared[name] = INPUTS[name](n_rows, get)
+            return prepared[name]
+
+        for case in selected:
+            data = get(case["input"]) if case["input"] else None
+            runs = [_timed(case, data, n_rows, work_dir, trace=False) for _ in range(repeats)]
+            best = min(runs, key=lambda record: record["wall_s"])
+            record = {**best, "scale": str(scale), "repeats": repeats}
+            if trace_memory:
+                record["py_peak_mb"] = _timed(case, data, n_rows, work_dir, trace=True)["py_peak_mb"]
+            results.append(record)
+            if verbose:
+                print(
+                    f"{case['name']:<34} {scale:>5}  {record['wall_s']:>8.3f}s"
+                    + (f"  {record['py_peak_mb']:>8.1f} MB" if trace_memory else "")
+                )
+        prepared.clear()
+    return results
+
+
+# ============================================================
+# BASELINES
+# ============================================================
+
+def _environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def save_benchmarks(results: list[dict], path, **run_info) -> Path:
+    """Benchmark records as JSON (save_profile format, environment columns added)."""
+    return save_profile(results, path, **_environment(), **run_info)
+
+
+def load_benchmarks(path) -> pd.DataFrame:
+    """Saved benchmark records; empty when the file does not exist."""
+    path = Path(path)
+    if not path.exists():
+        return pd.DataFrame(columns=["stage", "scale"])
+    return pd.DataFrame(json.loads(path.read_text(encoding="utf-8")))
+
+
+def update_baseline(results: list[dict], path, **run_info) -> Path:
+    """Replace the baseline records of the (case, scale) pairs in results; keep the others."""
+    new = profile_table(results)
+    for key, value in {**_environment(), **run_info}.items():
+        new[key] = value
+    kept = load_benchmarks(path)
+    keys = set(zip(new["stage"], new["scale"].astype(str)))
+    if not kept.empty:
+        kept = kept[[(s, str(c)) not in keys for s, c in zip(kept["stage"], kept["scale"])]]
+    merged = pd.concat([kept, new], ignore_index=True) if not kept.empty else new
+    return save_profile(merged.to_dict("records"), path)
+
+
+def compare_benchmarks(
+    results: list[dict],
+    baseline: pd.DataFrame,
+    threshold: float = REGRESSION_THRESHOLD,
+    min_delta: dict = MIN_DELTA,
+) -> pd.DataFrame:
+    """
+    One row per (case, scale, metric) found in both results and baseline:
+    baseline / current value, ratio and 'regression' (current grew by more
+    than threshold and by more than min_delta[metric]).
+    """
+    columns = ["stage", "scale", "metric", "baseline", "current", "ratio", "regression"]
+    current = profile_table(results)
+    if current.empty or baseline.empty:
+        return pd.DataFrame(columns=columns)
+    current["scale"] = current["scale"].astype(str)
+    baseline = baseline.assign(scale=baseline["scale"].astype(str))
+
+    rows = []
+    for metric, floor in min_delta.items():
+        if metric not in current.columns or metric not in baseline.columns:
+            continue
+        joined = current[["stage", "scale", metric]].merge(
+            baseline[["stage", "scale", metric]], on=["stage", "scale"], suffixes=("", "_baseline")
+        ).dropna()
+        for stage, scale, now, before in joined.itertuples(index=False):
+            ratio = now / before if before else np.inf
+            regression = now > before * (1 + threshold) and now - before > floor
+            rows.append((stage, scale, metric, before, now, round(ratio, 2), regression))
+    return pd.DataFrame(rows, columns=columns)
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", nargs="+", default=["10k"], help="10k / 1M / 10M or row counts")
+    parser.add_argument("--cases", nargs="+", help="case names (default: all)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--out", help="also save this run's records (JSON)")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scales, args.cases, repeats=args.repeats, trace_memory=not args.no_memory)
+    if args.out:
+        save_benchmarks(results, args.out)
+
+    comparison = compare_benchmarks(results, load_benchmarks(args.baseline), threshold=args.threshold)
+    if not comparison.empty:
+        print(comparison.to_string(index=False))
+    regressions = comparison[comparison["regression"]]
+    if args.update_baseline:
+        print("Baseline updated:", update_baseline(results, args.baseline))
+        return 0
+    if len(regressions):
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%} vs {args.baseline}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
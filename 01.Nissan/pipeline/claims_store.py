@@ -0,0 +1,168 @@
+"""
+Partitioned store for the AI_validated_claims aggregate (section 9).
+
+The aggregate is kept as one partition per AI_DATE (Parquet snapshot +
+JSON manifest, see pipeline.excel_cache) instead of one workbook that is
+read, edited and rewritten in full every month:
+- a monthly run rewrites only the partitions of its own AI_DATE(s)
+- the manifest is the commit point: new data goes to a new Parquet file,
+  then the manifest is replaced to point at it, then the old file is
+  removed. A crash mid-write leaves the previous version readable.
+- rows of a partition are stored sorted, and partitions are read newest
+  first, so the Power BI view is a plain concat (materialize_claims)
+"""
+
+import json
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+from pipeline.excel_cache import read_snapshot, write_snapshot
+from pipeline.exporter import export_table
+
+STORE_VERSION = 1
+
+# Power BI sort order of the aggregate (all descending)
+CLAIMS_SORT_COLUMNS = ["AI_DATE", "EZKL Name", "Total Claimed Amount"]
+
+# Partition key for rows without AI_DATE (kept last, like NaT in a sort)
+_NO_DATE = "none"
+
+
+# ============================================================
+# PARTITIONS
+# ============================================================
+
+def _partition_key(ai_date) -> str:
+    return _NO_DATE if pd.isna(ai_date) else pd.Timestamp(ai_date).strftime("%Y-%m-%d")
+
+
+def _manifest_path(store_dir: Path, key: str) -> Path:
+    return store_dir / f"ai_date={key}.json"
+
+
+def _read_manifest(store_dir: Path, key: str) -> dict | None:
+    path = _manifest_path(store_dir, key)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def stored_claim_dates(store_dir) -> list[str]:
+    """Partition keys in the store, newest AI_DATE first ('none' last)."""
+    store_dir = Path(store_dir)
+    prefix, suffix = "ai_date=", ".json"
+    keys = [p.name[len(prefix):-len(suffix)] for p in store_dir.glob(f"{prefix}*{suffix}")]
+    dated = sorted((k for k in keys if k != _NO_DATE), reverse=True)
+    return dated + [k for k in keys if k == _NO_DATE]
+
+
+def _remove_stale_files(store_dir: Path, key: str, keep: str | None) -> None:
+    """Parquet files of a partition not referenced by its manifest (old versions, crashed writes)."""
+    for path in store_dir.glob(f"ai_date={key}.*.parquet*"):
+        if path.name != keep:
+            path.unlink(missing_ok=True)
+
+
+def _sorted_month(df: pd.DataFrame, sort_by) -> pd.DataFrame:
+    by = [c for c in sort_by if c in df.columns]
+    if by:
+        df = df.sort_values(by=by, ascending=False)
+    return df.reset_index(drop=True)
+
+
+def write_claims_months(
+    df: pd.DataFrame,
+    store_dir,
+    sort_by=CLAIMS_SORT_COLUMNS,
+    verbose: bool = True,
+) -> pd.DataFrame:
+    """
+    Replace the partitions of every AI_DATE present in df with its rows
+    (other months are not touched). Returns one report row per partition.
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+
+    keys = df["AI_DATE"].map(_partition_key) if "AI_DATE" in df.columns else pd.Series(_NO_DATE, index=df.index)
+    rows = []
+    for key, month in df.groupby(keys, sort=False):
+        previous = _read_manifest(store_dir, key)
+        data_file = f"ai_date={key}.{uuid.uuid4().hex[:12]}.parquet"
+        write_snapshot(
+            _sorted_month(month, sort_by),
+            store_dir / data_file,
+            _manifest_path(store_dir, key),
+            {"store_version": STORE_VERSION, "ai_date": key, "data_file": data_file},
+        )
+        _remove_stale_files(store_dir, key, keep=data_file)
+        rows.append(
+            {
+                "ai_date": key,
+                "rows_before": previous["n_rows"] if previous else 0,
+                "rows_after": len(month),
+            }
+        )
+
+    report = pd.DataFrame(rows, columns=["ai_date", "rows_before", "rows_after"])
+    if verbose:
+        print(report.to_string(index=False))
+    return report
+
+
+def read_claims_store(store_dir, dates=None) -> pd.DataFrame:
+    """
+    All stored claims (or only the partition keys in dates), newest
+    AI_DATE first; each partition is already in Power BI sort order.
+    """
+    store_dir = Path(store_dir)
+    frames = []
+    for key in stored_claim_dates(store_dir):
+        if dates is not None and key not in dates:
+            continue
+        manifest = _read_manifest(store_dir, key)
+        frames.append(read_snapshot(store_dir / manifest["data_file"], manifest))
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+# ============================================================
+# LEGACY WORKBOOK / POWER BI VIEW
+# ============================================================
+
+def import_claims_workbook(xlsx_path, store_dir, prepare=None, verbose: bool = True) -> pd.DataFrame:
+    """
+    One-time import of an existing AI_validated_claims.xlsx into an empty
+    store (one partition per AI_DATE). Returns the write report.
+    - prepare: optional function applied to the frame before writing
+      (e.g. template alignment)
+    """
+    store_dir = Path(store_dir)
+    if stored_claim_dates(store_dir):
+        raise ValueError(f"Claims store {store_dir} is not empty; import only into a new store")
+
+    legacy = pd.read_excel(xlsx_path)
+    if "AI_DATE" in legacy.columns:
+        legacy["AI_DATE"] = pd.to_datetime(legacy["AI_DATE"], format="%Y-%m-%d", errors="coerce")
+    else:
+        legacy["AI_DATE"] = pd.NaT
+    if prepare is not None:
+        legacy = prepare(legacy)
+    if verbose:
+        print(f"Importing {len(legacy)} rows of {xlsx_path} into {store_dir}")
+    return write_claims_months(legacy, store_dir, verbose=verbose)
+
+
+def materialize_claims(store_dir, path, prepare=None, formats=("xlsx",)) -> tuple[pd.DataFrame, list[Path]]:
+    """
+    Power BI view of the store: all partitions (newest first) written to
+    `path` in the given formats (pipeline.exporter). Returns (frame, paths).
+    - prepare: optional function applied before writing (template alignment)
+    """
+    all_claims = read_claims_store(store_dir)
+    if prepare is not None:
+        all_claims = prepare(all_claims)
+    return all_claims, export_table(all_claims, path, formats=formats)
@@ -0,0 +1,263 @@
+"""
+Columnar date normalization for PS / Nissan objection data.
+
+Values are classified in bulk (Excel serial, 4-digit year, 'yyyy/mm',
+datetime, free text) and each class is converted with one vectorized call.
+Rare classes (free text, odd Python types) are parsed once per unique value
+with the scalar function, so results always match the row-wise originals.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Excel's day zero (serial 1 = 1900-01-01, incl. the 1900 leap-year bug)
+EXCEL_EPOCH = np.datetime64("1899-12-30", "D")
+
+# Serial-day range that fits in datetime64[ns]
+_MIN_SERIAL = int((np.datetime64(pd.Timestamp.min.ceil("D"), "D") - EXCEL_EPOCH).astype(int))
+_MAX_SERIAL = int((np.datetime64(pd.Timestamp.max.floor("D"), "D") - EXCEL_EPOCH).astype(int))
+
+# Years handled by the vectorized path; anything else goes through the
+# scalar parser so pandas' own out-of-bounds behaviour is kept
+_MIN_YEAR = 1900
+_MAX_YEAR = 2200
+
+
+# ============================================================
+# ROW-WISE REFERENCE FUNCTIONS
+# ============================================================
+
+def convert_to_date(value):
+    """
+    Convert various date encodings to pandas.Timestamp:
+    - Excel serial numbers (int/float or numeric string)
+    - 'yyyy/mm' strings
+    - otherwise return NaT
+    """
+    try:
+        # Excel serial number (int, float, or numeric string)
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+            base_date = datetime(1899, 12, 30)  # Excel's epoch
+            days = int(value)
+            return base_date + timedelta(days=days)
+
+        # yyyy/mm formatted string
+        if isinstance(value, str):
+            return pd.to_datetime(value, format="%Y/%m", errors="coerce")
+
+        return pd.NaT
+    except Exception:
+        return pd.NaT
+
+
+def clean_vehicle_mfd(val):
+    """
+    Normalize Vehicle MFD:
+    - NaN → NaT
+    - 4-digit year (int/float/str) → yyyy-01-01
+    - 'yyyy/mm' → first of that month
+    - other strings → parsed by pandas
+    """
+    try:
+        if pd.isna(val):
+            return pd.NaT
+
+        # numeric year like 2018 or 2018.0
+        if isinstance(val, (int, float)):
+            return pd.to_datetime(f"{int(val)}-01-01")
+
+        val_str = str(val).strip()
+
+        # 4-digit year
+        if re.match(r"^\d{4}$", val_str):
+            return pd.to_datetime(f"{val_str}-01-01")
+
+        # 'yyyy/mm'
+        if re.match(r"^\d{4}/\d{1,2}$", val_str):
+            return pd.to_datetime(val_str, format="%Y/%m", errors="coerce")
+
+        # fallback
+        return pd.to_datetime(val_str, errors="coerce")
+
+    except Exception:
+        return pd.NaT
+
+
+# ============================================================
+# COLUMNAR HELPERS
+# ============================================================
+
+def _python_types(s: pd.Series) -> pd.Series:
+    """Exact Python type per value (object columns only)."""
+    return s.map(type)
+
+
+def _ns_or_nat(value):
+    """Timestamp in ns resolution; NaT if missing or outside datetime64[ns]."""
+    if pd.isna(value):
+        return pd.NaT
+    try:
+        return pd.Timestamp(value).as_unit("ns")
+    except (pd.errors.OutOfBoundsDatetime, OverflowError, TypeError, ValueError):
+        return pd.NaT
+
+
+def _per_unique(s: pd.Series, func) -> np.ndarray:
+    """Apply a scalar function once per unique value and broadcast back."""
+    uniques = pd.unique(s.to_numpy(dtype=object))
+    mapping = {value: _ns_or_nat(func(value)) for value in uniques}
+    out = [mapping[value] for value in s.to_numpy(dtype=object)]
+    return pd.Series(out, index=s.index, dtype="datetime64[ns]").to_numpy()
+
+
+def excel_serial_to_datetime(days) -> np.ndarray:
+    """
+    Excel serial days (int/float, truncated toward zero like int()) →
+    datetime64[ns]. NaN, inf and serials outside the datetime64[ns] range → NaT.
+    """
+    days = np.trunc(np.asarray(days, dtype=float))
+    valid = np.isfinite(days) & (days >= _MIN_SERIAL) & (days <= _MAX_SERIAL)
+    out = np.full(days.shape, np.datetime64("NaT"), dtype="datetime64[ns]")
+    out[valid] = (EXCEL_EPOCH + days[valid].astype("int64").astype("timedelta64[D]")).astype("datetime64[ns]")
+    return out
+
+
+def _year_to_datetime(years) -> tuple[np.ndarray, np.ndarray]:
+    """(datetime64[ns] of Jan 1st, mask of years handled here)."""
+    years = np.asarray(years, dtype=float)
+    handled = np.isfinite(years)
+    handled[handled] = (years[handled] >= _MIN_YEAR) & (years[handled] < _MAX_YEAR + 1)
+    out = np.full(years.shape, np.datetime64("NaT"), dtype="datetime64[ns]")
+    out[handled] = (np.trunc(years[handled]).astype("int64") - 1970).astype("datetime64[Y]").astype("datetime64[ns]")
+    return out, handled
+
+
+def _as_result(values: np.ndarray, index) -> pd.Series:
+    return pd.Series(values, index=index, dtype="datetime64[ns]")
+
+
+# ============================================================
+# COLUMNAR VERSIONS
+# ============================================================
+
+def convert_to_date_column(s: pd.Series) -> pd.Series:
+    """
+    Columnar convert_to_date → datetime64[ns] Series (same index).
+    Dates outside the datetime64[ns] range come back as NaT.
+
+    Classes:
+    - int / float / bool and ASCII digit strings → Excel serial
+    - other strings → 'yyyy/mm' (NaT if it does not match)
+    - anything else (datetimes, None, numpy scalars in object columns) → scalar
+    """
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return _as_result(excel_serial_to_datetime(s.to_numpy(dtype=float)), s.index)
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        # Timestamps are neither numbers nor strings for convert_to_date
+        return _as_result(np.full(len(s), np.datetime64("NaT"), dtype="datetime64[ns]"), s.index)
+
+    out = np.full(len(s), np.datetime64("NaT"), dtype="datetime64[ns]")
+
+    if s.dtype == object:
+        types = _python_types(s)
+        is_number = types.isin([int, float, bool, np.float64]).to_numpy()
+        is_str = (types == str).to_numpy()
+    else:
+        is_number = np.zeros(len(s), dtype=bool)
+        is_str = s.notna().to_numpy()
+    other = ~is_number & ~is_str & s.notna().to_numpy()
+
+    if is_number.any():
+        out[is_number] = excel_serial_to_datetime(s[is_number].astype(float).to_numpy())
+
+    if is_str.any():
+        strs = s[is_str].astype(object)
+        is_digit = strs.str.isdigit().to_numpy(dtype=bool)
+        is_ascii_digit = strs.str.fullmatch(r"[0-9]+").to_numpy(dtype=bool)
+        str_idx = np.flatnonzero(is_str)
+
+        serial = pd.to_numeric(strs[is_ascii_digit], errors="coerce").to_numpy(dtype=float)
+        out[str_idx[is_ascii_digit]] = excel_serial_to_datetime(serial)
+
+        year_month = ~is_digit
+        out[str_idx[year_month]] = pd.to_datetime(
+            strs[year_month], format="%Y/%m", errors="coerce"
+        ).to_numpy(dtype="datetime64[ns]")
+
+        # Non-ASCII digits ('４５０００') are rare: scalar path
+        other[str_idx[is_digit & ~is_ascii_digit]] = True
+
+    if other.any():
+        out[other] = _per_unique(s[other], convert_to_date)
+
+    return _as_result(out, s.index)
+
+
+def clean_vehicle_mfd_column(s: pd.Series) -> pd.Series:
+    """
+    Columnar clean_vehicle_mfd → datetime64[ns] Series (same index).
+    Dates outside the datetime64[ns] range come back as NaT.
+
+    Classes:
+    - datetime values → kept
+    - int / float years → yyyy-01-01
+    - ASCII 'yyyy' / 'yyyy/mm' strings → first of that year / month
+    - free text and unusual values → parsed once per unique value
+    """
+    if pd.api.types.is_datetime64_any_dtype(s.dtype) and getattr(s.dtype, "tz", None) is None:
+        return _as_result(s.to_numpy(dtype="datetime64[ns]"), s.index)
+
+    out = np.full(len(s), np.datetime64("NaT"), dtype="datetime64[ns]")
+    present = s.notna().to_numpy()
+
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+        is_number = present
+        is_str = is_datetime = np.zeros(len(s), dtype=bool)
+    elif s.dtype == object:
+        types = _python_types(s)
+        is_number = present & types.isin([int, float, np.float64]).to_numpy()
+        is_str = present & (types == str).to_numpy()
+        is_datetime = present & types.isin([pd.Timestamp, datetime]).to_numpy()
+        if is_datetime.any():
+            # tz-aware values keep their tz in the scalar version
+            tz_aware = s[is_datetime].map(lambda v: v.tzinfo is not None).to_numpy(dtype=bool)
+            is_datetime[np.flatnonzero(is_datetime)[tz_aware]] = False
+    else:
+        is_number = is_datetime = np.zeros(len(s), dtype=bool)
+        is_str = present
+    other = present & ~is_number & ~is_str & ~is_datetime
+
+    if is_datetime.any():
+        out[is_datetime] = pd.to_datetime(s[is_datetime].astype(object)).to_numpy(dtype="datetime64[ns]")
+
+    if is_number.any():
+        years, handled = _year_to_datetime(s[is_number].astype(float).to_numpy())
+        idx = np.flatnonzero(is_number)
+        out[idx[handled]] = years[handled]
+        other[idx[~handled]] = True
+
+    if is_str.any():
+        strs = s[is_str].astype(object).str.strip()
+        idx = np.flatnonzero(is_str)
+
+        is_year = strs.str.fullmatch(r"[0-9]{4}").to_numpy(dtype=bool)
+        years, handled = _year_to_datetime(pd.to_numeric(strs[is_year]).to_numpy(dtype=float))
+        year_idx = idx[is_year]
+        out[year_idx[handled]] = years[handled]
+        other[year_idx[~handled]] = True
+
+        is_year_month = strs.str.fullmatch(r"[0-9]{4}/[0-9]{1,2}").to_numpy(dtype=bool)
+        out[idx[is_year_month]] = pd.to_datetime(
+            strs[is_year_month], format="%Y/%m", errors="coerce"
+        ).to_numpy(dtype="datetime64[ns]")
+
+        # Free text (and non-ASCII digits) → pandas parser, once per value
+        other[idx[~is_year & ~is_year_month]] = True
+
+    if other.any():
+        out[other] = _per_unique(s[other], clean_vehicle_mfd)
+
+    return _as_result(out, s.index)
@@ -0,0 +1,491 @@
+"""
+Persistent columnar cache for slow Excel sources (e.g. PS_Database.xlsm).
+
+The first load of a sheet writes a Parquet snapshot next to a small JSON
+manifest holding the source fingerprint (mtime, size, sha256) and the
+pandas dtypes of every column. Later loads memory-map the snapshot and only
+go back to Excel when the workbook has actually changed.
+
+Snapshot reads can take a column projection and row filters
+(pyarrow-style [(column, op, value), ...], AND-ed). Filters are evaluated
+by the Arrow dataset scanner wherever the stored column type allows it,
+so rows that fail them are never converted to pandas.
+"""
+
+import hashlib
+import json
+import os
+from datetime import date, datetime, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+CACHE_VERSION = 1
+
+# Type tags for object columns holding mixed Python values (Excel cells
+# typed by hand: part numbers as int + str, MFD as year + 'yyyy/mm', ...)
+_TAG_NA = 0
+_TAG_STR = 1
+_TAG_INT = 2
+_TAG_FLOAT = 3
+_TAG_DATETIME = 4
+_TAG_BOOL = 5
+_TAG_DATE = 6
+_TAG_TIME = 7
+
+# Row filter operators (pyarrow / pandas comparison semantics)
+FILTER_OPS = ("==", "!=", "<", "<=", ">", ">=", "in", "not in")
+
+
+def _content_hash(path: Path, chunk_size: int = 8 * 1024 * 1024) -> str:
+    """sha256 of the file content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, with_hash: bool = True) -> dict:
+    """
+    Fingerprint of a source file:
+    - mtime / size (cheap, from stat)
+    - sha256 of the content (only if with_hash=True)
+    """
+    path = Path(path)
+    stat = path.stat()
+    fingerprint = {"mtime": stat.st_mtime, "size": stat.st_size}
+    if with_hash:
+        fingerprint["sha256"] = _content_hash(path)
+    return fingerprint
+
+
+def _cache_stem(path: Path, sheet_name, header) -> str:
+    """Stable file stem for one (workbook, sheet, header) combination."""
+    key = f"{Path(path).resolve()}|{sheet_name}|{header}"
+    short = hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+    return f"{Path(path).stem}__{sheet_name}__h{header}__{short}"
+
+
+def _value_tag(value) -> int:
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT:
+        return _TAG_NA
+    if isinstance(value, str):
+        return _TAG_STR
+    if isinstance(value, (bool, np.bool_)):
+        return _TAG_BOOL
+    if isinstance(value, (int, np.integer)):
+        return _TAG_INT
+    if isinstance(value, (float, np.floating)):
+        return _TAG_FLOAT
+    if isinstance(value, datetime):
+        return _TAG_DATETIME
+    if isinstance(value, date):
+        return _TAG_DATE
+    if isinstance(value, time):
+        return _TAG_TIME
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}: {value!r}")
+
+
+def _value_text(value) -> str:
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, (float, np.floating)):
+        return repr(float(value))
+    return str(value)
+
+
+def _encode_mixed(s: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Encode a mixed-type object column losslessly as (text, tag).
+    Parquet needs one type per column, so each value is stored as text
+    with an int8 tag telling how to rebuild the original Python type.
+    """
+    tags = s.map(_value_tag).astype("int8")
+    text = [
+        None if tag == _TAG_NA else _value_text(value)
+        for value, tag in zip(s.to_numpy(dtype=object), tags.to_numpy())
+    ]
+    return pd.Series(text, index=s.index, dtype=object), tags
+
+
+def _decode_mixed(text: pd.Series, tags: pd.Series) -> pd.Series:
+    """Inverse of _encode_mixed."""
+    out = pd.Series(np.nan, index=text.index, dtype=object)
+    tags = tags.to_numpy()
+
+    for tag, decode in (
+        (_TAG_STR, lambda t: t),
+        (_TAG_INT, lambda t: t.map(int)),
+        (_TAG_FLOAT, lambda t: t.map(float)),
+        (_TAG_DATETIME, lambda t: pd.Series(pd.to_datetime(t).astype(object), index=t.index)),
+        (_TAG_BOOL, lambda t: t == "True"),
+        (_TAG_DATE, lambda t: t.map(date.fromisoformat)),
+        (_TAG_TIME, lambda t: t.map(time.fromisoformat)),
+    ):
+        mask = tags == tag
+        if mask.any():
+            out[mask] = decode(text[mask].astype(object)).to_numpy(dtype=object)
+    return out
+
+
+def _is_mixed_object(s: pd.Series) -> bool:
+    """Object columns that are not plain strings need the tagged encoding."""
+    if s.dtype != object:
+        return False
+    return pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty")
+
+
+def write_snapshot(df: pd.DataFrame, parquet_path: Path, manifest_path: Path, manifest: dict) -> None:
+    """Write Parquet snapshot + manifest atomically (tmp file, then replace)."""
+    encoded = {}
+    mixed_columns = []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        if _is_mixed_object(s):
+            text, tags = _encode_mixed(s)
+            encoded[f"c{i}"] = text
+            encoded[f"c{i}__tag"] = tags
+            mixed_columns.append(i)
+        else:
+            encoded[f"c{i}"] = s
+    table = pa.Table.from_pandas(pd.DataFrame(encoded, index=df.index), preserve_index=False)
+
+    manifest = dict(
+        manifest,
+        version=CACHE_VERSION,
+        columns=[str(c) if not isinstance(c, (str, int, float)) else c for c in df.columns],
+        dtypes=[str(dtype) for dtype in df.dtypes],
+        mixed_columns=mixed_columns,
+        n_rows=len(df),
+    )
+
+    tmp_parquet = parquet_path.with_name(parquet_path.name + ".tmp")
+    pq.write_table(table, tmp_parquet)
+    os.replace(tmp_parquet, parquet_path)
+
+    tmp_manifest = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp_manifest.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_manifest, manifest_path)
+
+
+def _pandas_condition(s: pd.Series, op: str, value) -> np.ndarray:
+    """
+    Boolean mask of one filter, with plain pandas semantics (NaN != x is True).
+    Datetime values are compared against pd.to_datetime(s, errors="coerce")
+    when the column is not datetime64 yet (text / mixed date cells).
+    """
+    values = list(value) if op in ("in", "not in") else [value]
+    if values and all(_is_datetime_value(v) for v in values) and not pd.api.types.is_datetime64_any_dtype(s.dtype):
+        s = pd.to_datetime(s, errors="coerce")
+
+    if op == "==":
+        mask = s == value
+    elif op == "!=":
+        mask = s != value
+    elif op == "<":
+        mask = s < value
+    elif op == "<=":
+        mask = s <= value
+    elif op == ">":
+        mask = s > value
+    elif op == ">=":
+        mask = s >= value
+    elif op == "in":
+        mask = s.isin(value)
+    elif op == "not in":
+        mask = ~s.isin(value)
+    else:
+        raise ValueError(f"Unsupported filter operator {op!r}; expected one of {FILTER_OPS}")
+    return mask.to_numpy(dtype=bool, na_value=False)
+
+
+def apply_filters(df: pd.DataFrame, filters) -> pd.DataFrame:
+    """
+    Apply [(column, op, value), ...] (AND-ed) to an in-memory frame.
+    Reference semantics for the pushed-down version in read_snapshot.
+    """
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        mask &= _pandas_condition(df[column], op, value)
+    return df[mask]
+
+
+def apply_selection(df: pd.DataFrame, columns=None, filters=None) -> pd.DataFrame:
+    """In-memory projection + filters; same frame as the pushed-down snapshot read."""
+    if filters:
+        df = apply_filters(df, filters).reset_index(drop=True)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def _is_datetime_value(value) -> bool:
+    return isinstance(value, (datetime, np.datetime64)) and getattr(value, "tzinfo", None) is None
+
+
+def _arrow_condition(field: str, arrow_type: pa.DataType, op: str, value, tag_field: str | None = None):
+    """
+    Arrow expression equivalent to _pandas_condition, or None when the
+    stored type does not allow an exact translation (filter then runs in
+    pandas after the read).
+    - mixed (tagged) columns: only string (in)equality, matched on the tag too
+    - nulls kept by '!=' / 'not in', like NaN in pandas
+    """
+    values = list(value) if op in ("in", "not in") else [value]
+    column = ds.field(field)
+
+    if tag_field is not None:
+        if op not in ("==", "!=", "in", "not in") or not all(isinstance(v, str) for v in values):
+            return None
+        hit = (ds.field(tag_field) == _TAG_STR) & column.isin(values)
+        return hit if op in ("==", "in") else ~hit
+
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        if not all(isinstance(v, str) for v in values):
+            return None
+    elif pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+        if not all(isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_)) for v in values):
+            return None
+    elif pa.types.is_timestamp(arrow_type) and arrow_type.tz is None:
+        if not all(_is_datetime_value(v) for v in values):
+            return None
+        values = [pa.scalar(pd.Timestamp(v).to_pydatetime(), type=arrow_type) for v in values]
+    else:
+        return None
+
+    if op in ("in", "not in"):
+        hit = column.isin(pa.array(values, type=arrow_type) if pa.types.is_timestamp(arrow_type) else values)
+        return hit if op == "in" else ~hit
+    scalar = values[0]
+    if op == "==":
+        return column == scalar
+    if op == "!=":
+        return (column != scalar) | column.is_null()
+    if op == "<":
+        return column < scalar
+    if op == "<=":
+        return column <= scalar
+    if op == ">":
+        return column > scalar
+    if op == ">=":
+        return column >= scalar
+    raise ValueError(f"Unsupported filter operator {op!r}; expected one of {FILTER_OPS}")
+
+
+def _column_positions(manifest: dict, names) -> list[int]:
+    positions = []
+    for name in names:
+        try:
+            positions.append(manifest["columns"].index(name))
+        except ValueError:
+            raise KeyError(f"Column {name!r} not in cached sheet {manifest.get('sheet_name')!r}") from None
+    return positions
+
+
+def read_snapshot(parquet_path: Path, manifest: dict, columns=None, filters=None) -> pd.DataFrame:
+    """
+    Memory-map the Parquet snapshot and restore names and dtypes.
+
+    - columns: projection (snapshot column names, in that order)
+    - filters: [(column, op, value), ...]; pushed into the Arrow scan when
+      possible, otherwise applied in pandas on the (already reduced) frame
+    """
+    filters = list(filters or [])
+    for _, op, _ in filters:
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unsupported filter operator {op!r}; expected one of {FILTER_OPS}")
+
+    mixed = set(manifest["mixed_columns"])
+    keep = _column_positions(manifest, columns) if columns is not None else list(range(len(manifest["columns"])))
+
+    residual = []
+    if columns is None and not filters:
+        encoded = pq.read_table(parquet_path, memory_map=True).to_pandas()
+        positions = keep
+    else:
+        dataset = ds.dataset(parquet_path, format="parquet")
+        expression = None
+        for (name, op, value), i in zip(filters, _column_positions(manifest, [f[0] for f in filters])):
+            condition = _arrow_condition(
+                f"c{i}", dataset.schema.field(f"c{i}").type, op, value, f"c{i}__tag" if i in mixed else None
+            )
+            if condition is None:
+                residual.append((i, op, value))
+            else:
+                expression = condition if expression is None else expression & condition
+
+        # Residual filters need their columns decoded too
+        positions = keep + [i for i, _, _ in residual if i not in keep]
+        fields = [name for i in positions for name in ((f"c{i}", f"c{i}__tag") if i in mixed else (f"c{i}",))]
+        encoded = dataset.to_table(columns=fields, filter=expression).to_pandas()
+
+    data = {}
+    for i in positions:
+        if i in mixed:
+            data[i] = _decode_mixed(encoded[f"c{i}"], encoded[f"c{i}__tag"])
+            continue
+        s = encoded[f"c{i}"]
+        dtype = manifest["dtypes"][i]
+        if str(s.dtype) != dtype:
+            s = s.astype(dtype)
+        data[i] = s
+
+    df = pd.DataFrame(data, index=encoded.index)
+    if residual:
+        mask = np.ones(len(df), dtype=bool)
+        for i, op, value in residual:
+            mask &= _pandas_condition(df[i], op, value)
+        df = df[mask].reset_index(drop=True)
+
+    df = df[keep]
+    df.columns = [manifest["columns"][i] for i in keep]
+    return df
+
+
+def _load_manifest(manifest_path: Path) -> dict | None:
+    if not manifest_path.exists():
+        return None
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != CACHE_VERSION:
+        return None
+    return manifest
+
+
+def _cache_paths(path: Path, sheet_name, header, cache_dir) -> tuple[Path, Path]:
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    stem = _cache_stem(path, sheet_name, header)
+    return cache_dir / f"{stem}.parquet", cache_dir / f"{stem}.json"
+
+
+def _read_options(read_kwargs: dict) -> str | None:
+    """Extra read_excel options change the result; they are part of the key."""
+    return json.dumps(read_kwargs, sort_keys=True, default=str) if read_kwargs else None
+
+
+def lookup_cached_sheet(
+    path,
+    sheet_name=0,
+    header=0,
+    cache_dir=None,
+    verbose: bool = True,
+    columns=None,
+    filters=None,
+    **read_kwargs,
+) -> tuple[pd.DataFrame | None, dict]:
+    """
+    Return (snapshot, fingerprint); snapshot is None on a cache miss.
+    columns / filters are applied while reading the snapshot (see
+    read_snapshot); they are not part of the cache key.
+
+    - Cache hit when mtime + size match the manifest (no hashing needed).
+    - If mtime/size changed, the content hash decides: same bytes (file
+      copied / touched) → reuse snapshot and refresh the manifest,
+      different bytes → miss.
+    The fingerprint is passed on to store_cached_sheet after a miss.
+    """
+    path = Path(path)
+    parquet_path, manifest_path = _cache_paths(path, sheet_name, header, cache_dir)
+    fingerprint = file_fingerprint(path, with_hash=False)
+
+    manifest = _load_manifest(manifest_path)
+    if manifest is None or not parquet_path.exists():
+        return None, fingerprint
+    if manifest.get("read_kwargs") != _read_options(read_kwargs):
+        return None, fingerprint
+
+    if (manifest["mtime"], manifest["size"]) == (fingerprint["mtime"], fingerprint["size"]):
+        if verbose:
+            print(f"[cache] hit: {path.name}/{sheet_name}")
+        return read_snapshot(parquet_path, manifest, columns, filters), fingerprint
+
+    fingerprint["sha256"] = _content_hash(path)
+    if manifest.get("sha256") == fingerprint["sha256"]:
+        manifest.update(fingerprint)
+        manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        if verbose:
+            print(f"[cache] hit (content unchanged): {path.name}/{sheet_name}")
+        return read_snapshot(parquet_path, manifest, columns, filters), fingerprint
+
+    return None, fingerprint
+
+
+def store_cached_sheet(
+    df: pd.DataFrame,
+    path,
+    sheet_name=0,
+    header=0,
+    cache_dir=None,
+    fingerprint: dict | None = None,
+    **read_kwargs,
+) -> None:
+    """Write the snapshot for a sheet just loaded from Excel."""
+    path = Path(path)
+    parquet_path, manifest_path = _cache_paths(path, sheet_name, header, cache_dir)
+
+    fingerprint = dict(fingerprint or file_fingerprint(path, with_hash=False))
+    if "sha256" not in fingerprint:
+        fingerprint["sha256"] = _content_hash(path)
+
+    try:
+        write_snapshot(
+            df,
+            parquet_path,
+            manifest_path,
+            dict(
+                fingerprint,
+                source=str(path),
+                sheet_name=sheet_name,
+                header=header,
+                read_kwargs=_read_options(read_kwargs),
+            ),
+        )
+    except (TypeError, pa.ArrowException) as exc:
+        # Never fail the run because of the cache; just keep loading from Excel
+        print(f"[cache] WARNING: could not cache {path.name}/{sheet_name}: {exc}")
+
+
+def read_excel_cached(
+    path,
+    sheet_name=0,
+    header=0,
+    cache_dir=None,
+    verbose: bool = True,
+    columns=None,
+    filters=None,
+    **read_kwargs,
+) -> pd.DataFrame:
+    """
+    pd.read_excel with a persistent Parquet cache.
+
+    - Snapshot reused while the workbook content is unchanged
+      (see lookup_cached_sheet); otherwise reload from Excel and rebuild it.
+    - columns / filters: projection and row filters; pushed down to the
+      snapshot scan on a hit, applied to the parsed sheet on a miss.
+    - cache_dir=None disables caching (plain pd.read_excel).
+    """
+    if cache_dir is None:
+        df = pd.read_excel(path, sheet_name=sheet_name, header=header, **read_kwargs)
+        return apply_selection(df, columns, filters)
+
+    df, fingerprint = lookup_cached_sheet(
+        path, sheet_name, header, cache_dir, verbose, columns=columns, filters=filters, **read_kwargs
+    )
+    if df is not None:
+        return df
+
+    if verbose:
+        print(f"[cache] miss: loading {Path(path).name}/{sheet_name} from Excel")
+    df = pd.read_excel(path, sheet_name=sheet_name, header=header, **read_kwargs)
+    store_cached_sheet(df, path, sheet_name, header, cache_dir, fingerprint, **read_kwargs)
+    return apply_selection(df, columns, filters)
@@ -0,0 +1,254 @@
+"""
+Manifest-driven loader for the section 4 Excel inputs.
+
+Each spec names one (workbook, sheet, header) input. Specs are grouped by
+workbook so every workbook is opened once and all its sheets are parsed
+from that single handle; independent workbooks are loaded concurrently.
+Timing per source is reported so slow shares / sheets are visible.
+
+Spec keys:
+- name          key of the returned frame (required)
+- path          workbook path (required)
+- sheet_name    sheet name or index (default 0)
+- header        header row (default 0)
+- cache         True → reuse / write the Parquet snapshot (pipeline.excel_cache)
+- usecols       passed to the Excel parser (list of names / callable)
+- drop_columns  header names never to materialize
+- translation   {"sheet": <spec name>, "from": <col>, "to": <col>}: lets
+                drop_columns use translated names (raw header → translated
+                name pairs are read from another spec of the same workbook)
+- columns       projection: only these columns are returned
+- filters       row filters [(column, op, value), ...], AND-ed (ops: see
+                excel_cache.FILTER_OPS)
+- engine        override the Excel engine for this spec
+
+columns / filters may use translated names as well. For cached specs they
+are pushed down into the Arrow scan of the snapshot, so filtered-out rows
+and unused columns never reach pandas; several specs can read different
+slices of the same cached sheet. Uncached specs apply them after parsing;
+specs of the same sheet (same header / pruning) then share that parse.
+"""
+
+import importlib.util
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from pipeline.excel_cache import apply_selection, lookup_cached_sheet, store_cached_sheet
+
+
+def pick_excel_engine(preferred: str | None = None) -> str:
+    """
+    Excel engine for pd.read_excel / pd.ExcelFile.
+    - preferred engine if given
+    - 'calamine' (Rust, streaming row reader) when python-calamine is
+      installed and pandas supports it (>= 2.2)
+    - otherwise 'openpyxl'
+    """
+    if preferred:
+        return preferred
+    major, minor = (int(part) for part in pd.__version__.split(".")[:2])
+    if (major, minor) >= (2, 2) and importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+    return "openpyxl"
+
+
+def _group_by_workbook(specs: list[dict]) -> dict[str, list[dict]]:
+    names = [spec["name"] for spec in specs]
+    duplicated = {n for n in names if names.count(n) > 1}
+    if duplicated:
+        raise ValueError(f"Duplicate spec names in manifest: {sorted(duplicated)}")
+
+    groups = {}
+    for spec in specs:
+        spec = {"sheet_name": 0, "header": 0, "cache": False, **spec}
+        groups.setdefault(str(spec["path"]), []).append(spec)
+    return groups
+
+
+def _raw_header_names(spec: dict, frames: dict) -> dict:
+    """{translated name → raw header name} from the spec's translation sheet."""
+    if not spec.get("translation"):
+        return {}
+    translation = spec["translation"]
+    table = frames[translation["sheet"]]
+    return dict(zip(table[translation["to"]], table[translation["from"]]))
+
+
+def _column_pruning(spec: dict, frames: dict):
+    """
+    (usecols for the parser, stable cache key part) for one spec.
+    drop_columns are mapped back to raw header names through the
+    translation sheet when one is given.
+    """
+    usecols = spec.get("usecols")
+    drop = set(spec.get("drop_columns") or [])
+
+    if drop:
+        raw_by_translated = _raw_header_names(spec, frames)
+        drop |= {raw_by_translated[c] for c in list(drop) if c in raw_by_translated}
+
+    if drop:
+        if usecols is not None:
+            raise ValueError(f"Spec {spec['name']!r}: use either usecols or drop_columns")
+        usecols = lambda col: col not in drop  # noqa: E731
+
+    key = {}
+    if spec.get("usecols") is not None:
+        key["usecols"] = spec["usecols"] if not callable(spec["usecols"]) else spec["usecols"].__qualname__
+    if drop:
+        key["drop_columns"] = sorted(map(str, drop))
+    return usecols, key
+
+
+def _selection(spec: dict, frames: dict):
+    """(columns, filters) of a spec with translated names mapped to raw headers."""
+    raw_by_translated = _raw_header_names(spec, frames)
+    columns = spec.get("columns")
+    if columns is not None:
+        columns = [raw_by_translated.get(c, c) for c in columns]
+    filters = [(raw_by_translated.get(c, c), op, value) for c, op, value in spec.get("filters") or []]
+    return columns, filters
+
+
+def _load_workbook(path: str, specs: list[dict], cache_dir=None, engine: str | None = None) -> tuple[dict, list[dict]]:
+    """
+    Load all specs of one workbook (runs inside a worker).
+    Cached sheets come from their snapshot; the others are parsed from a
+    single pd.ExcelFile handle, opened on the first cache miss. Specs
+    reading the same sheet with the same header / pruning share one parse
+    (whether or not a snapshot could be written); only their selections
+    differ.
+    """
+    frames = {}
+    timings = []
+    parsed = {}  # (sheet_name, header, pruning / engine key) → parsed sheet
+    workbook = None
+    open_seconds = 0.0
+
+    # Translation sheets first: other specs may need them for drop_columns
+    ordered = sorted(specs, key=lambda spec: bool(spec.get("translation")))
+
+    try:
+        for spec in ordered:
+            spec_engine = pick_excel_engine(spec.get("engine") or engine)
+            usecols, key = _column_pruning(spec, frames)
+            key["engine"] = spec_engine
+            columns, filters = _selection(spec, frames)
+
+            parse_key = (spec["sheet_name"], spec["header"], repr(sorted(key.items())))
+            start = time.perf_counter()
+            if parse_key in parsed:
+                df = apply_selection(parsed[parse_key], columns, filters)
+                if df is parsed[parse_key]:  # no selection: never hand out the same frame twice
+                    df = df.copy()
+                frames[spec["name"]] = df
+                timings.append(_timing(spec, df, time.perf_counter() - start, spec_engine))
+                continue
+
+            df, fingerprint = None, None
+            use_cache = spec["cache"] and cache_dir is not None
+            if use_cache:
+                df, fingerprint = lookup_cached_sheet(
+                    path, spec["sheet_name"], spec["header"], cache_dir, verbose=False,
+                    columns=columns, filters=filters, **key,
+                )
+            if df is not None:
+                frames[spec["name"]] = df
+                timings.append(_timing(spec, df, time.perf_counter() - start, "cache"))
+                continue
+
+            if workbook is None or workbook.engine != spec_engine:
+                if workbook is not None:
+                    workbook.close()
+                open_start = time.perf_counter()
+                workbook = pd.ExcelFile(path, engine=spec_engine)
+                open_seconds = time.perf_counter() - open_start
+
+            start = time.perf_counter()
+            df = workbook.parse(sheet_name=spec["sheet_name"], header=spec["header"], usecols=usecols)
+            parse_seconds = time.perf_counter() - start
+            parsed[parse_key] = df
+            if use_cache:
+                # The snapshot keeps the whole (pruned) sheet; selections are per spec
+                store_cached_sheet(
+                    df, path, spec["sheet_name"], spec["header"], cache_dir, fingerprint, **key
+                )
+            df = apply_selection(df, columns, filters)
+            frames[spec["name"]] = df
+            timings.append(_timing(spec, df, parse_seconds, spec_engine, open_seconds))
+            open_seconds = 0.0  # charged to the first sheet only
+    finally:
+        if workbook is not None:
+            workbook.close()
+
+    return frames, timings
+
+
+def _timing(spec: dict, df: pd.DataFrame, seconds: float, source: str, open_seconds: float = 0.0) -> dict:
+    return {
+        "name": spec["name"],
+        "workbook": Path(str(spec["path"])).name,
+        "sheet_name": spec["sheet_name"],
+        "source": source,
+        "rows": len(df),
+        "columns": df.shape[1],
+        "open_s": round(open_seconds, 3),
+        "parse_s": round(seconds, 3),
+    }
+
+
+def load_excel_manifest(
+    specs: list[dict],
+    cache_dir=None,
+    max_workers: int | None = None,
+    executor: str = "thread",
+    engine: str | None = None,
+    verbose: bool = True,
+) -> tuple[dict, pd.DataFrame]:
+    """
+    Load every spec of the manifest; returns (frames by name, timing report).
+    The report 'source' column says 'cache' or the Excel engine used
+    (engine=None → pick_excel_engine()).
+
+    - executor="thread" (default): overlaps network I/O; safe to call from
+      a script that runs at module top level.
+    - executor="process": workbooks parsed in parallel processes (openpyxl
+      parsing is CPU-bound, so this brings wall time down to the slowest
+      single workbook). Workers re-import the main module on Windows
+      (spawn), so the caller must sit behind `if __name__ == "__main__":`.
+    - executor="serial": one workbook after the other (debugging).
+    """
+    groups = _group_by_workbook(specs)
+    wall_start = time.perf_counter()
+
+    frames = {}
+    timings = []
+    if executor == "serial" or len(groups) == 1:
+        results = [_load_workbook(path, group, cache_dir, engine) for path, group in groups.items()]
+    else:
+        pool_cls = {"process": ProcessPoolExecutor, "thread": ThreadPoolExecutor}[executor]
+        with pool_cls(max_workers=max_workers or len(groups)) as pool:
+            futures = [
+                pool.submit(_load_workbook, path, group, cache_dir, engine)
+                for path, group in groups.items()
+            ]
+            results = [future.result() for future in futures]
+
+    for workbook_frames, workbook_timings in results:
+        frames.update(workbook_frames)
+        timings.extend(workbook_timings)
+
+    # Keep manifest order in the report
+    order = {spec["name"]: i for i, spec in enumerate(specs)}
+    report = pd.DataFrame(timings).sort_values("name", key=lambda s: s.map(order)).reset_index(drop=True)
+
+    if verbose:
+        wall = time.perf_counter() - wall_start
+        serial = (report["open_s"] + report["parse_s"]).sum()
+        print(report.to_string(index=False))
+        print(f"Load phase: {wall:.1f}s wall ({serial:.1f}s summed over sources)")
+
+    return frames, report
@@ -1,6 +1,182 @@
+"""
+Result exports: the monthly results and the Power BI files.
+
+Every output is written once, to a tmp file that then replaces the target
+(a reader never sees a half-written file). xlsx goes through openpyxl's
+write-only (streaming) mode: rows are converted and written in chunks, so
+memory stays flat however long the table is. The same table can also be
+written as Parquet / CSV next to the workbook for consumers reading those.
+
+Power BI template alignment: template headers are read once per template
+file version (path, mtime, size) and every missing column is added in one
+block, so large aggregates are not grown column by column.
+"""
+
+import os
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+# format → file suffix
+EXPORT_SUFFIXES = {"xlsx": ".xlsx", "parquet": ".parquet", "csv": ".csv"}
+
+# Rows converted to Python values at a time by write_xlsx
+XLSX_CHUNK_ROWS = 50_000
+
+# (resolved path, mtime_ns, size) → template column names
+_TEMPLATE_COLUMNS = {}
+
+
 def export_results(df, path="data/synthetic_results.csv"):
     path = Path(path)
     df.to_csv(path, index=False)
     return path
+
+
+# ============================================================
+# WRITERS
+# ============================================================
+
+def _cell_values(column: pd.Series) -> list:
+    """Column as Python values for openpyxl; missing (NaN / NaT / NA) → empty cell."""
+    values = column.astype(object)
+    return values.where(column.notna(), None).tolist()
+
+
+def write_xlsx(df: pd.DataFrame, path, sheet_name: str = "Sheet1", chunk_rows: int = XLSX_CHUNK_ROWS) -> Path:
+    """
+    Streaming xlsx writer (openpyxl write-only); same cells as
+    df.to_excel(path, index=False) without its per-cell styling.
+    """
+    path = Path(path)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append([str(column) for column in df.columns])
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        for row in zip(*(_cell_values(chunk.iloc[:, i]) for i in range(chunk.shape[1]))):
+            sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def write_table(df: pd.DataFrame, path) -> Path:
+    """
+    Write df (no index) in the format given by the file suffix
+    (.xlsx / .parquet / .csv), atomically: tmp file, then replace.
+    - CSV is UTF-8 with BOM so Excel reads the Japanese headers
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix not in EXPORT_SUFFIXES.values():
+        raise ValueError(f"Unsupported export format {path.suffix!r} (use {sorted(EXPORT_SUFFIXES.values())})")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        if suffix == ".xlsx":
+            write_xlsx(df, tmp)
+        elif suffix == ".parquet":
+            df.to_parquet(tmp, index=False)
+        else:
+            df.to_csv(tmp, index=False, encoding="utf-8-sig")
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def export_table(df: pd.DataFrame, path, formats=("xlsx",)) -> list[Path]:
+    """
+    Write df once per format, all next to `path` (same stem, format suffix).
+    Returns the written paths.
+    """
+    path = Path(path)
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_SUFFIXES]
+    if unknown:
+        raise ValueError(f"Unknown export formats {unknown} (use {list(EXPORT_SUFFIXES)})")
+    return [write_table(df, path.with_suffix(EXPORT_SUFFIXES[fmt])) for fmt in formats]
+
+
+# ============================================================
+# POWER BI TEMPLATE
+# ============================================================
+
+def template_columns(template_path) -> list:
+    """
+    Header of the template workbook (as pd.read_excel(nrows=0) reads it),
+    cached per file version: read again only when mtime / size change.
+    """
+    path = Path(template_path)
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    if key not in _TEMPLATE_COLUMNS:
+        _TEMPLATE_COLUMNS[key] = list(pd.read_excel(path, nrows=0).columns)
+    return list(_TEMPLATE_COLUMNS[key])
+
+
+def align_to_template(
+    df: pd.DataFrame,
+    template_path: str,
+    column_mapping: dict | None = None,
+    default_value=np.nan,
+) -> pd.DataFrame:
+    """
+    Ensure df has at least all columns from template_path.
+    - If template col exists in df: keep as is.
+    - Else if mapping is provided and mapped source col exists in df: copy.
+    - Else: create col with default_value.
+    Returns df with columns ordered like the template (extra cols at the
+    end). Missing columns are built as one block and added with a single
+    concat; df itself is not modified.
+    """
+    template_cols = template_columns(template_path)
+    column_mapping = column_mapping or {}
+
+    present = set(df.columns)
+    missing = [col for col in template_cols if col not in present]
+    mapped = {col: column_mapping[col] for col in missing if column_mapping.get(col) in present}
+    defaults = [col for col in missing if col not in mapped]
+    if missing:
+        blocks = [df]
+        if mapped:
+            blocks.append(pd.DataFrame({col: df[src].array for col, src in mapped.items()}, index=df.index))
+        if defaults:
+            blocks.append(pd.DataFrame(default_value, index=df.index, columns=defaults))
+        df = pd.concat(blocks, axis=1)
+
+    # Reorder columns to match template first; keep extra cols at the end
+    template_set = set(template_cols)
+    extra_cols = [c for c in df.columns if c not in template_set]
+    return df[list(dict.fromkeys(template_cols)) + extra_cols]
+
+
+def align_to_template_reference(
+    df: pd.DataFrame,
+    template_path: str,
+    column_mapping: dict | None = None,
+    default_value=np.nan,
+) -> pd.DataFrame:
+    """Original column-by-column align_to_template (reads the header every call)."""
+    template_header = pd.read_excel(template_path, nrows=0)
+    template_cols = list(template_header.columns)
+
+    column_mapping = column_mapping or {}
+
+    for col in template_cols:
+        if col in df.columns:
+            continue
+
+        # If we have an explicit mapping, use it
+        src = column_mapping.get(col)
+        if src and src in df.columns:
+            df[col] = df[src]
+        else:
+            df[col] = default_value
+
+    # Reorder columns to match template first; keep extra cols at the end
+    ordered_existing = [c for c in template_cols if c in df.columns]
+    extra_cols = [c for c in df.columns if c not in ordered_existing]
+    return df[ordered_existing + extra_cols]
@@ -0,0 +1,90 @@
+"""
+Batched fuzzy scoring of (expected name, part group) pairs.
+
+Rows carry very few distinct pairs, so pairs are deduplicated, the ones
+not scored before are scored with a single rapidfuzz.process.cdist call,
+and scores are broadcast back to the rows. Scores are kept in a small
+Parquet table between runs (pair → score), so a monthly run only scores
+pairs it has never seen.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+# Bump when the scorer / preprocessing changes: old cache files are ignored
+SCORE_CACHE_VERSION = 1
+
+
+def is_similar_reference(a: str, b: str, threshold: int = 90) -> bool:
+    """Original is_similar: fuzz.ratio on lowercased strings >= threshold."""
+    return fuzz.ratio(a.lower(), b.lower()) >= threshold
+
+
+def load_pair_scores(path) -> dict:
+    """{(a, b): score} from the cache file; empty when missing or outdated."""
+    if path is None or not Path(path).exists():
+        return {}
+    table = pd.read_parquet(path)
+    if "version" not in table or not (table["version"] == SCORE_CACHE_VERSION).all():
+        return {}
+    return dict(zip(zip(table["a"], table["b"]), table["score"]))
+
+
+def save_pair_scores(scores: dict, path) -> None:
+    """Write the pair → score table (tmp file, then replace)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pairs = list(scores)
+    table = pd.DataFrame(
+        {
+            "a": pd.Series([a for a, _ in pairs], dtype=object),
+            "b": pd.Series([b for _, b in pairs], dtype=object),
+            "score": pd.Series(list(scores.values()), dtype="float64"),
+            "version": SCORE_CACHE_VERSION,
+        }
+    )
+    tmp = path.with_name(path.name + ".tmp")
+    table.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _cdist_scores(pairs: list[tuple[str, str]]) -> list[float]:
+    """fuzz.ratio of lowercased pairs, one cdist over the distinct strings."""
+    left = list(dict.fromkeys(a for a, _ in pairs))
+    right = list(dict.fromkeys(b for _, b in pairs))
+    matrix = process.cdist(
+        [a.lower() for a in left],
+        [b.lower() for b in right],
+        scorer=fuzz.ratio,
+        dtype=np.float64,
+        workers=-1,
+    )
+    row = {a: i for i, a in enumerate(left)}
+    col = {b: j for j, b in enumerate(right)}
+    return [float(matrix[row[a], col[b]]) for a, b in pairs]
+
+
+def pair_scores(a: pd.Series, b: pd.Series, scores: dict | None = None) -> np.ndarray:
+    """
+    fuzz.ratio(a.lower(), b.lower()) per row (float array, same length).
+    - a / b: string Series aligned by position
+    - scores: pair → score dict, read and extended in place (the cache)
+    """
+    scores = {} if scores is None else scores
+    if len(a) == 0:
+        return np.empty(0, dtype=float)
+
+    pairs = pd.DataFrame({"a": a.to_numpy(dtype=object), "b": b.to_numpy(dtype=object)})
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(pairs))
+    unique_pairs = list(uniques)
+
+    missing = [pair for pair in unique_pairs if pair not in scores]
+    if missing:
+        scores.update(zip(missing, _cdist_scores(missing)))
+
+    unique_scores = np.array([scores[pair] for pair in unique_pairs], dtype=float)
+    return unique_scores[codes]
@@ -9,16 +9,34 @@
 # 0. IMPORTS
 # ============================================================
 
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import re
 import string
+import sys
 
 import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill
-from rapidfuzz import fuzz
+
+# Ensure project root on PYTHONPATH (so we can import from pipeline/)
+project_root = os.path.abspath("..")
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from pipeline.claims_store import import_claims_workbook, materialize_claims, stored_claim_dates, write_claims_months
+from pipeline.excel_loader import load_excel_manifest
+from pipeline.exporter import align_to_template, export_table
+from pipeline.nissan_prep import build_mode_lookup, impute_vehicle_mfd
+from pipeline.nissan_synthetic import generate_nissan_sheets, manifest_inputs, write_nissan_workbooks, write_results_template
+from pipeline.part_groups import build_prefix_index
+from pipeline.part_numbers import normalize_bosch_part_no_column, normalize_nissan_bosch_pn_column
+from pipeline.ps_history import ps_history_aggregates, read_ps_history, update_ps_history
+from pipeline.run_profile import profile_summary, save_profile, start_memory_tracing
+from pipeline.schema import NISSAN_SCHEMA, apply_schema, union_categories
+from pipeline.stage_graph import run_stages
+from pipeline.nissan_rules import CLAIM_RULES, apply_claim_rules, apply_subpart_filter, check_burden_ratio_frame
 
 
 # %%
@@ -168,40 +186,41 @@ CODES_IGNORE_COLOR = set(
 )
 
 # Automatic sorting depending on the beginning of part number
-PART_GROUP_PATTERNS = {
-    "A6600": "INJECTOR",
-    "13276": "INJECTOR",
-    "13270": "INJECTOR",
-    "14710": "INJECTOR",
-    "16672": "INJECTOR",
-    "14035": "Injection Valve",
-    "21049": "Injection Valve",
-    "16600": "Injection Valve",
-    "14465": "Injection Valve",
-    "16175": "Injection Valve",
-    "16630": "High Pressure Pump",
-    "17520": "High Pressure Pump",
-    "16072": "Dosing module",
-    "208S4": "Dosing module",
-    "17040": "Fuel Pump Mounting Unit",
-    "17342": "Fuel Pump Mounting Unit",
-    "17343": "Fuel Pump Mounting Unit",
-    "11065": "GLOW PLUG",
-    "24009": "GLOW PLUG",
-    "11067": "GLOW PLUG",
-    "22790": "NOx sensor",
-    "16618": "O-Ring",
-    "16635": "O-Ring",
-    "17521": "Supporting Disc",
-    "17520": "Supporting Disc",
-    "16612": "Supporting Disc",
-    "25060": "Sensor Assembly",
-    "23703": "CONTROL UNIT",
-    "14722": "RAIL",
-    "14735": "RAIL",
-    "B08D0": "RAIL",
-    "16683": "RAIL",
-}
+# (prefix, group) pairs; longest prefix wins, a repeated prefix is reported
+PART_GROUP_PATTERNS = [
+    ("A6600", "INJECTOR"),
+    ("13276", "INJECTOR"),
+    ("13270", "INJECTOR"),
+    ("14710", "INJECTOR"),
+    ("16672", "INJECTOR"),
+    ("14035", "Injection Valve"),
+    ("21049", "Injection Valve"),
+    ("16600", "Injection Valve"),
+    ("14465", "Injection Valve"),
+    ("16175", "Injection Valve"),
+    ("16630", "High Pressure Pump"),
+    ("17520", "High Pressure Pump"),
+    ("16072", "Dosing module"),
+    ("208S4", "Dosing module"),
+    ("17040", "Fuel Pump Mounting Unit"),
+    ("17342", "Fuel Pump Mounting Unit"),
+    ("17343", "Fuel Pump Mounting Unit"),
+    ("11065", "GLOW PLUG"),
+    ("24009", "GLOW PLUG"),
+    ("11067", "GLOW PLUG"),
+    ("22790", "NOx sensor"),
+    ("16618", "O-Ring"),
+    ("16635", "O-Ring"),
+    ("17521", "Supporting Disc"),
+    ("17520", "Supporting Disc"),
+    ("16612", "Supporting Disc"),
+    ("25060", "Sensor Assembly"),
+    ("23703", "CONTROL UNIT"),
+    ("14722", "RAIL"),
+    ("14735", "RAIL"),
+    ("B08D0", "RAIL"),
+    ("16683", "RAIL"),
+]
 
 # Normalize free-text expected group names to standard form
 EXPECTED_GROUP_NORMALIZATION = {
@@ -240,56 +259,6 @@ MONTH_LETTER_TO_CODE = {
 # 2. HELPER FUNCTIONS
 # ============================================================
 
-def align_to_template(
-    df: pd.DataFrame,
-    template_path: str,
-    column_mapping: dict | None = None,
-    default_value=np.nan,
-) -> pd.DataFrame:
-    """
-    Ensure df has at least all columns from template_path.
-    - If template col exists in df: keep as is.
-    - Else if mapping is provided and mapped source col exists in df: copy.
-    - Else: create col with default_value.
-    Returns df with columns ordered like the template.
-    """
-    template_header = pd.read_excel(template_path, nrows=0)
-    template_cols = list(template_header.columns)
-
-    column_mapping = column_mapping or {}
-
-    for col in template_cols:
-        if col in df.columns:
-            continue
-
-        # If we have an explicit mapping, use it
-        src = column_mapping.get(col)
-        if src and src in df.columns:
-            df[col] = df[src]
-        else:
-            df[col] = default_value
-
-    # Reorder columns to match template first; keep extra cols at the end
-    ordered_existing = [c for c in template_cols if c in df.columns]
-    extra_cols = [c for c in df.columns if c not in ordered_existing]
-    return df[ordered_existing + extra_cols]
-
-
-def normalize_bosch_part_no(pn):
-    """
-    Normalize Bosch part numbers:
-    - Convert to string
-    - Strip spaces
-    - Remove trailing '.0' from Excel float artifacts.
-    """
-    if pd.isna(pn):
-        return None
-    s = str(pn).strip()
-    if s.endswith(".0"):
-        s = s[:-2]
-    return s.replace(" ", "")
-
-
 def translate(df_main: pd.DataFrame,
               df_translation: pd.DataFrame,
               column1: str,
@@ -307,32 +276,10 @@ def translate(df_main: pd.DataFrame,
     return df_main
 
 
-def normalize_nissan_bosch_pn(pn):
-    """
-    Normalize Nissan/Bosch part numbers:
-    - Remove spaces, hyphens, dots and non-alphanumerics
-    - Keep only leading 8–12 chars (drop suffixes like KB, T00, etc.).
-    """
-    if pd.isna(pn):
-        return None
-
-    s = str(pn).replace(" ", "").replace("-", "").replace(".", "")
-    s = re.sub(r"[^0-9A-Za-z]", "", s)
-
-    match = re.match(r"([0-9A-Za-z]{8,12})", s)
-    if match:
-        return match.group(1)
-    return s
-
-
-def get_most_common_ezkl(df: pd.DataFrame, parts_no_prefix: str):
-    """
-    From EZKL mapping table, get the most common EZKL Name for a given prefix.
-    """
-    matching_rows = df[df["Bosch Parts No. Prefix"] == parts_no_prefix]
-    if not matching_rows.empty:
-        return matching_rows["EZKL Name"].mode()[0]
-    return None
+# Normalized part numbers by raw text (see pipeline.part_numbers); kept
+# for the session so re-running cells does not normalize them again
+BOSCH_PN_MEMO = {}
+NISSAN_PN_MEMO = {}
 
 
 def get_letter_from_claim_date(claim_date: str) -> str:
@@ -358,227 +305,17 @@ def get_OEM_date_month(objection_id: str) -> int:
     return alphabet_dict.get(third_character, None)
 
 
-def convert_to_date(value):
-    """
-    Convert various date encodings to pandas.Timestamp:
-    - Excel serial numbers (int/float or numeric string)
-    - 'yyyy/mm' strings
-    - otherwise return NaT
-    """
-    try:
-        # Excel serial number (int, float, or numeric string)
-        if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
-            base_date = datetime(1899, 12, 30)  # Excel's epoch
-            days = int(value)
-            return base_date + timedelta(days=days)
-
-        # yyyy/mm formatted string
-        if isinstance(value, str):
-            return pd.to_datetime(value, format="%Y/%m", errors="coerce")
-
-        return pd.NaT
-    except Exception:
-        return pd.NaT
-
-
-def clean_vehicle_mfd(val):
-    """
-    Normalize Vehicle MFD:
-    - NaN → NaT
-    - 4-digit year (int/float/str) → yyyy-01-01
-    - 'yyyy/mm' → first of that month
-    - other strings → parsed by pandas
-    """
-    try:
-        if pd.isna(val):
-            return pd.NaT
-
-        # numeric year like 2018 or 2018.0
-        if isinstance(val, (int, float)):
-            return pd.to_datetime(f"{int(val)}-01-01")
-
-        val_str = str(val).strip()
-
-        # 4-digit year
-        if re.match(r"^\d{4}$", val_str):
-            return pd.to_datetime(f"{val_str}-01-01")
-
-        # 'yyyy/mm'
-        if re.match(r"^\d{4}/\d{1,2}$", val_str):
-            return pd.to_datetime(val_str, format="%Y/%m", errors="coerce")
-
-        # fallback
-        return pd.to_datetime(val_str, errors="coerce")
-
-    except Exception:
-        return pd.NaT
-
-
 # ============================================================
 # BUSINESS RULE FUNCTIONS
 # ============================================================
 
-def check_burden_ratio(row: pd.Series) -> int:
-    """
-    Check burden ratio correctness based on EZKL, MFD, contract dates, and special HDEV5 logic.
-    Returns:
-        0 if correct
-        1 if incorrect
-    Note: this function assumes row has columns:
-          'Vehicle MFD', 'EZKL Name', 'Customer Parts No.', 'Burden Ratio',
-          'Standard Burden Ratio', 'Current Burden Ratio',
-          'New BR Date', 'SAP Date', '類別区分'
-    """
-    # Ensure "Vehicle MFD" is converted to a datetime object (yyyy/mm)
-    mfd = pd.to_datetime(row["Vehicle MFD"], format="%Y/%m")
-
-    if row["EZKL Name"] == "HDEV5":
-        # Special cases based on Customer Parts No. and 類別区分
-        if (
-            "166001VA0A" in row["Customer Parts No."]
-            or "166001VA0B" in row["Customer Parts No."]
-            or "166001VA0C" in row["Customer Parts No."]
-        ):
-            if re.match(r"^H", row["類別区分"]):
-                # Vehicle MFD date ranges for H-type
-                if mfd <= datetime(2021, 6, 30):
-                    return 0 if 2.4 <= row["Burden Ratio"] <= 3.4 else 1
-                elif mfd >= datetime(2021, 7, 1):
-                    return 0 if 49.5 <= row["Burden Ratio"] <= 50.5 else 1
-                else:
-                    return 1
-            else:
-                # Non-H 類別区分
-                return 0 if 5 <= row["Burden Ratio"] <= 6 else 1
-
-        elif "166005CA0A" in row["Customer Parts No."]:
-            return 0 if 5 <= row["Burden Ratio"] <= 6 else 1
-
-        elif (
-            "166006MR0B" in row["Customer Parts No."]
-            or "166006MR0C" in row["Customer Parts No."]
-        ):
-            return 0 if 5 <= row["Burden Ratio"] <= 6 else 1
-
-        else:
-            # Assign 0 but flag irregular case in "Irregular case BR"
-            # (Mutation is kept for behavior compatibility, even if apply() won't persist it.)
-            row["Irregular case BR"] = 1
-            return 0
-
-    if row["EZKL Name"] == "LUFT":
-        return 0
-
-    if pd.isna(row["EZKL Name"]):
-        return 0
-
-    # Default logic for non-HDEV5 / non-LUFT
-    new_br_date = pd.to_datetime(row["New BR Date"], errors="coerce")
-    sap_date = pd.to_datetime(row["SAP Date"], errors="coerce")
-
-    if pd.isna(new_br_date):
-        return 0 if row["Burden Ratio"] == row["Standard Burden Ratio"] else 1
-
-    if sap_date < new_br_date:
-        return 0 if row["Burden Ratio"] == row["Standard Burden Ratio"] else 1
-
-    return 0 if row["Burden Ratio"] == row["Current Burden Ratio"] else 1
-
-
-def generate_claim(row: pd.Series) -> int:
-    """
-    Claim decision (main logic).
-
-    Returns 1 (claim) when any critical flag is raised and Right_Month / High Denied Paid Ratio are not blocking.
-    """
-    # Automatically return 0 if Right_Month is 1
-    if row["Right_Month"] == 1:
-        return 0
-
-    # Automatically return 0 if High Denied Paid Ratio is 1
-    if row["High Denied Paid Ratio"] == 1:
-        return 0
-
-    # Check the other conditions only if the above are false
-    if (
-        row["TCA Outlier EZKL"] == 1
-        or row["BR Contract"] == 1
-        or row["Outside_warranty_period"] == 1
-        or row["HDEV6_countermeasure"] == 1
-        or row["HDEV6_over_120000"] == 1
-    ):
-        return 1
-
-    # Return 0 if none of the conditions are met
-    return 0
+# Prefix index built once from PART_GROUP_PATTERNS (see pipeline.part_groups)
+PART_GROUP_INDEX = build_prefix_index(PART_GROUP_PATTERNS)
 
 
-def generate_claim_DPR(row: pd.Series) -> int:
-    """
-    Claim decision variation for DPR logic.
-
-    Same as generate_claim, but does NOT consider 'High Denied Paid Ratio'.
-    """
-    # Automatically return 0 if Right_Month is 1
-    if row["Right_Month"] == 1:
-        return 0
-
-    # Check the other conditions only if the above are false
-    if (
-        row["TCA Outlier EZKL"] == 1
-        or row["BR Contract"] == 1
-        or row["Outside_warranty_period"] == 1
-        or row["HDEV6_countermeasure"] == 1
-        or row["HDEV6_over_120000"] == 1
-    ):
-        return 1
-
-    # Return 0 if none of the conditions are met
-    return 0
-
-
-def assign_group(part_number: str) -> str:
-    """
-    Assign a group based on the prefix of the part number.
-    Uses PART_GROUP_PATTERNS, checking longest prefixes first.
-    """
-    if not isinstance(part_number, str):
-        part_number = str(part_number)
-
-    for prefix in sorted(PART_GROUP_PATTERNS, key=len, reverse=True):
-        if part_number.startswith(prefix):
-            return PART_GROUP_PATTERNS[prefix]
-    return "Unknown"
-
-
-def normalize_expected(value):
-    """
-    Normalize 'Expected group' free-text into a standard label.
-    - Lowercases / strips
-    - Cuts off after ';', ',' or ':' if present
-    - Maps through EXPECTED_GROUP_NORMALIZATION
-    """
-    if not value:
-        return "unassigned"
-
-    val = str(value).strip().lower()
-
-    # Remove known suffixes after delimiters (e.g., ';', ',', ':')
-    for delimiter in [";", ",", ":"]:
-        if delimiter in val:
-            val = val.split(delimiter)[0].strip()
-            break
-
-    # Normalize using dictionary
-    return EXPECTED_GROUP_NORMALIZATION.get(val, val)
-
-
-def is_similar(a: str, b: str, threshold: int = 90) -> bool:
-    """
-    Fuzzy similarity between two strings using rapidfuzz.ratio.
-    Returns True if similarity >= threshold.
-    """
-    return fuzz.ratio(a.lower(), b.lower()) >= threshold
+# Subpart check: expected name vs part group is similar when
+# fuzz.ratio (lowercased) >= this threshold (see pipeline.fuzzy_match)
+SUBPART_SIMILARITY_THRESHOLD = 90
 
 
 def refno_to_month_code(ref_no):
@@ -619,6 +356,99 @@ file_path = fr"{ROOT_DIR}\20{DATE_YYMM}\nissan_{DATE_YYMM}_GB.xlsx"
 # Path to save predicted labels / outputs
 result_file_path = fr"{ROOT_DIR}\20{DATE_YYMM}"
 
+# PS database (all OEMs, slow to read from the share)
+PS_DATABASE_PATH = r"\\bosch.com\dfsrb\DfsJP\DIV\PS\QMC\All\06.QMM_QMD\60.Data_Base\2.Warranty_data\PS_Database.xlsm"
+
+# Translation table for the monthly Nissan objection file
+NEW_TRANSLATION_PATH = fr"{ROOT_DIR}\Nissan_異議申請リスト_translated_forAI.xlsx"
+
+# Burden-ratio contract table (all customers)
+BURDEN_RATIO_PATH = (
+    r"\\BOSCH.COM\DfsRB\DfsJP\DIV\PS\z_Collabo\0173_PSQMC_123\PSQMC_Share\2_General\Quality_data"
+    r"\Q_Reporting\01 GS-JP External defect cost\2 Customer別 要求事項\顧客別負担割合一覧表.xlsx"
+)
+
+# Objection status list (historical decisions)
+OBJECTION_STATUS_PATH = (
+    r"\\BOSCH.COM\DfsRB\DfsJP\DIV\PS\z_Collabo\0215_QMM_JP3_Share\Claim_WBS\4.Warranty_Info"
+    r"\異議申請状況確認リスト_PC.xlsx"
+)
+
+# Local Parquet cache for slow Excel sources (rebuilt when the workbook changes)
+PS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "warranty-judge")
+
+# Parquet snapshots of the 4.0 Excel loads
+LOAD_CACHE_DIR = PS_CACHE_DIR
+
+# Cleaned PS Nissan history, one partition per SAP month (see 4.5)
+PS_HISTORY_DIR = os.path.join(PS_CACHE_DIR, "ps_history")
+
+# Fuzzy scores of (expected name, part group) pairs kept between runs (see 8.2)
+SUBPART_SCORE_CACHE = os.path.join(PS_CACHE_DIR, "subpart_pair_scores.parquet")
+
+# Per-stage run log (wall / CPU time, memory, rows), saved next to the
+# monthly outputs (see 10); .parquet also works
+RUN_LOG_PATH = fr"{result_file_path}\run_log_20{DATE_YYMM}.json"
+
+# Also trace Python / numpy allocations per stage (py_peak_mb); slows the run
+PROFILE_PYTHON_MEMORY = False
+
+# Offline run on generated inputs in the production schema
+# (pipeline.nissan_synthetic), e.g. {"n_ps_rows": 300_000, "n_new_claims": 3_000};
+# None → the share workbooks. All outputs then go below SYNTHETIC_DIR (see 10).
+SYNTHETIC_INPUTS = None
+
+# With SYNTHETIC_INPUTS: also write the inputs as local workbooks and load
+# them through 4.0, so the Excel load is run / profiled as well (slower)
+SYNTHETIC_WORKBOOKS = False
+
+# PS columns never used by the pipeline (translated names); they are
+# skipped while the sheet is parsed instead of dropped afterwards
+PS_DROP_COLUMNS = ["Product Code(DS)", "Product Code", "Sequence No.", "c3", "Division"]
+
+# First SAP Date kept from the PS history
+PS_HISTORY_START = pd.Timestamp("2021-01-01")
+
+# Nissan slice of the PS history (translated names). Pushed down into the
+# cached snapshot scan, so other OEMs / old rows never reach pandas.
+# "SAP Date < claim date" is not listed: it is applied after the
+# Reference No. dedupe in 4.1 and filtering earlier would change the result.
+PS_NISSAN_FILTERS = [
+    ("OEM Name", "==", "日産"),
+    ("Key No.", "!=", "M"),
+    ("SAP Date", ">=", PS_HISTORY_START),
+]
+
+# Columns needed from the full PS history (all OEMs) for the EZKL lookup
+PS_EZKL_COLUMNS = ["Bosch Parts No.", "EZKL Name"]
+
+# PS_Data sheet (shared by the "ps_*" specs: one cached snapshot, two slices)
+PS_DATA_SPEC = {
+    "path": PS_DATABASE_PATH,
+    "sheet_name": "PS_Data",
+    "header": 1,
+    "cache": True,
+    "drop_columns": PS_DROP_COLUMNS,
+    "translation": {"sheet": "ps_translation", "from": "PS_Data Columns", "to": "Translated Version"},
+}
+
+# Section 4 inputs: one entry per (workbook, sheet, header, slice). Each
+# workbook is opened once; workbooks are loaded in parallel (see 4.0). The
+# fastest installed Excel engine is used (python-calamine if present, else openpyxl).
+INPUT_MANIFEST = [
+    {**PS_DATA_SPEC, "name": "ps_ezkl", "columns": PS_EZKL_COLUMNS},
+    {**PS_DATA_SPEC, "name": "ps_nissan", "filters": PS_NISSAN_FILTERS},
+    {"name": "ps_translation", "path": PS_DATABASE_PATH, "sheet_name": "Translation", "header": 0, "cache": True},
+    {"name": "new", "path": file_path, "sheet_name": SHEET_PS, "header": 0},
+    {"name": "new_translation", "path": NEW_TRANSLATION_PATH, "sheet_name": 0, "header": 0},
+    {"name": "burden", "path": BURDEN_RATIO_PATH, "sheet_name": "2021", "header": 4},
+    {"name": "obj", "path": OBJECTION_STATUS_PATH, "sheet_name": "Nissan", "header": 1},
+    {"name": "obj_translation", "path": OBJECTION_STATUS_PATH, "sheet_name": "Translation", "header": 0},
+]
+
+
+# Bosch Parts Names excluded from PS history and new data
+EXCLUDED_PARTS_NAMES = ["CP1H recall", "新負担割合による遡及精算分", "ECM　キャンペーン費用"]
 
 # Replacement dictionary for product names and EZKL corrections
 REPLACEMENTS = {
@@ -638,15 +468,22 @@ AI_TEMPLATE_PATH = fr"{ROOT_DIR}\AI_validated_claims_template.xlsx"
 # Historical clean file (non-aggregated)
 AI_CLAIMS_CLEAN_PATH = fr"{ROOT_DIR}\AI_validated_claims_clean.xlsx"
 
-# Aggregated file consumed by Power BI
+# Aggregated file consumed by Power BI (materialized from the store below)
 AI_CLAIMS_AGG_PATH = fr"{ROOT_DIR}\AI_validated_claims.xlsx"
 
+# Aggregate history, one Parquet partition per AI_DATE (see 9)
+AI_CLAIMS_STORE_DIR = fr"{ROOT_DIR}\AI_validated_claims_store"
+
 # Mapping from old Power BI column names → new refactor column names
 # Extend this dict if you find more legacy Japanese columns later.
 COLUMN_MAPPING = {
     "判定.1": "claim",   # old column used by the model → new "claim"
 }
 
+# Formats written for the results / aggregate files (pipeline.exporter):
+# "xlsx" for Power BI; add "parquet" / "csv" to also write those next to it
+EXPORT_FORMATS = ("xlsx",)
+
 
 # %%
 # ============================================================
@@ -654,195 +491,205 @@ COLUMN_MAPPING = {
 # ============================================================
 
 # ------------------------------------------------------------
-# 4.1 PS DATA (GLOBAL, SLOW TO LOAD)
+# 4.0 LOAD ALL INPUTS (PARALLEL)
 # ------------------------------------------------------------
 # Note:
-# PS data takes a long time to load (~7 min). When iterating on
-# logic below, you can comment this block out *after* it is in
-# memory, as long as you don't restart the kernel.
-
-df_ps = pd.read_excel(
-    r"\\bosch.com\dfsrb\DfsJP\DIV\PS\QMC\All\06.QMM_QMD\60.Data_Base\2.Warranty_data\PS_Database.xlsm",
-    sheet_name="PS_Data",
-    header=1,
-)
-
-# Translation sheet for PS columns
-df_ps_translation = pd.read_excel(
-    r"\\bosch.com\dfsrb\DfsJP\DIV\PS\QMC\All\06.QMM_QMD\60.Data_Base\2.Warranty_data\PS_Database.xlsm",
-    sheet_name="Translation",
-    header=0,
-)
-df_ps = translate(df_ps, df_ps_translation, column1="PS_Data Columns", column2="Translated Version")
-
-# --- Master EZKL lookup from full PS database (no Nissan filter) ---
-
-# Normalize Bosch part numbers
-df_ps["Bosch Parts No. norm"] = df_ps["Bosch Parts No."].apply(normalize_bosch_part_no)
-df_ps["Bosch Prefix 10"] = df_ps["Bosch Parts No. norm"].str[:10]
-
-# Build mapping: prefix -> most common EZKL Name
-ezkl_lookup = (
-    df_ps
-    .dropna(subset=["Bosch Prefix 10", "EZKL Name"])
-    .groupby("Bosch Prefix 10")["EZKL Name"]
-    .agg(lambda s: s.mode().iat[0] if not s.mode().empty else s.iloc[0])
-    .reset_index()
-    .rename(columns={"EZKL Name": "EZKL_from_PS"})
-)
-
-# Ensure SAP Date is datetime before any filtering
-df_ps["SAP Date"] = pd.to_datetime(df_ps["SAP Date"], errors="coerce")
+# Reading PS_Database.xlsm from the share takes ~7 min. The first
+# load writes a Parquet snapshot to LOAD_CACHE_DIR; later runs read
+# that snapshot in seconds and only go back to Excel when the
+# workbook changes (mtime/size/content hash).
+# From the snapshot only the needed slices are scanned: the two EZKL
+# lookup columns for all OEMs, and the Nissan rows (PS_NISSAN_FILTERS).
+# The other workbooks are read concurrently on threads, which overlaps
+# the share I/O (see load_report). No process pool here: this script runs
+# at module top level, and spawned workers (Windows) would re-run it.
+
+def stage_4_0_load_inputs():
+    """Every INPUT_MANIFEST sheet (in manifest order), then the load report."""
+    inputs, load_report = load_excel_manifest(INPUT_MANIFEST, cache_dir=LOAD_CACHE_DIR)
+    return (*(inputs[spec["name"]] for spec in INPUT_MANIFEST), load_report)
 
-# Filter for Nissan-related data
-df_ps_nissan = df_ps[df_ps["OEM Name"] == "日産"]
-df_ps_nissan = df_ps_nissan[df_ps_nissan["Key No."] != "M"]
 
-cutoff = pd.Timestamp("2021-01-01")
-df_ps_nissan = df_ps_nissan[df_ps_nissan["SAP Date"] >= cutoff]
-
-df_ps_nissan["Objection ID"] = df_ps_nissan["Reference No."].str[:8]
-df_ps_nissan["Bosch Parts No. Prefix"] = df_ps_nissan["Bosch Parts No."].str[:10]
+# ------------------------------------------------------------
+# 4.1 PS DATA (GLOBAL, SLOW TO LOAD)
+# ------------------------------------------------------------
 
-# Exclude irrelevant cases
-df_ps_nissan = df_ps_nissan[
-    ~df_ps_nissan["Bosch Parts Name"].isin(["CP1H recall", "新負担割合による遡及精算分", "ECM　キャンペーン費用"])
-]
-df_ps_nissan = df_ps_nissan[~df_ps_nissan["EZKL Name"].str.contains(r"\(S\)")]
+def stage_4_1_ps_data(ps_ezkl, ps_nissan, ps_translation):
+    """EZKL lookup from the full PS database + translated Nissan PS rows."""
+    # Translation sheet for PS columns
+    df_ps_translation = ps_translation
 
-# Replace EZKL Names based on replacement dictionary (from config)
-df_ps_nissan["EZKL Name"] = df_ps_nissan["EZKL Name"].replace(REPLACEMENTS)
+    # --- Master EZKL lookup from full PS database (no Nissan filter) ---
+    # Only the two lookup columns are read for all OEMs
+    df_ps = ps_ezkl
+    df_ps = translate(df_ps, df_ps_translation, column1="PS_Data Columns", column2="Translated Version")
 
-# Drop unnecessary columns
-df_ps_nissan = df_ps_nissan.drop(
-    columns=["Product Code(DS)", "Product Code", "Sequence No.", "c3", "Division"]
-)
+    # Normalize Bosch part numbers
+    df_ps["Bosch Parts No. norm"] = normalize_bosch_part_no_column(df_ps["Bosch Parts No."], BOSCH_PN_MEMO)
+    df_ps["Bosch Prefix 10"] = df_ps["Bosch Parts No. norm"].str[:10]
 
-# Drop duplicate Reference No., keeping most recent SAP Date
-df_sorted = df_ps_nissan.sort_values(by=["Reference No.", "SAP Date"], ascending=[True, False])
-df_ps_nissan = df_sorted.drop_duplicates(subset="Reference No.", keep="first")
+    # Build mapping: prefix -> most common EZKL Name (dict, used with .map)
+    ezkl_lookup = build_mode_lookup(df_ps, "Bosch Prefix 10", "EZKL Name")
 
-# Filter to exclude the current claim month from PS database
-df_ps_nissan["SAP Date"] = pd.to_datetime(df_ps_nissan["SAP Date"], errors="coerce")
-df_ps_nissan = df_ps_nissan.loc[df_ps_nissan["SAP Date"] < claim_date_ts]
+    # --- Nissan history (PS_NISSAN_FILTERS already applied while reading) ---
+    # Cleaned incrementally in 4.5, once the burden / objection tables are loaded
+    df_ps_nissan_raw = translate(
+        ps_nissan, df_ps_translation, column1="PS_Data Columns", column2="Translated Version"
+    )
 
-# Convert installation date to datetime
-df_ps_nissan["Parts Warranty Installation Date"] = df_ps_nissan[
-    "Parts Warranty Installation Date"
-].apply(convert_to_date)
+    return ezkl_lookup, df_ps_nissan_raw
 
 
 # ------------------------------------------------------------
 # 4.2 UNTRAINED (NEW) NISSAN DATA
 # ------------------------------------------------------------
-df_new = pd.read_excel(file_path, sheet_name=SHEET_PS)
 
-# Translation sheet for new Nissan objection file
-df_new_translation = pd.read_excel(
-    r"\\bosch.com\DfsRB\DfsJP\DIV\PS\z_Collabo\0215_QMM_JP3_Share\Claim_WBS\4.Warranty_Info\11.Nissan_異議\Nissan_異議申請リスト_translated_forAI.xlsx"
-)
-df_new = translate(df_new, df_new_translation, column1="Nissan Columns", column2="Translated Version")
-
-# Filter relevant divisions
-# df_new = df_new.loc[df_new["Parts Distinction"] == 1]
-df_new = df_new.loc[df_new["Division"].isin(["PS(GS)", "PS(DS)", "P"])]
-# "P" is actually an error resulting from the macros, this may be fixed in the near future
-
-# Extract key columns
-df_new["Objection ID"] = df_new["Reference No."].str[:8]
-df_new["Bosch Parts No. Prefix"] = df_new["Bosch Parts No."].str[:10]
-df_new["EZKL Name"] = df_new["Bosch Parts No. Prefix"].apply(
-    lambda x: get_most_common_ezkl(df_ps_nissan, x)
-)
-
-# Normalize Bosch Parts Name to lowercase
-df_new["Bosch Parts Name"] = df_new["Bosch Parts Name"].fillna("").str.lower()
-
-# Standardize SAP Date name/type
-df_new["SAP Date"] = df_new["EDP Date"]
-df_new["SAP Date"] = pd.to_datetime(df_new["SAP Date"], errors="coerce")
+def stage_4_2_new_data(new, new_translation):
+    """Monthly Nissan objection file: translated, filtered, key columns."""
+    df_new = new
+
+    # Translation sheet for new Nissan objection file
+    df_new_translation = new_translation
+    df_new = translate(df_new, df_new_translation, column1="Nissan Columns", column2="Translated Version")
+
+    # Filter relevant divisions
+    # df_new = df_new.loc[df_new["Parts Distinction"] == 1]
+    df_new = df_new.loc[df_new["Division"].isin(["PS(GS)", "PS(DS)", "P"])]
+    # "P" is actually an error resulting from the macros, this may be fixed in the near future
+
+    # Extract key columns
+    df_new["Objection ID"] = df_new["Reference No."].str[:8]
+    df_new["Bosch Parts No. Prefix"] = df_new["Bosch Parts No."].str[:10]
+    # EZKL Name is looked up from the PS Nissan history in 5
+
+    # Normalize Bosch Parts Name to lowercase
+    df_new["Bosch Parts Name"] = df_new["Bosch Parts Name"].fillna("").str.lower()
+
+    # Standardize SAP Date name/type
+    df_new["SAP Date"] = df_new["EDP Date"]
+    df_new["SAP Date"] = pd.to_datetime(df_new["SAP Date"], errors="coerce")
+
+    # Exclude irrelevant cases
+    df_new = df_new[~df_new["Bosch Parts Name"].isin(EXCLUDED_PARTS_NAMES)]
+
+    # Compact dtypes for the key text columns (pipeline.schema)
+    # - EZKL Name is still filled up to 7.5 and becomes categorical there
+    # - Objection ID stays text: .apply on a categorical returns a categorical
+    df_new, _ = apply_schema(
+        df_new,
+        {**NISSAN_SCHEMA, "Objection ID": "string"},
+        columns=[c for c in NISSAN_SCHEMA if c != "EZKL Name"],
+        name="df_new",
+    )
 
-# Exclude irrelevant cases
-df_new = df_new[
-    ~df_new["Bosch Parts Name"].isin(["CP1H recall", "新負担割合による遡及精算分", "ECM　キャンペーン費用"])
-]
+    return df_new
 
 
 # ------------------------------------------------------------
 # 4.3 BURDEN RATIO CONTRACT DATA
 # ------------------------------------------------------------
-df_burden = pd.read_excel(
-    r"\\BOSCH.COM\DfsRB\DfsJP\DIV\PS\z_Collabo\0173_PSQMC_123\PSQMC_Share\2_General\Quality_data\Q_Reporting\01 GS-JP External defect cost\2 Customer別 要求事項\顧客別負担割合一覧表.xlsx",
-    sheet_name="2021",
-    header=4,
-)
-
-# Translate columns
-df_burden.rename(
-    columns={
-        "製品名\n（EZKL名称）": "EZKL Name",
-        "製品コード\n(EZKL)": "EZKL (Product Class)",
-        "基準負担率\nBosch": "Standard Burden Ratio",
-        "現状負担率\nBosch": "Current Burden Ratio",
-        "適用開始日": "New BR Date",
-        "変更後負担率有効期限": "New BR Expiry Date",
-        "備考1": "Remarks 1",
-        "備考2": "Remarks 2",
-        "最終更新日/確認日": "Last Updated Date",
-    },
-    inplace=True,
-)
 
-# Nissan-only rows
-df_burden_nissan = df_burden.loc[df_burden["メーカー"] == "NISSAN"]
+def stage_4_3_burden(burden):
+    """Nissan rows of the burden-ratio contract table."""
+    df_burden = burden
+
+    # Translate columns
+    df_burden.rename(
+        columns={
+            "製品名\n（EZKL名称）": "EZKL Name",
+            "製品コード\n(EZKL)": "EZKL (Product Class)",
+            "基準負担率\nBosch": "Standard Burden Ratio",
+            "現状負担率\nBosch": "Current Burden Ratio",
+            "適用開始日": "New BR Date",
+            "変更後負担率有効期限": "New BR Expiry Date",
+            "備考1": "Remarks 1",
+            "備考2": "Remarks 2",
+            "最終更新日/確認日": "Last Updated Date",
+        },
+        inplace=True,
+    )
 
-# Drop unnecessary columns
-df_burden_nissan.drop(
-    columns=["Unnamed: 13", "メーカー", "代表品番", "負担率決定合意書保存先リンク"],
-    inplace=True,
-)
+    # Nissan-only rows
+    df_burden_nissan = df_burden.loc[df_burden["メーカー"] == "NISSAN"]
 
-# Exclude irrelevant cases for BR logic
-df_burden_nissan = df_burden_nissan[
-    ~(
-        (df_burden_nissan["EZKL Name"] == "LS")
-        & (df_burden_nissan["Current Burden Ratio"] == 1.5)
+    # Drop unnecessary columns
+    df_burden_nissan.drop(
+        columns=["Unnamed: 13", "メーカー", "代表品番", "負担率決定合意書保存先リンク"],
+        inplace=True,
     )
-]
-df_burden_nissan = df_burden_nissan[
-    ~(
-        (df_burden_nissan["EZKL Name"] == "HDEV5")
-        & ~(df_burden_nissan["Current Burden Ratio"] == "5.5\n(一部50%)")
-    )
-]
+
+    # Exclude irrelevant cases for BR logic
+    df_burden_nissan = df_burden_nissan[
+        ~(
+            (df_burden_nissan["EZKL Name"] == "LS")
+            & (df_burden_nissan["Current Burden Ratio"] == 1.5)
+        )
+    ]
+    df_burden_nissan = df_burden_nissan[
+        ~(
+            (df_burden_nissan["EZKL Name"] == "HDEV5")
+            & ~(df_burden_nissan["Current Burden Ratio"] == "5.5\n(一部50%)")
+        )
+    ]
+
+    return df_burden_nissan
 
 
 # ------------------------------------------------------------
 # 4.4 OBJECTION DATA (HISTORICAL)
 # ------------------------------------------------------------
 # Kept for reference and possible future ML usage.
-df_obj_nissan = pd.read_excel(
-    r"\\BOSCH.COM\DfsRB\DfsJP\DIV\PS\z_Collabo\0215_QMM_JP3_Share\Claim_WBS\4.Warranty_Info\異議申請状況確認リスト_PC.xlsx",
-    sheet_name="Nissan",
-    header=1,
-)
 
-df_obj_translation = pd.read_excel(
-    r"\\BOSCH.COM\DfsRB\DfsJP\DIV\PS\z_Collabo\0215_QMM_JP3_Share\Claim_WBS\4.Warranty_Info\異議申請状況確認リスト_PC.xlsx",
-    sheet_name="Translation",
-    header=0,
-)
-df_obj_nissan = translate(df_obj_nissan, df_obj_translation, column1="Nissan Columns", column2="Translated Version")
+def stage_4_4_objection(obj, obj_translation):
+    """Decided objections (却下 / 受理) and the pending ones (申請中)."""
+    df_obj_nissan = obj
+
+    df_obj_translation = obj_translation
+    df_obj_nissan = translate(df_obj_nissan, df_obj_translation, column1="Nissan Columns", column2="Translated Version")
+
+    df_obj_nissan.rename(
+        columns={"Return Amount": "Saved Amount", "Return Amount1": "Saved Amount1"},
+        inplace=True,
+    )
+
+    df_excluded_nissan = df_obj_nissan[df_obj_nissan["Status"] == "申請中"]
+    df_obj_nissan = df_obj_nissan[df_obj_nissan["Status"].isin(["却下", "受理"])]
+
+    df_obj_nissan["Objection ID"] = df_obj_nissan["Reference No."].str[:8]
+
+    return df_obj_nissan, df_excluded_nissan
 
-df_obj_nissan.rename(
-    columns={"Return Amount": "Saved Amount", "Return Amount1": "Saved Amount1"},
-    inplace=True,
-)
 
-df_excluded_nissan = df_obj_nissan[df_obj_nissan["Status"] == "申請中"]
-df_obj_nissan = df_obj_nissan[df_obj_nissan["Status"].isin(["却下", "受理"])]
+# ------------------------------------------------------------
+# 4.5 PS NISSAN HISTORY (INCREMENTAL)
+# ------------------------------------------------------------
+# Note:
+# The PS history is cleaned (end of 4.1, PS merges of 5, duplicate
+# resolution of 6.1: pipeline.ps_history.clean_ps_history) and kept in
+# PS_HISTORY_DIR as one partition per SAP month. Each run only re-cleans
+# the Objection IDs whose PS rows / objection status changed and
+# rewrites the months they touch; see ps_history_report.
+# The statistics used below (EZKL lookup, TCA mean/std, DPR ratios,
+# registration → failure lag) are merged from per-month aggregates.
+
+def stage_4_5_ps_history(df_ps_nissan_raw, df_burden_nissan, df_obj_nissan):
+    """Update the PS history store; its report, aggregates and cleaned rows."""
+    ps_history_report = update_ps_history(
+        df_ps_nissan_raw,
+        df_burden_nissan,   # before the Control Unit row is added (section 5)
+        df_obj_nissan,
+        claim_date_ts,
+        PS_HISTORY_DIR,
+        history_start=PS_HISTORY_START,
+        replacements=REPLACEMENTS,
+        excluded_parts_names=EXCLUDED_PARTS_NAMES,
+        drop_columns=PS_DROP_COLUMNS,
+    )
+    ps_stats = ps_history_aggregates(PS_HISTORY_DIR)
+    df_ps_nissan = read_ps_history(PS_HISTORY_DIR)
+    df_ps_nissan, _ = apply_schema(df_ps_nissan, NISSAN_SCHEMA, name="df_ps_nissan")
 
-df_obj_nissan["Objection ID"] = df_obj_nissan["Reference No."].str[:8]
+    return ps_history_report, ps_stats, df_ps_nissan
 
 
 # %%
@@ -850,50 +697,36 @@ df_obj_nissan["Objection ID"] = df_obj_nissan["Reference No."].str[:8]
 # 5. CONTROL UNIT NORMALIZATION + MERGES
 # ============================================================
 
-# Normalize Bosch Parts Name to lower case for matching
-name_col = df_ps_nissan["Bosch Parts Name"].fillna("").str.lower()
-
-# Ensure EZKL column exists (safety, even though it should already be present)
-if "EZKL Name" not in df_ps_nissan.columns:
-    df_ps_nissan["EZKL Name"] = None
-
-# Assign EZKL "Control Unit" to any PS rows whose name contains "control unit"
-df_ps_nissan.loc[name_col.str.contains("control unit"), "EZKL Name"] = "Control Unit"
-
-# Merge PS Nissan data with Burden Ratio table (no Control Unit row yet → preserves original behavior)
-df_ps_nissan = df_ps_nissan.merge(
-    df_burden_nissan[["EZKL Name", "Standard Burden Ratio", "Current Burden Ratio", "New BR Date"]],
-    on="EZKL Name",
-    how="left",
-)
+# PS Nissan history: Control Unit EZKL patch and burden / status merges
+# are part of clean_ps_history (4.5)
+
+def stage_5_merges(df_new, df_burden_nissan, ps_stats):
+    """EZKL Name from the PS history, Control Unit burden row, burden ratio merge."""
+    # Most common EZKL per prefix in PS Nissan history (same tie-break as Series.mode()[0])
+    df_new["EZKL Name"] = df_new["Bosch Parts No. Prefix"].map(ps_stats["ezkl_by_prefix"])
+
+    # Add Control Unit row to burden table if not already present
+    if "Control Unit" not in df_burden_nissan["EZKL Name"].values:
+        control_unit_row = pd.DataFrame(
+            [
+                {
+                    "EZKL Name": "Control Unit",
+                    "Standard Burden Ratio": 0.5,
+                    "Current Burden Ratio": 0.5,
+                    "New BR Date": pd.to_datetime("2021-01-01"),
+                }
+            ]
+        )
+        df_burden_nissan = pd.concat([df_burden_nissan, control_unit_row], ignore_index=True)
 
-# Add Control Unit row to burden table if not already present
-if "Control Unit" not in df_burden_nissan["EZKL Name"].values:
-    control_unit_row = pd.DataFrame(
-        [
-            {
-                "EZKL Name": "Control Unit",
-                "Standard Burden Ratio": 0.5,
-                "Current Burden Ratio": 0.5,
-                "New BR Date": pd.to_datetime("2021-01-01"),
-            }
-        ]
+    # Merge Burden Ratio into new (untrained) Nissan data
+    df_new = df_new.merge(
+        df_burden_nissan[["EZKL Name", "Standard Burden Ratio", "Current Burden Ratio", "New BR Date"]],
+        on="EZKL Name",
+        how="left",
     )
-    df_burden_nissan = pd.concat([df_burden_nissan, control_unit_row], ignore_index=True)
 
-# Merge objection status into PS Nissan data
-df_ps_nissan = df_ps_nissan.merge(
-    df_obj_nissan[["Objection ID", "Total Claimed Amount", "Status"]],
-    on=["Objection ID", "Total Claimed Amount"],
-    how="left",
-)
-
-# Merge Burden Ratio into new (untrained) Nissan data
-df_new = df_new.merge(
-    df_burden_nissan[["EZKL Name", "Standard Burden Ratio", "Current Burden Ratio", "New BR Date"]],
-    on="EZKL Name",
-    how="left",
-)
+    return df_new, df_burden_nissan
 
 
 # %%
@@ -907,95 +740,31 @@ df_new = df_new.merge(
 # 6.1 Merging Duplicates Issue
 # ------------------------------------------------------------
 
-# Translate Status values (JP → EN)
-df_ps_nissan["Status"] = df_ps_nissan["Status"].map({"却下": "Rejected", "受理": "Accepted"})
-
-# Count occurrences of each Objection ID
-obj_id_counts = df_ps_nissan["Objection ID"].value_counts()
-
-# Temporary status to distinguish NaN rows
-df_ps_nissan["Status_temp"] = df_ps_nissan.apply(
-    lambda row: f"NaN_{row.name}" if pd.isna(row["Status"]) else row["Status"],
-    axis=1,
-)
-
-# Objection IDs that appear exactly twice
-obj_ids_twice = obj_id_counts[obj_id_counts == 2].index
-obj_no_2 = df_ps_nissan[df_ps_nissan["Objection ID"].isin(obj_ids_twice)]
-
-# Among those, IDs with more than one distinct Status_temp (i.e., conflicting statuses)
-status_counts = obj_no_2.groupby("Objection ID")["Status_temp"].nunique()
-conflict_ids = status_counts[status_counts > 1].index
-
-# For conflicting IDs, get the earliest SAP Date row
-OBJ_SAP = df_ps_nissan[df_ps_nissan["Objection ID"].isin(conflict_ids)].sort_values(
-    by=["Objection ID", "SAP Date"],
-    ascending=True,
-)
-
-OBJ_SAP_sorted = OBJ_SAP.sort_values(by=["Objection ID", "SAP Date"], ascending=True)
-OBJ_SAP_order = OBJ_SAP_sorted.drop_duplicates(subset=["Objection ID"], keep="first")
-
-# Attach earliest SAP Date per conflicting Objection ID
-earliest = OBJ_SAP_order[["Objection ID", "SAP Date"]].rename(
-    columns={"SAP Date": "Earliest SAP Date"}
-)
-df_ps_nissan = df_ps_nissan.merge(earliest, on="Objection ID", how="left")
-
-# Drop later SAP Date rows for those conflicting IDs
-mask_drop = (
-    df_ps_nissan["Earliest SAP Date"].notna()
-    & (df_ps_nissan["SAP Date"] > df_ps_nissan["Earliest SAP Date"])
-)
-df_ps_nissan = df_ps_nissan[~mask_drop].drop(columns=["Earliest SAP Date"])
-
-# Final dedupe: keep last record per (Objection ID, Total Claimed Amount)
-df_nissan_sorted = df_ps_nissan.sort_values(
-    by=["Objection ID", "Total Claimed Amount", "SAP Date"],
-    ascending=True,
-)
-df_ps_nissan = df_nissan_sorted.drop_duplicates(
-    subset=["Objection ID", "Total Claimed Amount"],
-    keep="last",
-)
-
-# Clean up temp column
-df_ps_nissan.drop(columns=["Status_temp"], inplace=True)
+# Done per Objection ID in clean_ps_history (4.5): status translation,
+# conflicting statuses → earliest SAP Date, last record per
+# (Objection ID, Total Claimed Amount).
 
 
 # ------------------------------------------------------------
 # 6.2 Treating Missing Values
 # ------------------------------------------------------------
 
-# Mean registration-to-failure time (for both PS and new data fallback)
-mean_reg_fal_time = (
-    df_ps_nissan["Vehicle Failure Date"].mean()
-    - df_ps_nissan["Vehicle Registration Date"].mean()
-)
-
-# Fill missing Vehicle MFD in PS data
-for index, row in df_ps_nissan[df_ps_nissan["Vehicle MFD"].isna()].iterrows():
-    if pd.notna(row["Vehicle Registration Date"]):
-        df_ps_nissan.at[index, "Vehicle MFD"] = row["Vehicle Registration Date"]
-    else:
-        df_ps_nissan.at[index, "Vehicle MFD"] = row["Vehicle Failure Date"] - mean_reg_fal_time
+def stage_6_2_missing_values(df_ps_nissan, df_new, ps_stats):
+    """Vehicle MFD imputation (PS + new data) and PS Passed Month fill."""
+    # Mean registration-to-failure time (for both PS and new data fallback)
+    mean_reg_fal_time = ps_stats["mean_reg_fal_time"]
 
-# Fill missing Vehicle MFD in new data
-# 1st rule: use Vehicle Registration Date year when available
-df_new.loc[df_new["Vehicle MFD"].isna(), "Vehicle MFD"] = df_new["Vehicle Registration Date"].dt.year
+    # Fill missing Vehicle MFD (one masked fill per frame, datetime64 output)
+    # - PS data: registration date, else failure date minus mean lag
+    # - new data: registration year (Jan 1st), else failure date minus mean lag
+    df_ps_nissan["Vehicle MFD"] = impute_vehicle_mfd(df_ps_nissan, mean_reg_fal_time)
+    df_new["Vehicle MFD"] = impute_vehicle_mfd(df_new, mean_reg_fal_time, registration_as_year=True)
 
-# 2nd rule: for remaining NaN, approximate with Failure Date minus mean lag
-df_new.loc[df_new["Vehicle MFD"].isna(), "Vehicle MFD"] = (
-    df_new.loc[df_new["Vehicle MFD"].isna(), "Vehicle Failure Date"] - mean_reg_fal_time
-)
+    # Fill missing Passed Month in PS data
+    mean_passed_month = df_ps_nissan["Passed Month"].mean()
+    df_ps_nissan["Passed Month"] = df_ps_nissan["Passed Month"].fillna(mean_passed_month)
 
-# Normalize Vehicle MFD in df_new to proper datetime
-df_new["Vehicle MFD"] = df_new["Vehicle MFD"].apply(clean_vehicle_mfd)
-df_new["Vehicle MFD"] = pd.to_datetime(df_new["Vehicle MFD"])
-
-# Fill missing Passed Month in PS data
-mean_passed_month = df_ps_nissan["Passed Month"].mean()
-df_ps_nissan["Passed Month"].fillna(mean_passed_month, inplace=True)
+    return df_ps_nissan, df_new
 
 
 # %%
@@ -1007,394 +776,424 @@ df_ps_nissan["Passed Month"].fillna(mean_passed_month, inplace=True)
 # 7.1 Fixing Data Types
 # ------------------------------------------------------------
 
-df_ps_nissan["SAP Date"] = pd.to_datetime(df_ps_nissan["SAP Date"], format="%Y-%m-%d")
-df_ps_nissan["New BR Date"] = pd.to_datetime(df_ps_nissan["New BR Date"])
-df_ps_nissan["Parts Warranty Installation Date"] = pd.to_datetime(
-    df_ps_nissan["Parts Warranty Installation Date"]
-)
+def stage_7_1_data_types(df_ps_nissan, df_burden_nissan, df_new):
+    """Date columns as datetime64."""
+    df_ps_nissan["SAP Date"] = pd.to_datetime(df_ps_nissan["SAP Date"], format="%Y-%m-%d")
+    df_ps_nissan["New BR Date"] = pd.to_datetime(df_ps_nissan["New BR Date"])
+    df_ps_nissan["Parts Warranty Installation Date"] = pd.to_datetime(
+        df_ps_nissan["Parts Warranty Installation Date"]
+    )
 
-df_burden_nissan["New BR Date"] = pd.to_datetime(df_burden_nissan["New BR Date"])
+    df_burden_nissan["New BR Date"] = pd.to_datetime(df_burden_nissan["New BR Date"])
 
-df_new["Vehicle MFD"] = pd.to_datetime(df_new["Vehicle MFD"])
-df_new["SAP Date"] = pd.to_datetime(df_new["SAP Date"])
-df_new["New BR Date"] = pd.to_datetime(df_new["New BR Date"])
-df_new["Download Date"] = pd.to_datetime(df_new["Download Date"])
-df_new["Parts Warranty Installation Date"] = pd.to_datetime(
-    df_new["Parts Warranty Installation Date"]
-)
+    df_new["SAP Date"] = pd.to_datetime(df_new["SAP Date"])
+    df_new["New BR Date"] = pd.to_datetime(df_new["New BR Date"])
+    df_new["Download Date"] = pd.to_datetime(df_new["Download Date"])
+    df_new["Parts Warranty Installation Date"] = pd.to_datetime(
+        df_new["Parts Warranty Installation Date"]
+    )
 
-# (CLAIM_DATE already used to define claim_date_ts earlier; no need to redefine)
+    # (CLAIM_DATE already used to define claim_date_ts earlier; no need to redefine)
+
+    return df_ps_nissan, df_burden_nissan, df_new
 
 
 # ------------------------------------------------------------
 # 7.2 Control-unit EZKL patch (blank ECU → ECU-PC/GS)
 # ------------------------------------------------------------
 
-mask_blank_control_unit = (
-    df_new["EZKL Name"].isna()
-    & df_new["Bosch Parts Name"].str.lower().str.contains("control unit", na=False)
-)
-df_new.loc[mask_blank_control_unit, "EZKL Name"] = "ECU-PC/GS"
-df_new.loc[mask_blank_control_unit, "Original_EZKL_Name"] = "ECU-PC/GS"
+def stage_7_2_control_unit_patch(df_new):
+    """Blank EZKL on control units → ECU-PC/GS."""
+    mask_blank_control_unit = (
+        df_new["EZKL Name"].isna()
+        & df_new["Bosch Parts Name"].str.lower().str.contains("control unit", na=False)
+    )
+    df_new.loc[mask_blank_control_unit, "EZKL Name"] = "ECU-PC/GS"
+    df_new.loc[mask_blank_control_unit, "Original_EZKL_Name"] = "ECU-PC/GS"
+
+    return df_new
 
 
 # ------------------------------------------------------------
 # 7.3 Global stats, Claim Status, and DPR (Denied Paid Ratio)
 # ------------------------------------------------------------
 
-# Overall TCA stats
-std_amount = df_ps_nissan["Total Claimed Amount"].std()
-mean_amount = df_ps_nissan["Total Claimed Amount"].mean()
-sigma_1_5_above = mean_amount + std_amount * 1.5
-sigma_1_above = mean_amount + std_amount
-
-# Domestic / Overseas stats
-std_amount_dom = df_ps_nissan.loc[
-    df_ps_nissan["Domestic/Overseas"] == "1", "Total Claimed Amount"
-].std()
-mean_amount_dom = df_ps_nissan.loc[
-    df_ps_nissan["Domestic/Overseas"] == "1", "Total Claimed Amount"
-].mean()
-sigma_1_above_dom = mean_amount_dom + std_amount_dom
-
-std_amount_over = df_ps_nissan.loc[
-    df_ps_nissan["Domestic/Overseas"] == "2", "Total Claimed Amount"
-].std()
-mean_amount_over = df_ps_nissan.loc[
-    df_ps_nissan["Domestic/Overseas"] == "2", "Total Claimed Amount"
-].mean()
-sigma_1_above_over = mean_amount_over + std_amount_over
-
-# 12-month PS window (currently unused, kept for potential TS)
-temp_df = df_ps_nissan.loc[
-    (df_ps_nissan["SAP Date"] >= claim_date_ts - pd.DateOffset(months=12))
-    & (df_ps_nissan["SAP Date"] <= claim_date_ts)
-]
+def stage_7_3_stats(df_ps_nissan, df_new, ps_stats):
+    """TCA limits, Claim Status, DPR table and the current month letter."""
+    # Overall TCA stats (merged from the PS history month aggregates)
+    std_amount = ps_stats["std_amount"]
+    mean_amount = ps_stats["mean_amount"]
+    sigma_1_5_above = mean_amount + std_amount * 1.5
+    sigma_1_above = mean_amount + std_amount
+
+    # Domestic / Overseas stats
+    std_amount_dom = ps_stats["std_amount_dom"]
+    mean_amount_dom = ps_stats["mean_amount_dom"]
+    sigma_1_above_dom = mean_amount_dom + std_amount_dom
+
+    std_amount_over = ps_stats["std_amount_over"]
+    mean_amount_over = ps_stats["mean_amount_over"]
+    sigma_1_above_over = mean_amount_over + std_amount_over
+
+    # 12-month PS window (currently unused, kept for potential TS)
+    temp_df = df_ps_nissan.loc[
+        (df_ps_nissan["SAP Date"] >= claim_date_ts - pd.DateOffset(months=12))
+        & (df_ps_nissan["SAP Date"] <= claim_date_ts)
+    ]
 
-# Monthly stats in new data (not used downstream, but kept)
-df_new["Year_SAP"] = df_new["SAP Date"].dt.year
-df_new["Month_SAP"] = df_new["SAP Date"].dt.month
-std_monthly_EZKL_new = df_new.groupby(
-    ["EZKL Name", "Year_SAP", "Month_SAP"]
-)["Total Claimed Amount"].std()
-mean_monthly_EZKL_new = df_new.groupby(
-    ["EZKL Name", "Year_SAP", "Month_SAP"]
-)["Total Claimed Amount"].mean()
-sigma_1_above_monthly_EZKL_new = mean_monthly_EZKL_new + std_monthly_EZKL_new
-
-# Claim Status mapping
-df_ps_nissan.loc[:, "Claim Status"] = df_ps_nissan["Status"].replace(
-    {"Accepted": "Denied Claim", "Rejected": "Denied Paid Claim"}
-)
-df_ps_nissan.loc[:, "Claim Status"] = df_ps_nissan["Claim Status"].fillna("Paid Claim")
+    # Monthly stats in new data (not used downstream, but kept)
+    df_new["Year_SAP"] = df_new["SAP Date"].dt.year
+    df_new["Month_SAP"] = df_new["SAP Date"].dt.month
+    std_monthly_EZKL_new = df_new.groupby(
+        ["EZKL Name", "Year_SAP", "Month_SAP"]
+    )["Total Claimed Amount"].std()
+    mean_monthly_EZKL_new = df_new.groupby(
+        ["EZKL Name", "Year_SAP", "Month_SAP"]
+    )["Total Claimed Amount"].mean()
+    sigma_1_above_monthly_EZKL_new = mean_monthly_EZKL_new + std_monthly_EZKL_new
+
+    # Claim Status mapping (Status is categorical: relabel the categories)
+    df_ps_nissan["Claim Status"] = (
+        df_ps_nissan["Status"]
+        .astype("category")
+        .cat.rename_categories({"Accepted": "Denied Claim", "Rejected": "Denied Paid Claim"})
+        .cat.add_categories("Paid Claim")
+        .fillna("Paid Claim")
+    )
 
-denied_paid_counts = (
-    df_ps_nissan.loc[
-        df_ps_nissan["Claim Status"] == "Denied Paid Claim",
-        ["EZKL Name", "Claim Status"],
-    ]
-    .groupby("EZKL Name")["Claim Status"]
-    .count()
-    .reset_index(name="Denied Paid Count")
-)
+    # Denied Paid Ratio per EZKL (same Claim Status counts, merged per month)
+    ratio_df = ps_stats["ratio_df"]
 
-denied_counts = (
-    df_ps_nissan.loc[
-        df_ps_nissan["Claim Status"] == "Denied Claim",
-        ["EZKL Name", "Claim Status"],
-    ]
-    .groupby("EZKL Name")["Claim Status"]
-    .count()
-    .reset_index(name="Denied Count")
-)
+    # Month-letter for current claim date
+    current_letter = get_letter_from_claim_date(claim_date_ts)
 
-ratio_df = pd.merge(denied_paid_counts, denied_counts, on="EZKL Name", how="outer").fillna(0)
-ratio_df["Denied Paid Ratio"] = np.where(
-    (ratio_df["Denied Count"] == 0) & (ratio_df["Denied Paid Count"] == 0),
-    0,
-    ratio_df["Denied Paid Count"]
-    / (ratio_df["Denied Count"] + ratio_df["Denied Paid Count"]),
-)
+    # TCA limits used by the outlier flags (7.6)
+    tca_limits = {
+        "sigma_1_5_above": sigma_1_5_above,
+        "sigma_1_above": sigma_1_above,
+        "sigma_1_above_dom": sigma_1_above_dom,
+        "sigma_1_above_over": sigma_1_above_over,
+    }
 
-# Month-letter for current claim date
-current_letter = get_letter_from_claim_date(claim_date_ts)
+    return df_ps_nissan, df_new, tca_limits, ratio_df, current_letter
 
 
 # ------------------------------------------------------------
 # 7.4 Special handling for new HDEV6 part (Customer P/N 166006RC1C)
 # ------------------------------------------------------------
 
-df_new["Standard Burden Ratio"] = np.where(
-    (df_new["Customer Parts No."] == "166006RC1C") & (pd.isna(df_new["EZKL Name"])),
-    df_new.loc[df_new["EZKL Name"] == "HDEV6", "Standard Burden Ratio"].iloc[:1],
-    df_new["Standard Burden Ratio"],
-)
+def stage_7_4_hdev6_new_part(df_new):
+    """Burden ratios / EZKL for the new HDEV6 part."""
+    df_new["Standard Burden Ratio"] = np.where(
+        (df_new["Customer Parts No."] == "166006RC1C") & (pd.isna(df_new["EZKL Name"])),
+        df_new.loc[df_new["EZKL Name"] == "HDEV6", "Standard Burden Ratio"].iloc[:1],
+        df_new["Standard Burden Ratio"],
+    )
 
-df_new["Current Burden Ratio"] = np.where(
-    (df_new["Customer Parts No."] == "166006RC1C") & (pd.isna(df_new["EZKL Name"])),
-    df_new.loc[df_new["EZKL Name"] == "HDEV6", "Current Burden Ratio"].iloc[:1],
-    df_new["Current Burden Ratio"],
-)
+    df_new["Current Burden Ratio"] = np.where(
+        (df_new["Customer Parts No."] == "166006RC1C") & (pd.isna(df_new["EZKL Name"])),
+        df_new.loc[df_new["EZKL Name"] == "HDEV6", "Current Burden Ratio"].iloc[:1],
+        df_new["Current Burden Ratio"],
+    )
 
-df_new["New BR Date"] = np.where(
-    (df_new["Customer Parts No."] == "166006RC1C") & (pd.isna(df_new["EZKL Name"])),
-    df_new.loc[df_new["EZKL Name"] == "HDEV6", "New BR Date"].iloc[:1],
-    df_new["New BR Date"],
-)
+    df_new["New BR Date"] = np.where(
+        (df_new["Customer Parts No."] == "166006RC1C") & (pd.isna(df_new["EZKL Name"])),
+        df_new.loc[df_new["EZKL Name"] == "HDEV6", "New BR Date"].iloc[:1],
+        df_new["New BR Date"],
+    )
 
-df_new["EZKL Name"] = np.where(
-    (df_new["Customer Parts No."] == "166006RC1C") & (pd.isna(df_new["EZKL Name"])),
-    "HDEV6",
-    df_new["EZKL Name"],
-)
+    df_new["EZKL Name"] = np.where(
+        (df_new["Customer Parts No."] == "166006RC1C") & (pd.isna(df_new["EZKL Name"])),
+        "HDEV6",
+        df_new["EZKL Name"],
+    )
+
+    return df_new
 
 
 # ------------------------------------------------------------
 # 7.5 FALLBACK: Fill remaining EZKL from full PS database
 # ------------------------------------------------------------
 
-# 1) Normalize Bosch P/N in df_new
-df_new["Bosch Parts No. norm"] = df_new["Bosch Parts No."].apply(normalize_nissan_bosch_pn)
-df_new["Bosch Prefix 10"] = df_new["Bosch Parts No. norm"].str[:10]
+def stage_7_5_ezkl_fallback(df_new, ezkl_lookup):
+    """Remaining EZKL from the full PS database."""
+    # 1) Normalize Bosch P/N in df_new
+    df_new["Bosch Parts No. norm"] = normalize_nissan_bosch_pn_column(df_new["Bosch Parts No."], NISSAN_PN_MEMO)
+    df_new["Bosch Prefix 10"] = df_new["Bosch Parts No. norm"].str[:10]
 
-# ezkl_lookup already built in PS loading section; reuse it here.
+    # ezkl_lookup already built in PS loading section; reuse it here.
 
-# 2) Fallback merge
-df_new = df_new.merge(ezkl_lookup, how="left", on="Bosch Prefix 10")
+    # 2) Only fill where EZKL is still NaN
+    df_new["EZKL Name"] = df_new["EZKL Name"].fillna(df_new["Bosch Prefix 10"].map(ezkl_lookup))
 
-# 3) Only fill where EZKL is still NaN
-df_new["EZKL Name"] = df_new["EZKL Name"].fillna(df_new["EZKL_from_PS"])
+    print("Remaining EZKL NaN after fallback:", df_new["EZKL Name"].isna().sum())
 
-# 4) Cleanup helper column
-df_new.drop(columns=["EZKL_from_PS"], inplace=True)
+    # EZKL Name is final from here on: groupbys / merges below run on its codes
+    df_new, _ = apply_schema(df_new, NISSAN_SCHEMA, columns=["EZKL Name"], name="df_new", verbose=False)
 
-print("Remaining EZKL NaN after fallback:", df_new["EZKL Name"].isna().sum())
+    return df_new
 
 
 # ------------------------------------------------------------
 # 7.6 Outlier flags and date-based features
 # ------------------------------------------------------------
 
-# Outlier flags on TCA
-df_new["TCA Outlier15"] = np.where(df_new["Total Claimed Amount"] > sigma_1_5_above, 1, 0)
-df_new["TCA Outlier1"] = np.where(df_new["Total Claimed Amount"] > sigma_1_above, 1, 0)
+def stage_7_6_outliers(df_new, tca_limits):
+    """TCA outlier flags and date features."""
+    sigma_1_5_above = tca_limits["sigma_1_5_above"]
+    sigma_1_above = tca_limits["sigma_1_above"]
+    sigma_1_above_dom = tca_limits["sigma_1_above_dom"]
+    sigma_1_above_over = tca_limits["sigma_1_above_over"]
+
+    # Outlier flags on TCA
+    df_new["TCA Outlier15"] = np.where(df_new["Total Claimed Amount"] > sigma_1_5_above, 1, 0)
+    df_new["TCA Outlier1"] = np.where(df_new["Total Claimed Amount"] > sigma_1_above, 1, 0)
+
+    df_new["TCA Outlier_dom"] = np.where(
+        (df_new["Domestic/Overseas"] == "2")
+        & (df_new["Total Claimed Amount"] > sigma_1_above_dom),
+        1,
+        0,
+    )
 
-df_new["TCA Outlier_dom"] = np.where(
-    (df_new["Domestic/Overseas"] == "2")
-    & (df_new["Total Claimed Amount"] > sigma_1_above_dom),
-    1,
-    0,
-)
+    df_new["TCA Outlier_over"] = np.where(
+        (df_new["Domestic/Overseas"] == "2")
+        & (df_new["Total Claimed Amount"] > sigma_1_above_over),
+        1,
+        0,
+    )
 
-df_new["TCA Outlier_over"] = np.where(
-    (df_new["Domestic/Overseas"] == "2")
-    & (df_new["Total Claimed Amount"] > sigma_1_above_over),
-    1,
-    0,
-)
+    # Time deltas and OEM month decoding
+    df_new["Days MFD SAP"] = (df_new["SAP Date"] - df_new["Vehicle MFD"]).dt.days
+    df_new["Days MFD Failure"] = (df_new["Vehicle Failure Date"] - df_new["Vehicle MFD"]).dt.days
+    df_new["MFD Year"] = df_new["Vehicle MFD"].dt.year
+    df_new["OEM Date Month"] = df_new["Objection ID"].apply(get_OEM_date_month)
 
-# Time deltas and OEM month decoding
-df_new["Days MFD SAP"] = (df_new["SAP Date"] - df_new["Vehicle MFD"]).dt.days
-df_new["Days MFD Failure"] = (df_new["Vehicle Failure Date"] - df_new["Vehicle MFD"]).dt.days
-df_new["MFD Year"] = df_new["Vehicle MFD"].dt.year
-df_new["OEM Date Month"] = df_new["Objection ID"].apply(get_OEM_date_month)
+    return df_new
 
 
 # ------------------------------------------------------------
 # 7.7 Burden Ratio contract check (BR Contract)
 # ------------------------------------------------------------
 
-def safe_check_burden_ratio(row):
-    try:
-        return check_burden_ratio(row)
-    except TypeError:
-        return 0
-
-
-df_new["Irregular case BR"] = 0
-df_new["BR Contract"] = df_new.apply(safe_check_burden_ratio, axis=1)
-
-# Preserve EZKL at this stage for later hybrid flags
-df_new["Original_EZKL_Name"] = df_new["EZKL Name"]
+def stage_7_7_br_contract(df_new):
+    """BR Contract check and hybrid EZKL label."""
+    # Column-wise engine (pipeline/nissan_rules.py); matches the row-wise
+    # check_burden_ratio on every row and also keeps the Irregular case BR flag.
+    # Irregular case BR is assigned first: the original created it (= 0) before
+    # BR Contract, and the output column order must not change.
+    br_check = check_burden_ratio_frame(df_new)
+    df_new["Irregular case BR"] = br_check["Irregular case BR"]
+    df_new["BR Contract"] = br_check["BR Contract"]
+
+    # Preserve EZKL at this stage for later hybrid flags
+    df_new["Original_EZKL_Name"] = df_new["EZKL Name"]
+
+    # Hybrid EZKL label
+    df_new["EZKL_H"] = df_new.apply(
+        lambda row: f"{row['Original_EZKL_Name']} (H)"
+        if isinstance(row["類別区分"], str) and re.match(r"^H", row["類別区分"])
+        else row["Original_EZKL_Name"],
+        axis=1,
+    )
 
-# Hybrid EZKL label
-df_new["EZKL_H"] = df_new.apply(
-    lambda row: f"{row['Original_EZKL_Name']} (H)"
-    if isinstance(row["類別区分"], str) and re.match(r"^H", row["類別区分"])
-    else row["Original_EZKL_Name"],
-    axis=1,
-)
+    return df_new
 
 
 # ------------------------------------------------------------
 # 7.8 EZKL statistics for TCA Outlier EZKL
 # ------------------------------------------------------------
 
-# Cleanup any old stats columns if notebook re-run
-stats_cols_to_drop = [
-    "Mean_TCA",
-    "Std_TCA",
-    "Mean_Plus_Std",
-    "Mean_TCA_x",
-    "Std_TCA_x",
-    "Mean_Plus_Std_x",
-    "Mean_TCA_y",
-    "Std_TCA_y",
-    "Mean_Plus_Std_y",
-]
-df_new = df_new.drop(
-    columns=[c for c in stats_cols_to_drop if c in df_new.columns],
-    errors="ignore",
-)
+def stage_7_8_ezkl_stats(df_new):
+    """Per-EZKL TCA mean / std and TCA Outlier EZKL."""
+    # Cleanup any old stats columns if notebook re-run
+    stats_cols_to_drop = [
+        "Mean_TCA",
+        "Std_TCA",
+        "Mean_Plus_Std",
+        "Mean_TCA_x",
+        "Std_TCA_x",
+        "Mean_Plus_Std_x",
+        "Mean_TCA_y",
+        "Std_TCA_y",
+        "Mean_Plus_Std_y",
+    ]
+    df_new = df_new.drop(
+        columns=[c for c in stats_cols_to_drop if c in df_new.columns],
+        errors="ignore",
+    )
 
-# Mean/std per EZKL
-std_summary = (
-    df_new.groupby("EZKL Name")["Total Claimed Amount"]
-    .agg(Mean_TCA="mean", Std_TCA="std")
-    .reset_index()
-)
-std_summary["Mean_Plus_Std"] = std_summary["Mean_TCA"] + std_summary["Std_TCA"]
+    # Mean/std per EZKL
+    std_summary = (
+        df_new.groupby("EZKL Name", observed=True)["Total Claimed Amount"]
+        .agg(Mean_TCA="mean", Std_TCA="std")
+        .reset_index()
+    )
+    std_summary["Mean_Plus_Std"] = std_summary["Mean_TCA"] + std_summary["Std_TCA"]
 
-print("std_summary columns:", std_summary.columns.tolist())
+    print("std_summary columns:", std_summary.columns.tolist())
 
-# Merge stats into df_new
-df_new = df_new.merge(std_summary, on="EZKL Name", how="left")
-print("Has Mean_Plus_Std in df_new?:", "Mean_Plus_Std" in df_new.columns)
+    # Merge stats into df_new
+    df_new = df_new.merge(std_summary, on="EZKL Name", how="left")
+    print("Has Mean_Plus_Std in df_new?:", "Mean_Plus_Std" in df_new.columns)
 
-df_new["TCA Outlier EZKL"] = np.where(
-    df_new["Total Claimed Amount"] > df_new["Mean_Plus_Std"], 1, 0
-)
+    df_new["TCA Outlier EZKL"] = np.where(
+        df_new["Total Claimed Amount"] > df_new["Mean_Plus_Std"], 1, 0
+    )
+
+    return df_new, std_summary
 
 
 # ------------------------------------------------------------
 # 7.9 HDEV6-specific flags and main-part exclusion
 # ------------------------------------------------------------
 
-HDEV6_MAIN_PART_EXCLUDED = ["166007JA1A"]
-mask_hdev6_main_excl = df_new["Customer Parts No."].isin(HDEV6_MAIN_PART_EXCLUDED)
+def stage_7_9_hdev6_flags(df_new):
+    """HDEV6 flags and main-part exclusion."""
+    HDEV6_MAIN_PART_EXCLUDED = ["166007JA1A"]
+    mask_hdev6_main_excl = df_new["Customer Parts No."].isin(HDEV6_MAIN_PART_EXCLUDED)
 
-df_new["HDEV6_CM"] = np.where(
-    (df_new["EZKL Name"] == "HDEV6")
-    & (df_new["Vehicle MFD"] >= pd.to_datetime("2023-04-01")),
-    1,
-    0,
-)
+    df_new["HDEV6_CM"] = np.where(
+        (df_new["EZKL Name"] == "HDEV6")
+        & (df_new["Vehicle MFD"] >= pd.to_datetime("2023-04-01")),
+        1,
+        0,
+    )
 
-df_new["HDEV6_countermeasure"] = np.where(
-    (df_new["EZKL Name"] == "HDEV6")
-    & (df_new["Vehicle MFD"] >= pd.to_datetime("2023-04-01"))
-    & (df_new["TCA Outlier EZKL"] == 1),
-    1,
-    0,
-)
+    df_new["HDEV6_countermeasure"] = np.where(
+        (df_new["EZKL Name"] == "HDEV6")
+        & (df_new["Vehicle MFD"] >= pd.to_datetime("2023-04-01"))
+        & (df_new["TCA Outlier EZKL"] == 1),
+        1,
+        0,
+    )
 
-df_new["HDEV6_over_120000"] = np.where(
-    (df_new["EZKL Name"] == "HDEV6")
-    & (df_new["Total Claimed Amount"] >= 120000)
-    & (df_new["Total Claimed Amount"] <= 200000),
-    1,
-    0,
-)
+    df_new["HDEV6_over_120000"] = np.where(
+        (df_new["EZKL Name"] == "HDEV6")
+        & (df_new["Total Claimed Amount"] >= 120000)
+        & (df_new["Total Claimed Amount"] <= 200000),
+        1,
+        0,
+    )
 
-# Apply main-part exclusion (HDEV6 flags disabled for these parts)
-df_new.loc[mask_hdev6_main_excl, ["HDEV6_countermeasure", "HDEV6_over_120000"]] = 0
+    # Apply main-part exclusion (HDEV6 flags disabled for these parts)
+    df_new.loc[mask_hdev6_main_excl, ["HDEV6_countermeasure", "HDEV6_over_120000"]] = 0
 
-# BR Contract logic for excluded main parts (must be exactly 50%)
-df_new.loc[mask_hdev6_main_excl, "BR Contract"] = 0
-br_ok_mask = df_new["Burden Ratio"] == 50
-df_new.loc[mask_hdev6_main_excl & (~br_ok_mask), "BR Contract"] = 1
+    # BR Contract logic for excluded main parts (must be exactly 50%)
+    df_new.loc[mask_hdev6_main_excl, "BR Contract"] = 0
+    br_ok_mask = df_new["Burden Ratio"] == 50
+    df_new.loc[mask_hdev6_main_excl & (~br_ok_mask), "BR Contract"] = 1
+
+    return df_new
 
 
 # ------------------------------------------------------------
 # 7.10 High Denied Paid Ratio (EZKL-level)
 # ------------------------------------------------------------
 
-deny_cols_to_drop = [
-    "Denied Paid Ratio",
-    "Denied Count",
-    "Denied Paid Count",
-    "Denied Paid Ratio_x",
-    "Denied Count_x",
-    "Denied Paid Count_x",
-    "Denied Paid Ratio_y",
-    "Denied Count_y",
-    "Denied Paid Count_y",
-]
-df_new = df_new.drop(
-    columns=[c for c in deny_cols_to_drop if c in df_new.columns],
-    errors="ignore",
-)
+def stage_7_10_denied_paid_ratio(df_new, ratio_df):
+    """High Denied Paid Ratio per EZKL."""
+    deny_cols_to_drop = [
+        "Denied Paid Ratio",
+        "Denied Count",
+        "Denied Paid Count",
+        "Denied Paid Ratio_x",
+        "Denied Count_x",
+        "Denied Paid Count_x",
+        "Denied Paid Ratio_y",
+        "Denied Count_y",
+        "Denied Paid Count_y",
+    ]
+    df_new = df_new.drop(
+        columns=[c for c in deny_cols_to_drop if c in df_new.columns],
+        errors="ignore",
+    )
 
-df_new = df_new.merge(
-    ratio_df[["EZKL Name", "Denied Paid Ratio", "Denied Count", "Denied Paid Count"]],
-    on="EZKL Name",
-    how="left",
-)
+    df_new, ratio_df = union_categories([df_new, ratio_df], "EZKL Name")
+    df_new = df_new.merge(
+        ratio_df[["EZKL Name", "Denied Paid Ratio", "Denied Count", "Denied Paid Count"]],
+        on="EZKL Name",
+        how="left",
+    )
 
-df_new["Denied Paid Ratio"] = df_new["Denied Paid Ratio"].fillna(0)
-df_new["Num Objected"] = df_new["Denied Count"] + df_new["Denied Paid Count"]
+    df_new["Denied Paid Ratio"] = df_new["Denied Paid Ratio"].fillna(0)
+    df_new["Num Objected"] = df_new["Denied Count"] + df_new["Denied Paid Count"]
 
-df_new["High Denied Paid Ratio"] = np.where(
-    df_new["Num Objected"] >= 10,
-    np.where(df_new["Denied Paid Ratio"] >= 0.90, 1, 0),
-    0,
-)
+    df_new["High Denied Paid Ratio"] = np.where(
+        df_new["Num Objected"] >= 10,
+        np.where(df_new["Denied Paid Ratio"] >= 0.90, 1, 0),
+        0,
+    )
+
+    return df_new
 
 
 # ------------------------------------------------------------
 # 7.11 Warranty period and month checks
 # ------------------------------------------------------------
 
-df_new["期間"] = pd.to_numeric(df_new["期間"], errors="coerce").fillna(100)
+def stage_7_11_warranty_checks(df_new, current_letter):
+    """Warranty period and month checks."""
+    df_new["期間"] = pd.to_numeric(df_new["期間"], errors="coerce").fillna(100)
 
-df_new["period_m_difference"] = (
-    (df_new["Vehicle Failure Date"].dt.year - df_new["Parts Warranty Installation Date"].dt.year) * 12
-    + (df_new["Vehicle Failure Date"].dt.month - df_new["Parts Warranty Installation Date"].dt.month)
-)
+    df_new["period_m_difference"] = (
+        (df_new["Vehicle Failure Date"].dt.year - df_new["Parts Warranty Installation Date"].dt.year) * 12
+        + (df_new["Vehicle Failure Date"].dt.month - df_new["Parts Warranty Installation Date"].dt.month)
+    )
 
-df_new["Outside_warranty_period"] = np.where(
-    pd.isna(df_new["Parts Warranty Installation Date"]),
-    0,
-    np.where(df_new["period_m_difference"] > df_new["期間"], 1, 0),
-)
+    df_new["Outside_warranty_period"] = np.where(
+        pd.isna(df_new["Parts Warranty Installation Date"]),
+        0,
+        np.where(df_new["period_m_difference"] > df_new["期間"], 1, 0),
+    )
 
-df_new["Right_Month"] = df_new["Reference No."].astype(str).apply(
-    lambda row: 0 if row[2] == current_letter else 1
-)
+    df_new["Right_Month"] = df_new["Reference No."].astype(str).apply(
+        lambda row: 0 if row[2] == current_letter else 1
+    )
+
+    df_new["Irr. Month"] = df_new["Reference No."].apply(refno_to_month_code)
+    print(df_new[["Reference No.", "Irr. Month"]].head(20))
 
-df_new["Irr. Month"] = df_new["Reference No."].apply(refno_to_month_code)
-print(df_new[["Reference No.", "Irr. Month"]].head(20))
+    return df_new
 
 
 # ------------------------------------------------------------
 # 7.12 Hybrid label for Power BI (duplicate, kept intentionally)
 # ------------------------------------------------------------
 
-df_new["Hybrid_specification_EZKL"] = np.where(
-    (df_new["Original_EZKL_Name"] == "HDEV5")
-    & (df_new["類別区分"].str[:1] == "H"),
-    "HDEV5 (H)",
-    df_new["Original_EZKL_Name"],
-)
+def stage_7_12_hybrid_label(df_new):
+    """Hybrid label for Power BI."""
+    df_new["Hybrid_specification_EZKL"] = np.where(
+        (df_new["Original_EZKL_Name"] == "HDEV5")
+        & (df_new["類別区分"].str[:1] == "H"),
+        "HDEV5 (H)",
+        df_new["Original_EZKL_Name"],
+    )
+
+    return df_new
 
 
 # ------------------------------------------------------------
 # 7.13 Irregular-case flag and EZKL group count
 # ------------------------------------------------------------
 
-df_new["Irregular_case"] = np.where(
-    (df_new["Irregular case BR"] == 1) | (df_new["Right_Month"] == 1),
-    1,
-    0,
-)
+def stage_7_13_group_count(df_new):
+    """Irregular-case flag and EZKL group count."""
+    df_new["Irregular_case"] = np.where(
+        (df_new["Irregular case BR"] == 1) | (df_new["Right_Month"] == 1),
+        1,
+        0,
+    )
 
-if "Group Count" in df_new.columns:
-    df_new = df_new.drop(columns=["Group Count"])
+    if "Group Count" in df_new.columns:
+        df_new = df_new.drop(columns=["Group Count"])
 
-parts_count = df_new["EZKL Name"].value_counts().reset_index()
-parts_count.columns = ["EZKL Name", "Group Count"]
+    parts_count = df_new["EZKL Name"].value_counts().loc[lambda counts: counts > 0].reset_index()
+    parts_count.columns = ["EZKL Name", "Group Count"]
 
-df_new = df_new.join(parts_count.set_index("EZKL Name"), on="EZKL Name", how="left")
+    df_new = df_new.join(parts_count.set_index("EZKL Name"), on="EZKL Name", how="left")
+
+    return df_new
 
 
 # %%
@@ -1406,114 +1205,66 @@ df_new = df_new.join(parts_count.set_index("EZKL Name"), on="EZKL Name", how="le
 # 8.1 Apply claim logic
 # ------------------------------------------------------------
 
-df_new["claim"] = df_new.apply(generate_claim, axis=1)
-df_new["claim_DPR"] = df_new.apply(generate_claim_DPR, axis=1)
+def stage_8_1_claim_logic(df_new):
+    """Claim decisions, AI_DATE and decimal burden ratio."""
+    # One vectorized pass over the flag columns for every variant in
+    # CLAIM_RULES (pipeline/nissan_rules.py). Same output columns as before;
+    # explain=True adds claim_rule / claim_DPR_rule for auditing.
+    claim_decisions = apply_claim_rules(df_new, CLAIM_RULES)
+    df_new[claim_decisions.columns] = claim_decisions
+
+    # Claim date for Power BI filtering
+    df_new["AI_DATE"] = claim_date_ts  # from CONFIG section
 
-# Claim date for Power BI filtering
-df_new["AI_DATE"] = claim_date_ts  # from CONFIG section
 
+    # Convert burden ratio into decimal (0–1)
+    df_new["Burden Ratio Decimal"] = df_new["Burden Ratio"] / 100.0
 
-# Convert burden ratio into decimal (0–1)
-df_new["Burden Ratio Decimal"] = df_new["Burden Ratio"] / 100.0
+    return df_new
 
 
 # ------------------------------------------------------------
 # 8.2 Subpart validation filter
 # ------------------------------------------------------------
 
-def apply_subpart_filter(df: pd.DataFrame) -> pd.DataFrame:
+def stage_8_2_subpart_filter(df_new):
     """
-    Subpart consistency check:
-    - For Parts Distinction = 2 (subparts), compare Bosch Parts Name (normalized)
-      vs part-number-based group (assign_group).
-    - If mismatch → 'To object?', else 'OK'.
-    - Propagate 'To object?' to Distinction = 1 rows sharing the same Reference No.
+    Subpart column: subpart names vs part groups (pipeline.nissan_rules);
+    pair scores reused through SUBPART_SCORE_CACHE.
     """
-    df = df.copy()
-
-    # Step 1: work on subparts only
-    df2 = df[df["Parts Distinction"] == 2].copy()
-
-    status_list = []
-    for _, row in df2.iterrows():
-        part_number = str(row.get("Customer Parts No.", "")).strip()
-        raw_expected = row.get("Bosch Parts Name", "")
-        normalized_expected = normalize_expected(raw_expected)
-        computed_group = assign_group(part_number).lower()
-
-        similar = is_similar(normalized_expected, computed_group)
-
-        if similar:
-            status_list.append("OK")
-        else:
-            status_list.append("To object?")
-
-    # Step 2: assign Subpart for Distinction = 2 rows
-    df2["Subpart"] = status_list
-
-    # Keep unique Subpart per Reference No. + Customer Parts No.
-    df2_unique = df2[["Reference No.", "Customer Parts No.", "Subpart"]].drop_duplicates()
-
-    # Step 3: merge back into full df
-    df = df.drop(columns=["Subpart"], errors="ignore")
-    df = df.merge(
-        df2_unique,
-        on=["Reference No.", "Customer Parts No."],
-        how="left",
+    return apply_subpart_filter(
+        df_new,
+        PART_GROUP_INDEX,
+        EXPECTED_GROUP_NORMALIZATION,
+        threshold=SUBPART_SIMILARITY_THRESHOLD,
+        score_cache_path=SUBPART_SCORE_CACHE,
     )
 
-    # Step 4: propagate "To object?" to Distinction = 1 rows
-    refs_with_bad_parts = df.loc[
-        (df["Parts Distinction"] == 2) & (df["Subpart"] == "To object?"),
-        "Reference No.",
-    ].unique()
-
-    df.loc[
-        (df["Parts Distinction"] == 1) & (df["Reference No."].isin(refs_with_bad_parts)),
-        "Subpart",
-    ] = "To object?"
-
-    # Step 5: remaining NaN → "OK"
-    df["Subpart"] = df["Subpart"].fillna("OK")
-
-    return df
-
-
-# Apply subpart filter
-results = apply_subpart_filter(df_new)
 
 # ------------------------------------------------------------
 # 8.3 Recompute Irr. Month on final results table (robust)
 # ------------------------------------------------------------
 
-results["Irr. Month"] = results["Reference No."].apply(refno_to_month_code)
+def stage_8_3_irr_month(results):
+    """Irr. Month from the Reference No."""
+    results["Irr. Month"] = results["Reference No."].apply(refno_to_month_code)
+
+    # Optional sanity check
+    print(results[["Reference No.", "Irr. Month"]].head(20))
 
-# Optional sanity check
-print(results[["Reference No.", "Irr. Month"]].head(20))
+    return results
 
 
 # ------------------------------------------------------------
 # 8.4 Save results (refactor output, non-destructive)
 # ------------------------------------------------------------
 
-# Ensure legacy 判定.1 column exists for Power BI compatibility
-if "判定.1" not in results.columns:
-    if "claim" in results.columns:
-        results["判定.1"] = results["claim"]
-    else:
-        # Fallback if claim doesn't exist (shouldn't happen)
-        results["判定.1"] = 0
-
 REF_RESULTS_PATH = (
     r"\\bosch.com\DfsRB\DfsJP\DIV\PS\QMC\All\01.QMC11\05_General\06_internship"
     r"\20240901_Julia_Antonioli\AI_Projects\warranty-judge\01. Nissan\AI_Results"
     fr"\results_refactor_20{DATE_YYMM}.xlsx"
 )
 
-results.to_excel(REF_RESULTS_PATH, index=False)
-print("Refactor results saved to:", REF_RESULTS_PATH)
-print("Refactor columns:", list(results.columns))
-
 # ============================================================
 # TEMPLATE / POWER BI SCHEMA CONFIG (GLOBAL)
 # ============================================================
@@ -1536,65 +1287,249 @@ COLUMN_MAPPING = {
     # add more mappings here if needed later
 }
 
-results = align_to_template(
-    results,
-    AI_TEMPLATE_PATH,
-    column_mapping=COLUMN_MAPPING,
-)
 
-results.to_excel(REF_RESULTS_PATH, index=False)
-print("Refactor results saved to:", REF_RESULTS_PATH)
+def stage_8_4_save_results(results):
+    """Legacy 判定.1 column, template alignment, monthly results workbook."""
+    # Ensure legacy 判定.1 column exists for Power BI compatibility
+    if "判定.1" not in results.columns:
+        if "claim" in results.columns:
+            results["判定.1"] = results["claim"]
+        else:
+            # Fallback if claim doesn't exist (shouldn't happen)
+            results["判定.1"] = 0
+
+    results = align_to_template(
+        results,
+        AI_TEMPLATE_PATH,
+        column_mapping=COLUMN_MAPPING,
+    )
+
+    # Written once, after alignment (streaming writer, see pipeline.exporter)
+    saved = export_table(results, REF_RESULTS_PATH, formats=EXPORT_FORMATS)
+    print("Refactor results saved to:", *map(str, saved))
+    print("Refactor columns:", list(results.columns))
 
+    return results
 
 
 # %%
 # ============================================================
 # 9. APPEND MONTHLY RESULTS TO POWER BI AGGREGATE FILE
 # ============================================================
+# Note:
+# The aggregate lives in AI_CLAIMS_STORE_DIR, one partition per AI_DATE
+# (pipeline.claims_store). A run rewrites only this month's partition
+# (atomically) instead of reading, editing and rewriting the whole
+# history; AI_validated_claims.xlsx is then materialized from the store
+# for Power BI. On the first run the existing workbook is imported.
 
-# Try to load existing aggregate file; if missing, start empty
-try:
-    all_claims = pd.read_excel(AI_CLAIMS_AGG_PATH)
-    # Ensure AI_DATE is datetime
-    if "AI_DATE" in all_claims.columns:
-        all_claims["AI_DATE"] = pd.to_datetime(
-            all_claims["AI_DATE"], format="%Y-%m-%d", errors="coerce"
-        )
-    else:
-        # If for some reason no AI_DATE column, create it
-        all_claims["AI_DATE"] = pd.NaT
-
-except FileNotFoundError:
-    # First run: no historical file yet
-    all_claims = pd.DataFrame(columns=results.columns)
-    all_claims["AI_DATE"] = pd.to_datetime(all_claims.get("AI_DATE", pd.Series([], dtype="datetime64[ns]")))
-
-# Drop any existing rows for this month's AI_DATE
-dates_to_replace = results["AI_DATE"].unique()
-all_claims = all_claims[~all_claims["AI_DATE"].isin(dates_to_replace)]
-
-# Append current results
-all_claims = pd.concat([all_claims, results], ignore_index=True)
-
-# Align schema to the template so Power BI never complains about missing columns
-all_claims = align_to_template(
-    all_claims,
-    AI_TEMPLATE_PATH,
-    column_mapping=COLUMN_MAPPING,
-)
+def _align_claims(df):
+    return align_to_template(df, AI_TEMPLATE_PATH, column_mapping=COLUMN_MAPPING)
 
-# Sort for Power BI readability
-all_claims = (
-    all_claims
-    .sort_values(by=["AI_DATE", "EZKL Name", "Total Claimed Amount"], ascending=False)
-    .reset_index(drop=True)
-)
 
-# Save aggregate file for Power BI
-all_claims.to_excel(AI_CLAIMS_AGG_PATH, index=False)
+def stage_9_append_aggregate(results):
+    """Replace this month's partition in the claims store; write the Power BI view."""
+    # One-time import of the historical aggregate workbook into a new store
+    if not stored_claim_dates(AI_CLAIMS_STORE_DIR) and os.path.exists(AI_CLAIMS_AGG_PATH):
+        import_claims_workbook(AI_CLAIMS_AGG_PATH, AI_CLAIMS_STORE_DIR, prepare=_align_claims)
+
+    # Replace this month's AI_DATE partition (other months untouched)
+    write_claims_months(_align_claims(results), AI_CLAIMS_STORE_DIR)
+
+    # Aggregate file for Power BI: partitions newest first, already sorted
+    # by AI_DATE / EZKL Name / Total Claimed Amount (descending)
+    all_claims, saved = materialize_claims(
+        AI_CLAIMS_STORE_DIR, AI_CLAIMS_AGG_PATH, prepare=_align_claims, formats=EXPORT_FORMATS
+    )
+
+    print("Updated aggregate file saved to:", *map(str, saved))
+    print(all_claims["AI_DATE"].value_counts())
+
+    return all_claims
+
+
+# %%
+# ============================================================
+# 10. RUN STAGES
+# ============================================================
+# Note:
+# Sections 4–9 are stages of one dependency graph (pipeline.stage_graph).
+# Each stage names the values it reads and produces; the runner executes
+# them in dependency order (independent stages concurrently) and keeps the
+# outputs of cached stages in STAGE_CACHE_DIR. A stage is reused from the
+# cache as long as its code, the config constants / helpers it reads and
+# its inputs are unchanged: after editing e.g. 7.9 only 7.9 and the stages
+# below it run again.
+# Loading (4.0), the PS history store (4.5, its own incremental cache)
+# and the exports (8.4, 9) always run.
+# To rerun only part of the graph pass targets, e.g.
+#   run_stages(NISSAN_STAGES, cache_dir=STAGE_CACHE_DIR, targets=["df_new_7_9"])
+
+STAGE_CACHE_DIR = os.path.join(PS_CACHE_DIR, "stages")
+
+NISSAN_STAGES = [
+    {
+        "name": "4.0 load inputs",
+        "func": stage_4_0_load_inputs,
+        "outputs": [spec["name"] for spec in INPUT_MANIFEST] + ["load_report"],
+        "cache": False,
+    },
+    {"name": "4.1 PS data", "func": stage_4_1_ps_data, "outputs": ["ezkl_lookup", "df_ps_nissan_raw"]},
+    {"name": "4.2 new data", "func": stage_4_2_new_data, "outputs": ["df_new_4_2"]},
+    {"name": "4.3 burden ratio", "func": stage_4_3_burden, "outputs": ["df_burden_nissan"]},
+    {"name": "4.4 objection data", "func": stage_4_4_objection, "outputs": ["df_obj_nissan", "df_excluded_nissan"]},
+    {
+        "name": "4.5 PS history",
+        "func": stage_4_5_ps_history,
+        "outputs": ["ps_history_report", "ps_stats", "df_ps_history"],
+        "cache": False,
+    },
+    {
+        "name": "5 merges",
+        "func": stage_5_merges,
+        "inputs": ["df_new_4_2", "df_burden_nissan", "ps_stats"],
+        "outputs": ["df_new_5", "df_burden_cu"],
+    },
+    {
+        "name": "6.2 missing values",
+        "func": stage_6_2_missing_values,
+        "inputs": ["df_ps_history", "df_new_5", "ps_stats"],
+        "outputs": ["df_ps_nissan_6", "df_new_6"],
+    },
+    {
+        "name": "7.1 data types",
+        "func": stage_7_1_data_types,
+        "inputs": ["df_ps_nissan_6", "df_burden_cu", "df_new_6"],
+        "outputs": ["df_ps_nissan_7_1", "df_burden_nissan_7_1", "df_new_7_1"],
+    },
+    {"name": "7.2 control unit patch", "func": stage_7_2_control_unit_patch, "inputs": ["df_new_7_1"], "outputs": ["df_new_7_2"]},
+    {
+        "name": "7.3 stats",
+        "func": stage_7_3_stats,
+        "inputs": ["df_ps_nissan_7_1", "df_new_7_2", "ps_stats"],
+        "outputs": ["df_ps_nissan_7_3", "df_new_7_3", "tca_limits", "ratio_df", "current_letter"],
+    },
+    {"name": "7.4 HDEV6 new part", "func": stage_7_4_hdev6_new_part, "inputs": ["df_new_7_3"], "outputs": ["df_new_7_4"]},
+    {
+        "name": "7.5 EZKL fallback",
+        "func": stage_7_5_ezkl_fallback,
+        "inputs": ["df_new_7_4", "ezkl_lookup"],
+        "outputs": ["df_new_7_5"],
+    },
+    {
+        "name": "7.6 outliers",
+        "func": stage_7_6_outliers,
+        "inputs": ["df_new_7_5", "tca_limits"],
+        "outputs": ["df_new_7_6"],
+    },
+    {"name": "7.7 BR contract", "func": stage_7_7_br_contract, "inputs": ["df_new_7_6"], "outputs": ["df_new_7_7"]},
+    {
+        "name": "7.8 EZKL stats",
+        "func": stage_7_8_ezkl_stats,
+        "inputs": ["df_new_7_7"],
+        "outputs": ["df_new_7_8", "std_summary"],
+    },
+    {"name": "7.9 HDEV6 flags", "func": stage_7_9_hdev6_flags, "inputs": ["df_new_7_8"], "outputs": ["df_new_7_9"]},
+    {
+        "name": "7.10 denied paid ratio",
+        "func": stage_7_10_denied_paid_ratio,
+        "inputs": ["df_new_7_9", "ratio_df"],
+        "outputs": ["df_new_7_10"],
+    },
+    {
+        "name": "7.11 warranty checks",
+        "func": stage_7_11_warranty_checks,
+        "inputs": ["df_new_7_10", "current_letter"],
+        "outputs": ["df_new_7_11"],
+    },
+    {"name": "7.12 hybrid label", "func": stage_7_12_hybrid_label, "inputs": ["df_new_7_11"], "outputs": ["df_new_7_12"]},
+    {"name": "7.13 group count", "func": stage_7_13_group_count, "inputs": ["df_new_7_12"], "outputs": ["df_new_7_13"]},
+    {"name": "8.1 claim logic", "func": stage_8_1_claim_logic, "inputs": ["df_new_7_13"], "outputs": ["df_new_8_1"]},
+    {"name": "8.2 subpart filter", "func": stage_8_2_subpart_filter, "inputs": ["df_new_8_1"], "outputs": ["results_8_2"]},
+    {"name": "8.3 Irr. Month", "func": stage_8_3_irr_month, "inputs": ["results_8_2"], "outputs": ["results_8_3"]},
+    {
+        "name": "8.4 save results",
+        "func": stage_8_4_save_results,
+        "inputs": ["results_8_3"],
+        "outputs": ["results"],
+        "cache": False,
+    },
+    {
+        "name": "9 Power BI aggregate",
+        "func": stage_9_append_aggregate,
+        "inputs": ["results"],
+        "outputs": ["all_claims"],
+        "cache": False,
+    },
+]
 
-print("Updated aggregate file saved to:", AI_CLAIMS_AGG_PATH)
-print(all_claims["AI_DATE"].value_counts())
+# ------------------------------------------------------------
+# Offline run (SYNTHETIC_INPUTS): generated inputs, local outputs
+# ------------------------------------------------------------
+# The generated sheets replace the 4.0 load (or, with SYNTHETIC_WORKBOOKS,
+# are written as workbooks that 4.0 loads). Every file the run writes
+# (load snapshots, PS history, stage cache, subpart scores, results,
+# aggregate, run log) goes below SYNTHETIC_DIR, so the real outputs and
+# caches are never touched.
+
+run_stage_list = NISSAN_STAGES
+input_values = {}
+if SYNTHETIC_INPUTS is not None:
+    SYNTHETIC_DIR = os.path.join(PS_CACHE_DIR, "synthetic", f"20{DATE_YYMM}")
+    synthetic_sheets = generate_nissan_sheets(claim_date_ts, **SYNTHETIC_INPUTS)
+
+    LOAD_CACHE_DIR = os.path.join(SYNTHETIC_DIR, "load_cache")
+    PS_HISTORY_DIR = os.path.join(SYNTHETIC_DIR, "ps_history")
+    STAGE_CACHE_DIR = os.path.join(SYNTHETIC_DIR, "stages")
+    SUBPART_SCORE_CACHE = os.path.join(SYNTHETIC_DIR, "subpart_pair_scores.parquet")
+    REF_RESULTS_PATH = os.path.join(SYNTHETIC_DIR, f"results_refactor_20{DATE_YYMM}.xlsx")
+    AI_TEMPLATE_PATH = str(write_results_template(os.path.join(SYNTHETIC_DIR, "AI_validated_claims_template.xlsx")))
+    AI_CLAIMS_AGG_PATH = os.path.join(SYNTHETIC_DIR, "AI_validated_claims.xlsx")
+    AI_CLAIMS_STORE_DIR = os.path.join(SYNTHETIC_DIR, "AI_validated_claims_store")
+    RUN_LOG_PATH = os.path.join(SYNTHETIC_DIR, f"run_log_20{DATE_YYMM}.json")
+
+    if SYNTHETIC_WORKBOOKS:
+        INPUT_MANIFEST = write_nissan_workbooks(synthetic_sheets, INPUT_MANIFEST, os.path.join(SYNTHETIC_DIR, "inputs"))
+    else:
+        input_values = manifest_inputs(synthetic_sheets, INPUT_MANIFEST)
+        run_stage_list = [stage for stage in NISSAN_STAGES if stage["name"] != "4.0 load inputs"]
+    print(f"Offline run on synthetic inputs {SYNTHETIC_INPUTS}; outputs in {SYNTHETIC_DIR}")
 
+# ------------------------------------------------------------
+# Run
+# ------------------------------------------------------------
 
+# Stage time / memory / rows of this run (see pipeline.run_profile)
+run_profile = []
+run_started = pd.Timestamp.now()
+if PROFILE_PYTHON_MEMORY:
+    start_memory_tracing()
+
+stage_values, stage_report = run_stages(
+    run_stage_list,
+    values=input_values,
+    cache_dir=STAGE_CACHE_DIR,
+    profile=run_profile,
+    untracked=("BOSCH_PN_MEMO", "NISSAN_PN_MEMO"),
+)
 
+# Final frames, for inspection in the notebook
+df_ps_nissan = stage_values["df_ps_nissan_7_3"]
+df_new = stage_values["df_new_8_1"]
+results = stage_values["results"]
+all_claims = stage_values["all_claims"]
+load_report = stage_values.get("load_report")  # None when 4.0 did not run
+ps_history_report = stage_values["ps_history_report"]
+
+# Run log next to the results + summary (slowest stages first)
+save_profile(
+    run_profile,
+    RUN_LOG_PATH,
+    claim_date=claim_date_ts,
+    run_started=run_started,
+    run_wall_s=round((pd.Timestamp.now() - run_started).total_seconds(), 1),
+    rows_new=len(df_new),
+    rows_ps=len(df_ps_nissan),
+)
+print("Run log saved to:", RUN_LOG_PATH)
+print(profile_summary(run_profile).to_string(index=False))
@@ -0,0 +1,207 @@
+"""
+Nissan warranty judge — data preparation helpers (sections 4–6).
+
+Lookups, normalizers and curation steps shared by the PS history and the
+monthly objection data. Row-wise originals are kept next to the columnar
+versions as the reference behaviour.
+"""
+
+import numpy as np
+import pandas as pd
+
+from pipeline.date_normalize import clean_vehicle_mfd_column
+
+
+# ============================================================
+# EZKL LOOKUPS (4.1 / 4.2 / 7.5)
+# ============================================================
+
+def get_most_common_ezkl(df: pd.DataFrame, parts_no_prefix: str):
+    """
+    From EZKL mapping table, get the most common EZKL Name for a given prefix.
+    Row-wise reference for build_mode_lookup (one full scan per call).
+    """
+    matching_rows = df[df["Bosch Parts No. Prefix"] == parts_no_prefix]
+    if not matching_rows.empty:
+        return matching_rows["EZKL Name"].mode()[0]
+    return None
+
+
+def count_pairs(df: pd.DataFrame, key_col: str, value_col: str) -> pd.DataFrame:
+    """
+    (key, value, _count) table of non-missing pairs.
+    Counts are additive: tables of disjoint row sets can be concatenated and
+    summed, then turned into a lookup with mode_lookup_from_counts.
+    """
+    return (
+        df[[key_col, value_col]]
+        .dropna()
+        .groupby([key_col, value_col], sort=False, observed=True)
+        .size()
+        .reset_index(name="_count")
+    )
+
+
+def mode_lookup_from_counts(counts: pd.DataFrame, key_col: str, value_col: str) -> dict:
+    """{key → most common value} from a count_pairs table (ties: smallest value)."""
+    counts = counts.groupby([key_col, value_col], sort=False, observed=True)["_count"].sum().reset_index()
+    best = counts.sort_values(
+        by=[key_col, "_count", value_col],
+        ascending=[True, False, True],
+        kind="stable",
+    ).drop_duplicates(subset=key_col, keep="first")
+    return dict(zip(best[key_col], best[value_col]))
+
+
+def build_mode_lookup(df: pd.DataFrame, key_col: str, value_col: str) -> dict:
+    """
+    Build {key → most common value} in one grouped pass.
+
+    - Rows with a missing key or value are ignored (like Series.mode()).
+    - Ties are broken like Series.mode()[0]: the smallest value wins.
+    Use with Series.map(); keys without any value map to NaN.
+    """
+    return mode_lookup_from_counts(count_pairs(df, key_col, value_col), key_col, value_col)
+
+
+# ============================================================
+# 6.1 DUPLICATE / CONFLICTING STATUS RESOLUTION
+# ============================================================
+
+OBJECTION_STATUS_EN = {"却下": "Rejected", "受理": "Accepted"}
+
+
+def resolve_duplicates_reference(df_ps_nissan: pd.DataFrame) -> pd.DataFrame:
+    """
+    Original section 6.1 (reference for resolve_duplicates):
+    - translate Status (JP → EN)
+    - Objection IDs with exactly two rows and conflicting statuses
+      (a missing status always conflicts): keep the earliest SAP Date rows
+    - keep the last record per (Objection ID, Total Claimed Amount)
+    """
+    df_ps_nissan = df_ps_nissan.copy()
+    df_ps_nissan["Status"] = df_ps_nissan["Status"].map(OBJECTION_STATUS_EN)
+
+    obj_id_counts = df_ps_nissan["Objection ID"].value_counts()
+
+    # Temporary status to distinguish NaN rows
+    df_ps_nissan["Status_temp"] = df_ps_nissan.apply(
+        lambda row: f"NaN_{row.name}" if pd.isna(row["Status"]) else row["Status"],
+        axis=1,
+    )
+
+    # Objection IDs that appear exactly twice, with conflicting statuses
+    obj_ids_twice = obj_id_counts[obj_id_counts == 2].index
+    obj_no_2 = df_ps_nissan[df_ps_nissan["Objection ID"].isin(obj_ids_twice)]
+    status_counts = obj_no_2.groupby("Objection ID")["Status_temp"].nunique()
+    conflict_ids = status_counts[status_counts > 1].index
+
+    # For conflicting IDs, keep only the earliest SAP Date rows
+    OBJ_SAP = df_ps_nissan[df_ps_nissan["Objection ID"].isin(conflict_ids)].sort_values(
+        by=["Objection ID", "SAP Date"],
+        ascending=True,
+    )
+    OBJ_SAP_sorted = OBJ_SAP.sort_values(by=["Objection ID", "SAP Date"], ascending=True)
+    OBJ_SAP_order = OBJ_SAP_sorted.drop_duplicates(subset=["Objection ID"], keep="first")
+    earliest = OBJ_SAP_order[["Objection ID", "SAP Date"]].rename(columns={"SAP Date": "Earliest SAP Date"})
+    df_ps_nissan = df_ps_nissan.merge(earliest, on="Objection ID", how="left")
+
+    mask_drop = (
+        df_ps_nissan["Earliest SAP Date"].notna()
+        & (df_ps_nissan["SAP Date"] > df_ps_nissan["Earliest SAP Date"])
+    )
+    df_ps_nissan = df_ps_nissan[~mask_drop].drop(columns=["Earliest SAP Date"])
+
+    # Final dedupe: keep last record per (Objection ID, Total Claimed Amount)
+    df_nissan_sorted = df_ps_nissan.sort_values(
+        by=["Objection ID", "Total Claimed Amount", "SAP Date"],
+        ascending=True,
+    )
+    df_ps_nissan = df_nissan_sorted.drop_duplicates(subset=["Objection ID", "Total Claimed Amount"], keep="last")
+    return df_ps_nissan.drop(columns=["Status_temp"])
+
+
+def resolve_duplicates(df_ps_nissan: pd.DataFrame) -> pd.DataFrame:
+    """
+    Section 6.1 with group operations only (same rows, order and index as
+    resolve_duplicates_reference; the index is the row position in the input).
+
+    - conflict: Objection ID with exactly two rows whose statuses are not
+      both present and equal (min / max of the status codes per group)
+    - conflicting IDs keep rows with SAP Date <= the group minimum
+      (groupby transform('min'), NaT never dropped)
+    - one sort by (Objection ID, Total Claimed Amount, SAP Date), last
+      row per (Objection ID, Total Claimed Amount) kept
+    """
+    # Factorize once; groups are then formed on integer codes (missing → -1)
+    ids = pd.factorize(df_ps_nissan["Objection ID"])[0]
+    status = df_ps_nissan["Status"].map(OBJECTION_STATUS_EN)
+    sap = df_ps_nissan["SAP Date"]
+
+    by_id = pd.Series(pd.factorize(status)[0]).groupby(ids, sort=False)
+    rows = by_id.transform("size").to_numpy()
+    lowest = by_id.transform("min").to_numpy()
+    highest = by_id.transform("max").to_numpy()
+    # Two rows conflict unless both statuses are present (code >= 0) and equal
+    conflict = (ids >= 0) & (rows == 2) & ((lowest != highest) | (lowest < 0))
+
+    earliest = sap.where(conflict).groupby(ids, sort=False).transform("min").to_numpy()
+    keep = ~(conflict & (sap.to_numpy() > earliest))
+
+    out = df_ps_nissan.assign(Status=status.to_numpy()).set_axis(pd.RangeIndex(len(df_ps_nissan)))[keep]
+    out = out.sort_values(by=["Objection ID", "Total Claimed Amount", "SAP Date"], ascending=True)
+    return out[~out.duplicated(subset=["Objection ID", "Total Claimed Amount"], keep="last")]
+
+
+# ============================================================
+# 6.2 VEHICLE MFD IMPUTATION
+# ============================================================
+
+def fill_vehicle_mfd_reference(df: pd.DataFrame, mean_lag, registration_as_year: bool = False) -> pd.Series:
+    """
+    Original row-by-row fills of section 6.2 (reference for impute_vehicle_mfd).
+    - PS data: registration date, else failure date − mean lag (iterrows)
+    - new data (registration_as_year=True): registration year, else
+      failure date − mean lag (two masked assignments)
+    Returns the filled, not yet normalized Vehicle MFD column.
+    """
+    df = df[["Vehicle MFD", "Vehicle Registration Date", "Vehicle Failure Date"]].copy()
+    if registration_as_year:
+        df.loc[df["Vehicle MFD"].isna(), "Vehicle MFD"] = df["Vehicle Registration Date"].dt.year
+        df.loc[df["Vehicle MFD"].isna(), "Vehicle MFD"] = (
+            df.loc[df["Vehicle MFD"].isna(), "Vehicle Failure Date"] - mean_lag
+        )
+        return df["Vehicle MFD"]
+
+    df["Vehicle MFD"] = df["Vehicle MFD"].astype(object)
+    for index, row in df[df["Vehicle MFD"].isna()].iterrows():
+        if pd.notna(row["Vehicle Registration Date"]):
+            df.at[index, "Vehicle MFD"] = row["Vehicle Registration Date"]
+        else:
+            df.at[index, "Vehicle MFD"] = row["Vehicle Failure Date"] - mean_lag
+    return df["Vehicle MFD"]
+
+
+def impute_vehicle_mfd(df: pd.DataFrame, mean_lag, registration_as_year: bool = False) -> pd.Series:
+    """
+    Vehicle MFD as datetime64[ns], missing values filled in bulk:
+    - present values → clean_vehicle_mfd (year / 'yyyy/mm' / dates)
+    - missing → registration date (Jan 1st of its year if
+      registration_as_year), else failure date − mean_lag
+    Same result as clean_vehicle_mfd_column(fill_vehicle_mfd_reference(...)).
+    Values that are present but unparseable stay NaT (they are not filled).
+    """
+    mfd = clean_vehicle_mfd_column(df["Vehicle MFD"]).to_numpy(copy=True)
+    missing = df["Vehicle MFD"].isna().to_numpy()
+    if not missing.any():
+        return pd.Series(mfd, index=df.index, dtype="datetime64[ns]")
+
+    registration = pd.to_datetime(df["Vehicle Registration Date"]).astype("datetime64[ns]")
+    if registration_as_year:
+        registration = registration.dt.to_period("Y").dt.to_timestamp().astype("datetime64[ns]")
+    failure = pd.to_datetime(df["Vehicle Failure Date"]).astype("datetime64[ns]")
+    fallback = failure - (pd.Timedelta(mean_lag) if pd.notna(mean_lag) else np.timedelta64("NaT", "ns"))
+
+    filled = registration.where(registration.notna(), fallback).to_numpy(dtype="datetime64[ns]")
+    mfd[missing] = filled[missing]
+    return pd.Series(mfd, index=df.index, dtype="datetime64[ns]")
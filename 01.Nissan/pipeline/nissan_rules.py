@@ -0,0 +1,472 @@
+"""
+Nissan warranty judge — business rules.
+
+Row-wise functions are kept as the reference implementation of each rule;
+the *_frame variants compute the same result for a whole DataFrame at once
+and are what the production script calls.
+"""
+
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from pipeline.fuzzy_match import load_pair_scores, pair_scores, save_pair_scores
+from pipeline.part_groups import assign_groups
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _str_mask(s: pd.Series) -> np.ndarray:
+    """True where the value is a Python string (NaN / numbers → False)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Decide once per category, broadcast through the codes
+        is_str = _str_mask(pd.Series(s.cat.categories, dtype=s.cat.categories.dtype))
+        codes = s.cat.codes.to_numpy()
+        return np.append(is_str, False)[codes]
+    if pd.api.types.is_string_dtype(s.dtype) and s.dtype != object:
+        return s.notna().to_numpy()
+    if s.dtype == object:
+        try:
+            return s.str.len().notna().to_numpy()
+        except AttributeError:  # no string values at all
+            return np.zeros(len(s), dtype=bool)
+    return np.zeros(len(s), dtype=bool)
+
+
+def _str_contains(s: pd.Series, pattern: str) -> np.ndarray:
+    """Regex contains on string values only (non-strings → False)."""
+    if not _str_mask(s).any():
+        return np.zeros(len(s), dtype=bool)
+    return s.str.contains(pattern, regex=True, na=False).to_numpy(dtype=bool)
+
+
+def _to_datetime_elementwise(s: pd.Series) -> pd.Series:
+    """
+    pd.to_datetime(value, errors="coerce") applied per value.
+    Column-level parsing infers one format for the whole column, so
+    unique values are parsed one by one and mapped back instead.
+    """
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return s
+    uniques = s.dropna().unique()
+    parsed = {value: pd.to_datetime(value, errors="coerce") for value in uniques}
+    return pd.to_datetime(s.map(parsed))
+
+
+def _values_equal(a: pd.Series, b: pd.Series) -> np.ndarray:
+    """Element-wise Python '==' (NaN never equals anything)."""
+    if pd.api.types.is_numeric_dtype(a.dtype) and pd.api.types.is_numeric_dtype(b.dtype):
+        return a.to_numpy() == b.to_numpy()
+    return np.asarray(a.to_numpy(dtype=object) == b.to_numpy(dtype=object), dtype=bool)
+
+
+# ============================================================
+# 7.7 BURDEN RATIO CONTRACT
+# ============================================================
+
+HDEV5_H_TYPE_PARTS = ("166001VA0A", "166001VA0B", "166001VA0C")
+HDEV5_FIXED_BR_PARTS = ("166005CA0A", "166006MR0B", "166006MR0C")
+
+
+def check_burden_ratio(row: pd.Series) -> int:
+    """
+    Check burden ratio correctness based on EZKL, MFD, contract dates, and special HDEV5 logic.
+    Returns:
+        0 if correct
+        1 if incorrect
+    Note: this function assumes row has columns:
+          'Vehicle MFD', 'EZKL Name', 'Customer Parts No.', 'Burden Ratio',
+          'Standard Burden Ratio', 'Current Burden Ratio',
+          'New BR Date', 'SAP Date', '類別区分'
+    Row-wise reference for check_burden_ratio_frame.
+    """
+    # Ensure "Vehicle MFD" is converted to a datetime object (yyyy/mm)
+    mfd = pd.to_datetime(row["Vehicle MFD"], format="%Y/%m")
+
+    if row["EZKL Name"] == "HDEV5":
+        # Special cases based on Customer Parts No. and 類別区分
+        if (
+            "166001VA0A" in row["Customer Parts No."]
+            or "166001VA0B" in row["Customer Parts No."]
+            or "166001VA0C" in row["Customer Parts No."]
+        ):
+            if re.match(r"^H", row["類別区分"]):
+                # Vehicle MFD date ranges for H-type
+                if mfd <= datetime(2021, 6, 30):
+                    return 0 if 2.4 <= row["Burden Ratio"] <= 3.4 else 1
+                elif mfd >= datetime(2021, 7, 1):
+                    return 0 if 49.5 <= row["Burden Ratio"] <= 50.5 else 1
+                else:
+                    return 1
+            else:
+                # Non-H 類別区分
+                return 0 if 5 <= row["Burden Ratio"] <= 6 else 1
+
+        elif "166005CA0A" in row["Customer Parts No."]:
+            return 0 if 5 <= row["Burden Ratio"] <= 6 else 1
+
+        elif (
+            "166006MR0B" in row["Customer Parts No."]
+            or "166006MR0C" in row["Customer Parts No."]
+        ):
+            return 0 if 5 <= row["Burden Ratio"] <= 6 else 1
+
+        else:
+            # Assign 0 but flag irregular case in "Irregular case BR"
+            # (Mutation is kept for behavior compatibility, even if apply() won't persist it.)
+            row["Irregular case BR"] = 1
+            return 0
+
+    if row["EZKL Name"] == "LUFT":
+        return 0
+
+    if pd.isna(row["EZKL Name"]):
+        return 0
+
+    # Default logic for non-HDEV5 / non-LUFT
+    new_br_date = pd.to_datetime(row["New BR Date"], errors="coerce")
+    sap_date = pd.to_datetime(row["SAP Date"], errors="coerce")
+
+    if pd.isna(new_br_date):
+        return 0 if row["Burden Ratio"] == row["Standard Burden Ratio"] else 1
+
+    if sap_date < new_br_date:
+        return 0 if row["Burden Ratio"] == row["Standard Burden Ratio"] else 1
+
+    return 0 if row["Burden Ratio"] == row["Current Burden Ratio"] else 1
+
+
+def check_burden_ratio_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Column-wise BR Contract check for the whole frame.
+
+    Same decision table as check_burden_ratio (incl. the safe wrapper that
+    maps TypeError → 0), evaluated once with boolean masks + np.select.
+    Returns a DataFrame (same index as df) with:
+    - 'BR Contract'       0 if correct, 1 if incorrect
+    - 'Irregular case BR' 1 for HDEV5 rows with an unknown Customer Parts No.
+    """
+    ezkl = df["EZKL Name"]
+    cpn = df["Customer Parts No."]
+    kind = df["類別区分"]
+    br_raw = df["Burden Ratio"]
+
+    # Non-numeric Burden Ratio raises TypeError in range checks → 0
+    if pd.api.types.is_numeric_dtype(br_raw.dtype):
+        br_not_number = np.zeros(len(df), dtype=bool)
+    else:
+        br_not_number = br_raw.notna().to_numpy() & ~br_raw.map(
+            lambda v: isinstance(v, (int, float, np.number))
+        ).to_numpy(dtype=bool)
+    br = pd.to_numeric(br_raw.where(~br_not_number), errors="coerce").to_numpy(dtype=float)
+
+    mfd = _to_datetime_elementwise(df["Vehicle MFD"])
+    new_br_date = _to_datetime_elementwise(df["New BR Date"])
+    sap_date = _to_datetime_elementwise(df["SAP Date"])
+
+    def in_range(lo, hi):
+        with np.errstate(invalid="ignore"):
+            return (br >= lo) & (br <= hi)
+
+    is_hdev5 = (ezkl == "HDEV5").to_numpy(dtype=bool)
+    cpn_is_str = _str_mask(cpn)
+    kind_is_str = _str_mask(kind)
+
+    h_parts = _str_contains(cpn, "|".join(HDEV5_H_TYPE_PARTS))
+    fixed_parts = _str_contains(cpn, "|".join(HDEV5_FIXED_BR_PARTS))
+    h_type = kind_is_str & _str_contains(kind, r"^H")
+
+    hdev5_h_parts = is_hdev5 & cpn_is_str & h_parts
+    hdev5_h_type = hdev5_h_parts & h_type
+    hdev5_5_to_6 = is_hdev5 & cpn_is_str & ((h_parts & kind_is_str & ~h_type) | (~h_parts & fixed_parts))
+    irregular = is_hdev5 & cpn_is_str & ~h_parts & ~fixed_parts
+
+    equals_standard = _values_equal(br_raw, df["Standard Burden Ratio"])
+    equals_current = _values_equal(br_raw, df["Current Burden Ratio"])
+
+    mfd_early = (mfd <= datetime(2021, 6, 30)).to_numpy()
+    mfd_late = (mfd >= datetime(2021, 7, 1)).to_numpy()
+    compares_br = (hdev5_h_type & (mfd_early | mfd_late)) | hdev5_5_to_6
+
+    conditions = [
+        is_hdev5 & ~cpn_is_str,                        # TypeError → 0
+        hdev5_h_parts & ~kind_is_str,                  # TypeError → 0
+        compares_br & br_not_number,                   # TypeError → 0
+        hdev5_h_type & mfd_early,
+        hdev5_h_type & mfd_late,
+        hdev5_h_type,                                  # MFD missing / in the gap
+        hdev5_5_to_6,
+        irregular,
+        (ezkl == "LUFT").to_numpy(dtype=bool),
+        ezkl.isna().to_numpy(),
+        new_br_date.isna().to_numpy(),
+        (sap_date < new_br_date).to_numpy(),
+    ]
+    choices = [
+        0,
+        0,
+        0,
+        ~in_range(2.4, 3.4),
+        ~in_range(49.5, 50.5),
+        1,
+        ~in_range(5, 6),
+        0,
+        0,
+        0,
+        ~equals_standard,
+        ~equals_standard,
+    ]
+    br_contract = np.select(conditions, choices, default=~equals_current).astype(int)
+
+    return pd.DataFrame(
+        {"BR Contract": br_contract, "Irregular case BR": irregular.astype(int)},
+        index=df.index,
+    )
+
+
+# ============================================================
+# 8.1 CLAIM DECISION
+# ============================================================
+
+def generate_claim(row: pd.Series) -> int:
+    """
+    Claim decision (main logic).
+
+    Returns 1 (claim) when any critical flag is raised and Right_Month / High Denied Paid Ratio are not blocking.
+    """
+    # Automatically return 0 if Right_Month is 1
+    if row["Right_Month"] == 1:
+        return 0
+
+    # Automatically return 0 if High Denied Paid Ratio is 1
+    if row["High Denied Paid Ratio"] == 1:
+        return 0
+
+    # Check the other conditions only if the above are false
+    if (
+        row["TCA Outlier EZKL"] == 1
+        or row["BR Contract"] == 1
+        or row["Outside_warranty_period"] == 1
+        or row["HDEV6_countermeasure"] == 1
+        or row["HDEV6_over_120000"] == 1
+    ):
+        return 1
+
+    # Return 0 if none of the conditions are met
+    return 0
+
+
+def generate_claim_DPR(row: pd.Series) -> int:
+    """
+    Claim decision variation for DPR logic.
+
+    Same as generate_claim, but does NOT consider 'High Denied Paid Ratio'.
+    """
+    # Automatically return 0 if Right_Month is 1
+    if row["Right_Month"] == 1:
+        return 0
+
+    # Check the other conditions only if the above are false
+    if (
+        row["TCA Outlier EZKL"] == 1
+        or row["BR Contract"] == 1
+        or row["Outside_warranty_period"] == 1
+        or row["HDEV6_countermeasure"] == 1
+        or row["HDEV6_over_120000"] == 1
+    ):
+        return 1
+
+    # Return 0 if none of the conditions are met
+    return 0
+
+
+# Flags that raise a claim (any == 1), checked only when no blocker is set
+CLAIM_FLAGS = (
+    "TCA Outlier EZKL",
+    "BR Contract",
+    "Outside_warranty_period",
+    "HDEV6_countermeasure",
+    "HDEV6_over_120000",
+)
+
+# Declarative claim rule table: output column → blockers / flags / outcome.
+# Blockers are checked in order and force outcome 0; otherwise the first
+# flag == 1 gives the outcome. Add a variant here instead of a new function.
+CLAIM_RULES = {
+    "claim": {
+        "blockers": ("Right_Month", "High Denied Paid Ratio"),
+        "flags": CLAIM_FLAGS,
+        "outcome": 1,
+    },
+    "claim_DPR": {
+        "blockers": ("Right_Month",),
+        "flags": CLAIM_FLAGS,
+        "outcome": 1,
+    },
+}
+
+
+def compile_claim_rules(rules: dict) -> dict:
+    """
+    Compile a claim rule table into column positions.
+    - 'columns': every blocker/flag column, each listed once
+    - 'variants': per output column, the blocker/flag positions in 'columns'
+      and the rule labels written to '<variant>_rule'
+    """
+    columns = []
+    for spec in rules.values():
+        for col in (*spec["blockers"], *spec["flags"]):
+            if col not in columns:
+                columns.append(col)
+
+    variants = {}
+    for name, spec in rules.items():
+        blockers = list(spec["blockers"])
+        flags = list(spec["flags"])
+        variants[name] = {
+            "blockers": np.array([columns.index(c) for c in blockers], dtype=int),
+            "flags": np.array([columns.index(c) for c in flags], dtype=int),
+            "blocker_labels": np.array([f"blocked: {c}" for c in blockers], dtype=object),
+            "flag_labels": np.array([f"flag: {c}" for c in flags], dtype=object),
+            "outcome": spec.get("outcome", 1),
+        }
+    return {"columns": columns, "variants": variants}
+
+
+def _first_hit(hits: np.ndarray, labels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(any hit, label of the first hit) per row of a boolean matrix."""
+    if hits.shape[1] == 0:
+        return np.zeros(hits.shape[0], dtype=bool), np.full(hits.shape[0], None, dtype=object)
+    any_hit = hits.any(axis=1)
+    first = labels[hits.argmax(axis=1)]
+    return any_hit, np.where(any_hit, first, None)
+
+
+def apply_claim_rules(df: pd.DataFrame, rules: dict = CLAIM_RULES, explain: bool = False) -> pd.DataFrame:
+    """
+    Evaluate every claim variant in one pass over the flag columns.
+
+    Same result as generate_claim / generate_claim_DPR (a value counts as
+    raised only when == 1; NaN is not raised). Returns a DataFrame (same
+    index as df) with one int column per variant.
+    - explain=True: also '<variant>_rule' naming the blocker or flag that
+      decided the row ('no rule' otherwise), for auditing
+    """
+    compiled = rules if "variants" in rules else compile_claim_rules(rules)
+
+    # One boolean matrix for all referenced columns, shared by all variants
+    hits = df[compiled["columns"]].eq(1).to_numpy(dtype=bool)
+
+    out = {}
+    for name, variant in compiled["variants"].items():
+        blocked, blocker_label = _first_hit(hits[:, variant["blockers"]], variant["blocker_labels"])
+        flagged, flag_label = _first_hit(hits[:, variant["flags"]], variant["flag_labels"])
+
+        out[name] = np.where(~blocked & flagged, variant["outcome"], 0).astype(int)
+        if explain:
+            out[f"{name}_rule"] = np.where(
+                blocked, blocker_label, np.where(flagged, flag_label, "no rule")
+            )
+    return pd.DataFrame(out, index=df.index)
+
+
+# ============================================================
+# 8.2 SUBPART CHECK
+# ============================================================
+
+def normalize_expected(value, normalization: dict | None = None):
+    """
+    Normalize 'Expected group' free-text into a standard label.
+    - Lowercases / strips
+    - Cuts off after ';', ',' or ':' if present
+    - Maps through normalization (EXPECTED_GROUP_NORMALIZATION)
+    """
+    if not value:
+        return "unassigned"
+
+    val = str(value).strip().lower()
+
+    # Remove known suffixes after delimiters (e.g., ';', ',', ':')
+    for delimiter in [";", ",", ":"]:
+        if delimiter in val:
+            val = val.split(delimiter)[0].strip()
+            break
+
+    # Normalize using dictionary
+    return (normalization or {}).get(val, val)
+
+
+def apply_subpart_filter(
+    df: pd.DataFrame,
+    group_index: dict,
+    normalization: dict | None = None,
+    threshold: int = 90,
+    score_cache_path=None,
+) -> pd.DataFrame:
+    """
+    Subpart consistency check:
+    - For Parts Distinction = 2 (subparts), compare Bosch Parts Name (normalized)
+      vs part-number-based group (assign_groups on group_index).
+    - If mismatch (fuzzy score < threshold) → 'To object?', else 'OK'.
+    - Propagate 'To object?' to Distinction = 1 rows sharing the same Reference No.
+    Distinct (expected, group) pairs are scored once in a batch; scores
+    are reused across runs through score_cache_path (None → no cache).
+    """
+    df = df.copy()
+
+    # Step 1: work on subparts only
+    df2 = df[df["Parts Distinction"] == 2].copy()
+
+    # Part groups for the whole subpart column in one pass
+    part_numbers = df2["Customer Parts No."].astype(str).str.strip()
+    computed_groups = assign_groups(part_numbers, group_index).str.lower()
+
+    # Normalize each distinct expected name once
+    raw_expected = df2["Bosch Parts Name"] if "Bosch Parts Name" in df2 else pd.Series("", index=df2.index)
+    codes, uniques = pd.factorize(raw_expected)
+    normalized = np.array([normalize_expected(v, normalization) for v in uniques] + [None], dtype=object)[codes]
+    # Missing names keep their own outcome (None → 'unassigned', NaN → 'nan')
+    missing = codes < 0
+    normalized[missing] = [normalize_expected(v, normalization) for v in raw_expected[missing]]
+    normalized_expected = pd.Series(normalized, index=df2.index)
+
+    # Score distinct pairs (cached), broadcast back to the rows
+    scores = load_pair_scores(score_cache_path)
+    known_pairs = len(scores)
+    similarity = pair_scores(normalized_expected, computed_groups, scores)
+    if score_cache_path is not None and len(scores) > known_pairs:
+        save_pair_scores(scores, score_cache_path)
+
+    # Step 2: assign Subpart for Distinction = 2 rows
+    df2["Subpart"] = np.where(similarity >= threshold, "OK", "To object?")
+
+    # Keep unique Subpart per Reference No. + Customer Parts No.
+    df2_unique = df2[["Reference No.", "Customer Parts No.", "Subpart"]].drop_duplicates()
+
+    # Step 3: merge back into full df
+    df = df.drop(columns=["Subpart"], errors="ignore")
+    df = df.merge(
+        df2_unique,
+        on=["Reference No.", "Customer Parts No."],
+        how="left",
+    )
+
+    # Step 4: propagate "To object?" to Distinction = 1 rows
+    refs_with_bad_parts = df.loc[
+        (df["Parts Distinction"] == 2) & (df["Subpart"] == "To object?"),
+        "Reference No.",
+    ].unique()
+
+    df.loc[
+        (df["Parts Distinction"] == 1) & (df["Reference No."].isin(refs_with_bad_parts)),
+        "Subpart",
+    ] = "To object?"
+
+    # Step 5: remaining NaN → "OK"
+    df["Subpart"] = df["Subpart"].fillna("OK")
+
+    return df
@@ -0,0 +1,569 @@
+"""
+Synthetic inputs in the Nissan production schema (sections 4–9 offline).
+
+Generates the sheets the pipeline reads from the share, with the column
+names the stages expect:
+- PS_Data (all OEMs; Reference No., SAP Date, Bosch Parts No., EZKL Name,
+  Total Claimed Amount, Domestic/Overseas, vehicle dates, ...) and its
+  Translation sheet
+- the monthly Nissan objection file (For_sap_C: Division, Parts
+  Distinction, 類別区分, 期間, Burden Ratio, EDP Date, ...) and its
+  translation table
+- the burden-ratio contract table (Japanese headers, sheet "2021")
+- the objection status list (Nissan sheet: 却下 / 受理 / 申請中) and its
+  Translation sheet
+
+Raw headers are the translated names (the translation sheets map each
+column onto itself), so translate() runs but renames nothing.
+
+Values are drawn per EZKL from EZKL_CATALOGUE (part numbers, claim amount
+level, contract burden ratio, rejection share), so the lookups, outlier
+flags, BR Contract check, DPR ratios and subpart check all see realistic
+mixes. The same (claim_date, sizes, random_state) always gives the same
+sheets.
+
+- generate_nissan_sheets: the sheets as DataFrames
+- manifest_inputs: what load_excel_manifest returns for INPUT_MANIFEST
+  (the values of stage 4.0), without writing any workbook
+- write_nissan_workbooks: the sheets as local workbooks + a manifest
+  pointing at them (to run / profile 4.0 itself)
+- write_results_template: Power BI template header for 8.4 / 9
+"""
+
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from pipeline.excel_cache import apply_selection
+from pipeline.nissan_rules import HDEV5_FIXED_BR_PARTS, HDEV5_H_TYPE_PARTS
+
+# EZKL catalogue: name → Bosch P/N prefix (7 digits), product name,
+# Nissan customer P/Ns, median claim amount (JPY), share of claims,
+# share of objections rejected (却下 → Denied Paid Claim)
+EZKL_CATALOGUE = {
+    "HDEV5": ("0261500", "Injection Valve", HDEV5_H_TYPE_PARTS + HDEV5_FIXED_BR_PARTS + ("166001VA0D",), 60_000, 0.22, 0.55),
+    "HDEV6": ("0261501", "Injection Valve", ("166006RC1A", "166006RC1C", "166007JA1A"), 90_000, 0.10, 0.50),
+    "LS": ("0258030", "Lambda Sensor", ("226A05CA0A", "226936UA0A"), 25_000, 0.15, 0.60),
+    "LUFT": ("0280218", "Air Mass Meter", ("226805RB0A",), 30_000, 0.05, 0.40),
+    "CRI": ("0445110", "Common Rail Injector", ("166006MA2B", "16600MA70A"), 110_000, 0.10, 0.65),
+    "CP1H": ("0445010", "High Pressure Pump", ("16630HY00A", "17520HY00A"), 180_000, 0.06, 0.70),
+    "EKPT": ("0580200", "Fuel Pump Mounting Unit", ("170406FK0A", "173423VA0A"), 45_000, 0.12, 0.45),
+    "EV": ("0280158", "Injection Valve", ("166006RC0A",), 35_000, 0.08, 0.50),
+    "GLP": ("0250403", "Glow Plug", ("110655X00A",), 15_000, 0.04, 0.97),
+    "ECU-PC/GS": ("0261S10", "Control Unit", ("23703HG00F", "237037JA1A"), 150_000, 0.05, 0.35),
+    "DM": ("0444043", "Dosing Module", ("208S45CA0A",), 70_000, 0.03, 0.50),
+}
+
+# Raw EZKL spellings cleaned by REPLACEMENTS / the "(S)" filter in 4.1
+EZKL_RAW_VARIANTS = {"HDEV5": ("HDEV", "HDEV5(S)"), "EKPT": ("EKP/T",), "EV": ("EV(Do)",)}
+
+# Burden-ratio contracts (percent): EZKL → (standard, current, new BR date)
+NISSAN_CONTRACTS = {
+    "HDEV5": (5.5, "5.5\n(一部50%)", "2021-07-01"),
+    "HDEV6": (50, 50, "2023-04-01"),
+    "LS": (30, 30, "2021-01-01"),
+    "LUFT": (20, 20, "2021-01-01"),
+    "CRI": (40, 35, "2024-04-01"),
+    "CP1H": (40, 40, "2021-01-01"),
+    "EKPT": (30, 25, "2025-10-01"),
+    "EV": (20, 20, "2022-01-01"),
+    "GLP": (10, 10, "2021-01-01"),
+    "DM": (50, 50, "2023-01-01"),
+}
+
+# Subparts (Parts Distinction 2): Customer P/N prefix → Bosch Parts Name
+# (prefixes and names follow PART_GROUP_PATTERNS of the script)
+SUBPARTS = {
+    "16618": "O-Ring",
+    "16635": "O-Ring",
+    "14722": "Rail",
+    "16612": "Supporting Disc",
+    "11065": "Glow Plug",
+    "22790": "NOx Sensor",
+    "25060": "Sensor Assembly",
+}
+
+OTHER_OEMS = ["トヨタ", "ホンダ", "マツダ", "スズキ", "スバル"]
+VEHICLE_KINDS = ["HEV", "HEV-E", "GAS", "GAS-T", "DSL"]
+DIVISIONS = ["PS(GS)", "PS(DS)", "P", "CC"]
+
+# Reference No. month letter by calendar month (see get_letter_from_claim_date)
+MONTH_LETTERS = np.array(list("LABCDEFGHIJK"))
+
+# Columns of the generated sheets (raw headers)
+PS_DATA_COLUMNS = [
+    "Product Code(DS)", "Product Code", "Sequence No.", "c3", "Division",
+    "OEM Name", "Key No.", "Reference No.", "SAP Date", "Bosch Parts No.", "Bosch Parts Name",
+    "EZKL Name", "Customer Parts No.", "Total Claimed Amount", "Burden Ratio", "Domestic/Overseas",
+    "Vehicle MFD", "Vehicle Registration Date", "Vehicle Failure Date", "Passed Month",
+    "Parts Warranty Installation Date",
+]
+NEW_COLUMNS = [
+    "Division", "Reference No.", "Parts Distinction", "Customer Parts No.", "Bosch Parts No.",
+    "Bosch Parts Name", "類別区分", "Domestic/Overseas", "Vehicle MFD", "Vehicle Registration Date",
+    "Vehicle Failure Date", "Parts Warranty Installation Date", "期間", "Total Claimed Amount",
+    "Burden Ratio", "EDP Date", "Download Date",
+]
+BURDEN_COLUMNS = [
+    "No.", "メーカー", "代表品番", "製品名\n（EZKL名称）", "製品コード\n(EZKL)", "基準負担率\nBosch",
+    "現状負担率\nBosch", "適用開始日", "変更後負担率有効期限", "備考1", "備考2", "最終更新日/確認日",
+    "負担率決定合意書保存先リンク", "Unnamed: 13",
+]
+OBJECTION_COLUMNS = ["Reference No.", "Application Date", "Total Claimed Amount", "Status", "Return Amount", "Return Amount1"]
+
+# Power BI template header written by write_results_template
+TEMPLATE_COLUMNS = [
+    "AI_DATE", "Reference No.", "Objection ID", "Irr. Month", "EZKL Name", "Hybrid_specification_EZKL",
+    "Customer Parts No.", "Bosch Parts No.", "Bosch Parts Name", "Parts Distinction", "Total Claimed Amount",
+    "Burden Ratio", "Burden Ratio Decimal", "claim", "判定.1", "claim_DPR", "Subpart",
+]
+
+# Sheet behind each manifest spec (default: the spec name)
+SPEC_SHEETS = {"ps_ezkl": "ps_data", "ps_nissan": "ps_data"}
+
+_EZKL_NAMES = list(EZKL_CATALOGUE)
+_EZKL_SHARES = np.array([entry[4] for entry in EZKL_CATALOGUE.values()]) / sum(e[4] for e in EZKL_CATALOGUE.values())
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _months_back(rng, claim_month: np.datetime64, start_month: np.datetime64, n: int) -> np.ndarray:
+    """SAP months between start and claim month (incl.), volume growing ~15% a year."""
+    months = np.arange(start_month, claim_month + 1)
+    weights = 1.15 ** (np.arange(len(months)) / 12)
+    return rng.choice(months, size=n, p=weights / weights.sum())
+
+
+def _days_in(rng, months: np.ndarray) -> np.ndarray:
+    """A random day within each month (datetime64[D])."""
+    starts = months.astype("datetime64[D]")
+    lengths = ((months + 1).astype("datetime64[D]") - starts).astype(int)
+    return starts + (rng.random(len(months)) * lengths).astype(int)
+
+
+def _reference_numbers(months: np.ndarray, lines: np.ndarray, serials: np.ndarray) -> np.ndarray:
+    """
+    Reference No. = Objection ID (8 chars) + claim line (2 digits).
+    Objection ID: 'N' + year letter + month letter (3rd char) + serial.
+    """
+    years = months.astype("datetime64[Y]").astype(int) + 1970
+    calendar_month = months.astype(int) % 12
+    return np.array(
+        [
+            f"N{chr(ord('A') + y % 26)}{m}{s:05d}{line:02d}"
+            for y, m, s, line in zip(years, MONTH_LETTERS[calendar_month], serials, lines)
+        ],
+        dtype=object,
+    )
+
+
+def _serials(months: np.ndarray) -> np.ndarray:
+    """Running number of each claim within its month."""
+    order = np.argsort(months, kind="stable")
+    ranks = np.empty(len(months), dtype=int)
+    sorted_months = months[order]
+    first = np.searchsorted(sorted_months, sorted_months, side="left")
+    ranks[order] = np.arange(len(months)) - first
+    return ranks % 100_000
+
+
+def _month_text(dates: np.ndarray) -> np.ndarray:
+    """'yyyy/mm' of each date (formatted once per distinct month)."""
+    months, codes = np.unique(dates.astype("datetime64[M]"), return_inverse=True)
+    return np.array([str(m).replace("-", "/") for m in months], dtype=object)[codes]
+
+
+def _claim_amounts(rng, medians: np.ndarray) -> np.ndarray:
+    """Log-normal around the EZKL median, with a 2% heavy tail; whole yen."""
+    amounts = medians * rng.lognormal(0.0, 0.55, len(medians))
+    amounts[rng.random(len(medians)) < 0.02] *= 3
+    return np.round(amounts)
+
+
+def _vehicle_dates(rng, failure: np.ndarray):
+    """(registration, MFD text 'yyyy/mm' or 'yyyy', passed months) before the failure date."""
+    n = len(failure)
+    registration = failure - rng.gamma(2.0, 350.0, n).astype("timedelta64[D]")
+    mfd = registration - rng.integers(20, 120, n).astype("timedelta64[D]")
+    mfd_text = _month_text(mfd)
+    as_year = rng.random(n) < 0.05
+    mfd_text[as_year] = [text[:4] for text in mfd_text[as_year]]
+    mfd_text[rng.random(n) < 0.10] = None
+    passed = ((failure - registration).astype(int) / 30.4).round(1)
+    registration = pd.Series(registration).astype("datetime64[ns]")
+    registration[rng.random(n) < 0.08] = pd.NaT
+    return registration.to_numpy(), mfd_text, passed
+
+
+def _customer_parts(rng, ezkl_codes: np.ndarray) -> np.ndarray:
+    """A Customer P/N of each row's EZKL (uniform over its catalogue list)."""
+    customer_pn = np.empty(len(ezkl_codes), dtype=object)
+    for code, name in enumerate(_EZKL_NAMES):
+        rows = np.flatnonzero(ezkl_codes == code)
+        customer_pn[rows] = rng.choice(np.array(EZKL_CATALOGUE[name][2], dtype=object), size=len(rows))
+    return customer_pn
+
+
+def _with_raw_variants(rng, ezkl: np.ndarray, share: float) -> np.ndarray:
+    """Replace a share of the EZKL names by raw spellings (HDEV, EKP/T, (S), ...)."""
+    ezkl = ezkl.astype(object)
+    for name, variants in EZKL_RAW_VARIANTS.items():
+        rows = np.flatnonzero((ezkl == name) & (rng.random(len(ezkl)) < share))
+        ezkl[rows] = rng.choice(variants, size=len(rows))
+    return ezkl
+
+
+def _translation(columns, from_column: str) -> pd.DataFrame:
+    return pd.DataFrame({from_column: list(columns), "Translated Version": list(columns)})
+
+
+# ============================================================
+# SHEETS
+# ============================================================
+
+def _ps_data(rng, n_rows: int, claim_month, start_month, nissan_share: float) -> pd.DataFrame:
+    """PS_Data: Bosch warranty claims of all OEMs, one row per claim line."""
+    months = _months_back(rng, claim_month, start_month, n_rows)
+    sap_date = _days_in(rng, months)
+    ezkl_codes = rng.choice(len(_EZKL_NAMES), size=n_rows, p=_EZKL_SHARES)
+    ezkl = np.array(_EZKL_NAMES, dtype=object)[ezkl_codes]
+    catalogue = [EZKL_CATALOGUE[name] for name in _EZKL_NAMES]
+
+    # Nissan claims use part variants 0–7, other OEMs 0–9 (the EZKL
+    # fallback of 7.5 finds the rest in the full PS database)
+    nissan = rng.random(n_rows) < nissan_share
+    variants = np.where(nissan, rng.integers(0, 8, n_rows), rng.integers(0, 10, n_rows))
+    prefixes = np.array([entry[0] for entry in catalogue], dtype=object)[ezkl_codes]
+    bosch_pn = np.array([f"{p}{v:03d}" for p, v in zip(prefixes, variants)], dtype=object)
+    messy = rng.random(n_rows) < 0.03
+    bosch_pn[messy] = [f"{pn[:4]} {pn[4:]}" for pn in bosch_pn[messy]]
+    parts_names = np.array([entry[1] for entry in catalogue], dtype=object)[ezkl_codes]
+    parts_names[rng.random(n_rows) < 0.002] = "CP1H recall"
+    customer_pn = _customer_parts(rng, ezkl_codes)
+
+    failure = sap_date - rng.integers(15, 120, n_rows).astype("timedelta64[D]")
+    registration, mfd_text, passed = _vehicle_dates(rng, failure)
+    passed[rng.random(n_rows) < 0.05] = np.nan
+
+    installation = np.full(n_rows, None, dtype=object)
+    installed = rng.random(n_rows) < 0.30
+    install_dates = (failure[installed] - rng.integers(60, 900, installed.sum()).astype("timedelta64[D]"))
+    as_serial = rng.random(installed.sum()) < 0.5
+    installation[np.flatnonzero(installed)[as_serial]] = (
+        (install_dates[as_serial] - np.datetime64("1899-12-30")).astype(int).tolist()
+    )
+    installation[np.flatnonzero(installed)[~as_serial]] = _month_text(install_dates[~as_serial])
+
+    # Claim lines: 5% are a second line of another claim (same Objection
+    # ID), 3% re-book an existing claim (same Reference No.)
+    lines = np.ones(n_rows, dtype=int)
+    serials = _serials(months)
+    for share, line in [(0.05, 2), (0.03, None)]:
+        rows = np.flatnonzero(rng.random(n_rows) < share)
+        donors = rng.integers(0, n_rows, len(rows))
+        months[rows], serials[rows] = months[donors], serials[donors]
+        lines[rows] = line if line is not None else lines[donors]
+
+    oem = np.where(nissan, "日産", rng.choice(OTHER_OEMS, size=n_rows)).astype(object)
+    medians = np.array([entry[3] for entry in catalogue], dtype=float)[ezkl_codes]
+
+    return pd.DataFrame(
+        {
+            "Product Code(DS)": rng.choice(["DS1", "DS2", "GS1"], size=n_rows),
+            "Product Code": rng.integers(100, 999, n_rows).astype(str),
+            "Sequence No.": np.arange(1, n_rows + 1),
+            "c3": rng.choice(["", "x"], size=n_rows),
+            "Division": rng.choice(DIVISIONS[:2], size=n_rows),
+            "OEM Name": oem,
+            "Key No.": rng.choice(["A", "B", "M"], size=n_rows, p=[0.80, 0.18, 0.02]),
+            "Reference No.": _reference_numbers(months, lines, serials),
+            "SAP Date": sap_date.astype("datetime64[ns]"),
+            "Bosch Parts No.": bosch_pn,
+            "Bosch Parts Name": parts_names,
+            "EZKL Name": _with_raw_variants(rng, ezkl, 0.05),
+            "Customer Parts No.": customer_pn,
+            "Total Claimed Amount": _claim_amounts(rng, medians),
+            "Burden Ratio": np.array([_standard_ratio(name) for name in _EZKL_NAMES])[ezkl_codes],
+            "Domestic/Overseas": rng.choice(["1", "2"], size=n_rows, p=[0.85, 0.15]),
+            "Vehicle MFD": mfd_text,
+            "Vehicle Registration Date": registration,
+            "Vehicle Failure Date": failure.astype("datetime64[ns]"),
+            "Passed Month": passed,
+            "Parts Warranty Installation Date": installation,
+        },
+        columns=PS_DATA_COLUMNS,
+    )
+
+
+def _standard_ratio(ezkl: str) -> float:
+    return float(NISSAN_CONTRACTS[ezkl][0]) if ezkl in NISSAN_CONTRACTS else np.nan
+
+
+def _new_data(rng, n_claims: int, claim_month) -> pd.DataFrame:
+    """Monthly Nissan objection file: main part row + 0–3 subpart rows per claim."""
+    # Every EZKL appears at least once (7.4 needs an HDEV6 row)
+    ezkl_codes = rng.choice(len(_EZKL_NAMES), size=n_claims, p=_EZKL_SHARES)
+    ezkl_codes[: min(n_claims, len(_EZKL_NAMES))] = np.arange(min(n_claims, len(_EZKL_NAMES)))
+    catalogue = [EZKL_CATALOGUE[name] for name in _EZKL_NAMES]
+    ezkl = np.array(_EZKL_NAMES, dtype=object)[ezkl_codes]
+
+    # Mostly this month's letter; late claims carry an earlier one (Right_Month)
+    ref_months = np.full(n_claims, claim_month) - np.where(rng.random(n_claims) < 0.04, rng.integers(1, 4, n_claims), 0)
+    references = _reference_numbers(ref_months, np.ones(n_claims, dtype=int), rng.permutation(n_claims) % 100_000)
+
+    # Part variants of the Nissan history (0–7); 5% only sold to other OEMs
+    # so far (8–9, found by the 7.5 fallback), 2% brand-new (99x, unknown)
+    variants = np.where(rng.random(n_claims) < 0.05, rng.integers(8, 10, n_claims), rng.integers(0, 8, n_claims))
+    variants[rng.random(n_claims) < 0.02] += 990
+    prefixes = np.array([entry[0] for entry in catalogue], dtype=object)[ezkl_codes]
+    bosch_pn = np.array([f"{p}{v:03d}" for p, v in zip(prefixes, variants)], dtype=object)
+    spaced = rng.random(n_claims) < 0.04
+    bosch_pn[spaced] = [f"{pn[:1]} {pn[1:4]} {pn[4:7]} {pn[7:]}" for pn in bosch_pn[spaced]]
+    suffixed = rng.random(n_claims) < 0.04
+    bosch_pn[suffixed] = [f"{pn}-KB" for pn in bosch_pn[suffixed]]
+    customer_pn = _customer_parts(rng, ezkl_codes)
+    # The new HDEV6 part is not in the PS history yet
+    new_hdev6 = customer_pn == "166006RC1C"
+    bosch_pn[new_hdev6] = [f"{EZKL_CATALOGUE['HDEV6'][0]}9{i % 100:02d}" for i in range(new_hdev6.sum())]
+
+    edp_date = _days_in(rng, np.full(n_claims, claim_month) - (rng.random(n_claims) < 0.2).astype(int))
+    failure = edp_date - rng.integers(20, 150, n_claims).astype("timedelta64[D]")
+    registration, mfd_text, _ = _vehicle_dates(rng, failure)
+    kind = rng.choice(VEHICLE_KINDS, size=n_claims, p=[0.15, 0.05, 0.45, 0.15, 0.20]).astype(object)
+    kind[rng.random(n_claims) < 0.03] = None
+
+    installation = pd.Series(failure - rng.integers(60, 1500, n_claims).astype("timedelta64[D]")).astype("datetime64[ns]")
+    installation[rng.random(n_claims) > 0.35] = pd.NaT
+    period = rng.choice([36.0, 60.0, np.nan], size=n_claims, p=[0.6, 0.3, 0.1])
+
+    burden_ratio = _claimed_burden_ratio(rng, ezkl, customer_pn, kind, mfd_text)
+    medians = np.array([entry[3] for entry in catalogue], dtype=float)[ezkl_codes]
+    parts_names = np.array([entry[1] for entry in catalogue], dtype=object)[ezkl_codes]
+
+    main = pd.DataFrame(
+        {
+            "Division": rng.choice(DIVISIONS, size=n_claims, p=[0.60, 0.25, 0.05, 0.10]),
+            "Reference No.": references,
+            "Parts Distinction": 1,
+            "Customer Parts No.": customer_pn,
+            "Bosch Parts No.": bosch_pn,
+            "Bosch Parts Name": parts_names,
+            "類別区分": kind,
+            "Domestic/Overseas": rng.choice(["1", "2"], size=n_claims, p=[0.85, 0.15]),
+            "Vehicle MFD": mfd_text,
+            "Vehicle Registration Date": registration,
+            "Vehicle Failure Date": failure.astype("datetime64[ns]"),
+            "Parts Warranty Installation Date": installation.to_numpy(),
+            "期間": period,
+            "Total Claimed Amount": _claim_amounts(rng, medians),
+            "Burden Ratio": burden_ratio,
+            "EDP Date": edp_date.astype("datetime64[ns]"),
+            "Download Date": np.datetime64(claim_month, "D") + rng.integers(0, 5, n_claims).astype("timedelta64[D]"),
+        },
+        columns=NEW_COLUMNS,
+    )
+
+    # Subpart rows: same claim, their own Customer P/N and (mostly matching) name
+    n_sub = rng.choice([0, 1, 2, 3], size=n_claims, p=[0.55, 0.25, 0.15, 0.05])
+    sub = main.iloc[np.repeat(np.arange(n_claims), n_sub)].reset_index(drop=True)
+    codes = rng.integers(0, len(SUBPARTS), len(sub))
+    sub_prefixes = np.array(list(SUBPARTS), dtype=object)[codes]
+    sub["Parts Distinction"] = 2
+    digits = rng.integers(0, 10, (2, len(sub)))
+    sub["Customer Parts No."] = [f"{p}{a}X{b}0A" for p, a, b in zip(sub_prefixes, *digits)]
+    names = np.array(list(SUBPARTS.values()), dtype=object)[codes]
+    wrong = rng.random(len(sub)) < 0.10
+    names[wrong] = rng.choice(["Bolt", "Harness", "Gasket", "Bracket"], size=wrong.sum())
+    sub["Bosch Parts Name"] = names
+    sub["Total Claimed Amount"] = np.round(sub["Total Claimed Amount"].to_numpy() * rng.uniform(0.02, 0.10, len(sub)))
+
+    new = pd.concat([main, sub], ignore_index=True)
+    return new.iloc[rng.permutation(len(new))].reset_index(drop=True)
+
+
+def _claimed_burden_ratio(rng, ezkl, customer_pn, kind, mfd_text) -> np.ndarray:
+    """
+    Burden ratio on the claim (percent): the contract value (HDEV5 by
+    part / hybrid / MFD like the BR Contract check), ~4% wrong.
+    """
+    n = len(ezkl)
+    ratio = np.array([NISSAN_CONTRACTS[e][1] if e in NISSAN_CONTRACTS else 50 for e in ezkl], dtype=object)
+
+    hdev5 = ezkl == "HDEV5"
+    h_part = np.isin(customer_pn, HDEV5_H_TYPE_PARTS)
+    hybrid = np.array([isinstance(k, str) and k.startswith("H") for k in kind])
+    mfd_year = np.array([int(t[:4]) if isinstance(t, str) else 2022 for t in mfd_text])
+    ratio[hdev5] = 5.5
+    ratio[hdev5 & h_part & hybrid] = np.where(mfd_year[hdev5 & h_part & hybrid] <= 2020, 2.9, 50)
+
+    ratio = ratio.astype(float)
+    wrong = rng.random(n) < 0.04
+    ratio[wrong] = rng.choice([10, 20, 30, 40, 50, 100], size=wrong.sum())
+    return ratio
+
+
+def _burden_table() -> pd.DataFrame:
+    """Burden-ratio contract table (all customers; Nissan rows as in NISSAN_CONTRACTS)."""
+    rows = []
+    for ezkl, (standard, current, since) in NISSAN_CONTRACTS.items():
+        rows.append(("NISSAN", EZKL_CATALOGUE[ezkl][2][0], ezkl, standard, current, since))
+    # Rows the 4.3 filters drop: LS at 1.5%, HDEV5 without the split ratio
+    rows += [("NISSAN", "226A05CA0A", "LS", 1.5, 1.5, "2020-01-01"), ("NISSAN", "166001VA0A", "HDEV5", 5.5, 5.5, "2020-01-01")]
+    for maker in ["TOYOTA", "HONDA", "MAZDA"]:
+        rows += [(maker, "-", ezkl, 50, 50, "2021-01-01") for ezkl in ("HDEV5", "LS", "EKPT")]
+
+    burden = pd.DataFrame(
+        {
+            "No.": np.arange(1, len(rows) + 1),
+            "メーカー": [r[0] for r in rows],
+            "代表品番": [r[1] for r in rows],
+            "製品名\n（EZKL名称）": [r[2] for r in rows],
+            "製品コード\n(EZKL)": [f"EZ{i:04d}" for i in range(len(rows))],
+            "基準負担率\nBosch": [r[3] for r in rows],
+            "現状負担率\nBosch": [r[4] for r in rows],
+            "適用開始日": pd.to_datetime([r[5] for r in rows]),
+            "変更後負担率有効期限": pd.NaT,
+            "備考1": None,
+            "備考2": None,
+            "最終更新日/確認日": pd.Timestamp("2025-04-01"),
+            "負担率決定合意書保存先リンク": None,
+            "Unnamed: 13": None,
+        },
+        columns=BURDEN_COLUMNS,
+    )
+    return burden
+
+
+def _objection_table(rng, ps_data: pd.DataFrame, claim_month, share: float) -> pd.DataFrame:
+    """Objection status list: a share of the Nissan PS claims older than two months."""
+    nissan = ps_data[
+        (ps_data["OEM Name"] == "日産")
+        & (ps_data["SAP Date"] < np.datetime64(claim_month - 2, "D"))
+    ]
+    objected = nissan[rng.random(len(nissan)) < share]
+    ezkl = objected["EZKL Name"].to_numpy(dtype=object)
+    reject_share = np.array([EZKL_CATALOGUE[e][5] if e in EZKL_CATALOGUE else 0.5 for e in ezkl])
+    draw = rng.random(len(objected))
+    status = np.where(draw < 0.05, "申請中", np.where(draw < 0.05 + 0.95 * reject_share, "却下", "受理"))
+
+    amount = objected["Total Claimed Amount"].to_numpy()
+    returned = np.where(status == "受理", np.round(amount * rng.uniform(0.3, 1.0, len(amount))), 0)
+    return pd.DataFrame(
+        {
+            "Reference No.": objected["Reference No."].to_numpy(),
+            "Application Date": (objected["SAP Date"] + pd.Timedelta(days=30)).to_numpy(),
+            "Total Claimed Amount": amount,
+            "Status": status.astype(object),
+            "Return Amount": returned,
+            "Return Amount1": returned,
+        },
+        columns=OBJECTION_COLUMNS,
+    ).reset_index(drop=True)
+
+
+def generate_nissan_sheets(
+    claim_date,
+    n_ps_rows: int = 300_000,
+    n_new_claims: int = 3_000,
+    nissan_share: float = 0.4,
+    objection_share: float = 0.08,
+    history_start="2020-07-01",
+    random_state: int = 42,
+) -> dict:
+    """
+    Raw sheets of the section 4 workbooks, keyed like the manifest specs
+    (ps_data = the whole PS_Data sheet, all OEMs).
+    - n_ps_rows: PS_Data rows (all OEMs, nissan_share of them Nissan)
+    - n_new_claims: claims in the monthly file (plus their subpart rows)
+    - history_start: first SAP month (before PS_HISTORY_START, so the
+      history filter has rows to drop)
+    """
+    rng = np.random.default_rng(random_state)
+    claim_month = np.datetime64(pd.Timestamp(claim_date), "M")
+    start_month = np.datetime64(pd.Timestamp(history_start), "M")
+
+    ps_data = _ps_data(rng, n_ps_rows, claim_month, start_month, nissan_share)
+    new = _new_data(rng, n_new_claims, claim_month)
+    obj = _objection_table(rng, ps_data, claim_month, objection_share)
+
+    return {
+        "ps_data": ps_data,
+        "ps_translation": _translation(PS_DATA_COLUMNS, "PS_Data Columns"),
+        "new": new,
+        "new_translation": _translation(NEW_COLUMNS, "Nissan Columns"),
+        "burden": _burden_table(),
+        "obj": obj,
+        "obj_translation": _translation(OBJECTION_COLUMNS, "Nissan Columns"),
+    }
+
+
+# ============================================================
+# STAGE 4.0 INPUTS / WORKBOOKS
+# ============================================================
+
+def manifest_inputs(sheets: dict, manifest: list[dict]) -> dict:
+    """
+    Frames by spec name, as load_excel_manifest returns them for manifest
+    (drop_columns, columns and filters applied), from generated sheets.
+    """
+    inputs = {}
+    for spec in manifest:
+        df = sheets[SPEC_SHEETS.get(spec["name"], spec["name"])]
+        df = df.drop(columns=spec.get("drop_columns") or [], errors="ignore")
+        inputs[spec["name"]] = apply_selection(df, spec.get("columns"), spec.get("filters")).copy()
+    return inputs
+
+
+def _write_sheet(workbook: Workbook, title: str, df: pd.DataFrame, header: int) -> None:
+    """One sheet, header on row `header` (0-based) like read_excel(header=...)."""
+    sheet = workbook.create_sheet(title)
+    for _ in range(header):
+        sheet.append([])
+    sheet.append(list(df.columns))
+    values = df.astype(object).where(df.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        sheet.append(row)
+
+
+def write_nissan_workbooks(sheets: dict, manifest: list[dict], out_dir) -> list[dict]:
+    """
+    Write the sheets as one local workbook per manifest workbook (same
+    file name, .xlsx; same sheet names and header rows). Returns the
+    manifest with every path pointing at the written files.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = {}
+    by_path = {}
+    for spec in manifest:
+        by_path.setdefault(spec["path"], []).append(spec)
+    for source, specs in by_path.items():
+        target = out_dir / (Path(re.split(r"[\\/]", str(source))[-1]).stem + ".xlsx")
+        workbook = Workbook(write_only=True)
+        written = set()
+        for spec in specs:
+            sheet_name = spec.get("sheet_name", 0)
+            title = sheet_name if isinstance(sheet_name, str) else f"Sheet{sheet_name + 1}"
+            if title not in written:
+                _write_sheet(workbook, title, sheets[SPEC_SHEETS.get(spec["name"], spec["name"])], spec.get("header", 0))
+                written.add(title)
+        tmp = target.with_name(target.name + ".tmp")
+        workbook.save(tmp)
+        tmp.replace(target)
+        paths[source] = str(target)
+
+    return [{**spec, "path": paths[spec["path"]]} for spec in manifest]
+
+
+def write_results_template(path, columns=TEMPLATE_COLUMNS) -> Path:
+    """Empty Power BI template workbook (header only) for align_to_template."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(columns=list(columns)).to_excel(path, index=False)
+    return path
@@ -0,0 +1,99 @@
+"""
+Part-number prefix → part group lookup.
+
+The prefix table is indexed once into dicts bucketed by prefix length;
+a whole column is then grouped with one slice + dict map per prefix
+length (longest first), instead of a sorted scan of every prefix per row.
+"""
+
+import numpy as np
+import pandas as pd
+
+UNKNOWN_GROUP = "Unknown"
+
+
+# ============================================================
+# ROW-WISE REFERENCE
+# ============================================================
+
+def assign_group_reference(part_number: str, patterns: dict) -> str:
+    """
+    Original assign_group: longest matching prefix of `patterns` wins.
+    """
+    if not isinstance(part_number, str):
+        part_number = str(part_number)
+
+    for prefix in sorted(patterns, key=len, reverse=True):
+        if part_number.startswith(prefix):
+            return patterns[prefix]
+    return UNKNOWN_GROUP
+
+
+# ============================================================
+# PREFIX INDEX
+# ============================================================
+
+def build_prefix_index(patterns, verbose: bool = True) -> dict:
+    """
+    Index (prefix, group) pairs as {prefix length: {prefix: group}},
+    longest length first.
+    - patterns: list of (prefix, group) pairs (or a dict)
+    - a prefix listed more than once keeps its last group (dict-literal
+      behaviour) and is reported; conflicting groups are flagged
+    """
+    pairs = list(patterns.items()) if isinstance(patterns, dict) else list(patterns)
+
+    if verbose:
+        for prefix, groups in prefix_duplicates(pairs).items():
+            kind = "conflicting groups" if len(set(groups)) > 1 else "repeated"
+            print(f"[part groups] WARNING: prefix {prefix!r} listed {len(groups)}x ({kind}: "
+                  f"{groups}); using {groups[-1]!r}")
+
+    buckets = {}
+    for prefix, group in pairs:
+        buckets.setdefault(len(str(prefix)), {})[str(prefix)] = group
+    return {length: buckets[length] for length in sorted(buckets, reverse=True)}
+
+
+def prefix_duplicates(patterns) -> dict:
+    """{prefix: [groups in listing order]} for prefixes listed more than once."""
+    seen = {}
+    for prefix, group in patterns:
+        seen.setdefault(str(prefix), []).append(group)
+    return {prefix: groups for prefix, groups in seen.items() if len(groups) > 1}
+
+
+def assign_group(part_number, index: dict) -> str:
+    """Scalar lookup against a prebuilt prefix index."""
+    if not isinstance(part_number, str):
+        part_number = str(part_number)
+    for length, bucket in index.items():
+        group = bucket.get(part_number[:length])
+        if group is not None:
+            return group
+    return UNKNOWN_GROUP
+
+
+def assign_groups(part_numbers: pd.Series, index: dict) -> pd.Series:
+    """
+    Columnar assign_group → object Series of groups (same index).
+    Non-string values are matched on str(value), like the scalar version.
+    """
+    values = part_numbers.astype(object)
+    not_str = ~values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    if not_str.any():
+        values = values.copy()
+        values[not_str] = values[not_str].map(str)
+    values = values.astype(str)
+
+    out = np.full(len(values), UNKNOWN_GROUP, dtype=object)
+    open_rows = np.ones(len(values), dtype=bool)
+    for length, bucket in index.items():
+        if not open_rows.any():
+            break
+        matched = values[open_rows].str[:length].map(bucket)
+        hit = matched.notna().to_numpy()
+        rows = np.flatnonzero(open_rows)[hit]
+        out[rows] = matched.to_numpy(dtype=object)[hit]
+        open_rows[rows] = False
+    return pd.Series(out, index=part_numbers.index, dtype=object)
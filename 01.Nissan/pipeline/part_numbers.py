@@ -0,0 +1,135 @@
+"""
+Bosch / Nissan part-number normalization (PS database and new claims).
+
+The columnar versions work on the distinct values of a column: each
+distinct raw value is converted to text once (str(), like the scalar
+versions), the text is normalized with vectorized string methods, and the
+result is broadcast back. An optional memo dict (raw value → normalized)
+carries results across calls, so part numbers repeated across runs /
+frames are not normalized again.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Trailing '.0' left by Excel floats (one occurrence, at the very end)
+_FLOAT_ARTIFACT = re.compile(r"\.0\Z")
+_NON_ALNUM = re.compile(r"[^0-9A-Za-z]")
+
+
+# ============================================================
+# ROW-WISE REFERENCE FUNCTIONS
+# ============================================================
+
+def normalize_bosch_part_no(pn):
+    """
+    Normalize Bosch part numbers:
+    - Convert to string
+    - Strip spaces
+    - Remove trailing '.0' from Excel float artifacts.
+    """
+    if pd.isna(pn):
+        return None
+    s = str(pn).strip()
+    if s.endswith(".0"):
+        s = s[:-2]
+    return s.replace(" ", "")
+
+
+def normalize_nissan_bosch_pn(pn):
+    """
+    Normalize Nissan/Bosch part numbers:
+    - Remove spaces, hyphens, dots and non-alphanumerics
+    - Keep only leading 8–12 chars (drop suffixes like KB, T00, etc.).
+    """
+    if pd.isna(pn):
+        return None
+
+    s = str(pn).replace(" ", "").replace("-", "").replace(".", "")
+    s = re.sub(r"[^0-9A-Za-z]", "", s)
+
+    match = re.match(r"([0-9A-Za-z]{8,12})", s)
+    if match:
+        return match.group(1)
+    return s
+
+
+# ============================================================
+# COLUMNAR VERSIONS
+# ============================================================
+
+def _bosch_text(text: pd.Series) -> pd.Series:
+    text = text.str.strip().str.replace(_FLOAT_ARTIFACT, "", regex=True)
+    return text.str.replace(" ", "", regex=False)
+
+
+def _nissan_text(text: pd.Series) -> pd.Series:
+    # Only ASCII alphanumerics remain, so the leading 8–12 char match is
+    # "first 12 chars when at least 8 long, else everything"
+    text = text.str.replace(_NON_ALNUM, "", regex=True)
+    return text.where(text.str.len() < 8, text.str[:12])
+
+
+def _exact_factorize(values: np.ndarray) -> tuple[np.ndarray, list]:
+    """
+    factorize that never merges values whose str() differs: Python / float64
+    floats by bit pattern (0.0 / -0.0), ints / bools / strings by value within
+    their type, anything else one value per row.
+    """
+    if pd.api.types.infer_dtype(values, skipna=False) in ("string", "empty"):
+        codes, uniques = pd.factorize(values)
+        return codes, list(uniques)
+
+    codes = np.empty(len(values), dtype=np.int64)
+    uniques = []
+    type_codes, kinds = pd.factorize(pd.Series(values, dtype=object).map(type))
+    for type_code, kind in enumerate(kinds):
+        rows = np.flatnonzero(type_codes == type_code)
+        group = values[rows]
+        if kind in (float, np.float64):
+            group_codes, bits = pd.factorize(group.astype(np.float64).view(np.int64))
+            group_uniques = list(np.asarray(bits).view(np.float64))
+        elif issubclass(kind, (str, int, np.integer)):
+            group_codes, group_uniques = pd.factorize(group)
+            group_uniques = list(group_uniques)
+        else:
+            group_codes, group_uniques = np.arange(len(group)), list(group)
+        codes[rows] = group_codes + len(uniques)
+        uniques.extend(group_uniques)
+    return codes, uniques
+
+
+def _normalize_column(s: pd.Series, normalize_text, memo: dict | None) -> pd.Series:
+    """
+    Normalize distinct values (memo first), broadcast back; missing → None.
+    The memo is keyed by str(value), the text both scalar versions start from.
+    """
+    memo = {} if memo is None else memo
+    missing = s.isna().to_numpy()
+    present = s.to_numpy(dtype=object)[~missing]
+
+    codes, uniques = _exact_factorize(present)
+    texts = [value if type(value) is str else str(value) for value in uniques]
+
+    todo = list(dict.fromkeys(text for text in texts if text not in memo))
+    if todo:
+        memo.update(zip(todo, normalize_text(pd.Series(todo, dtype=object)).tolist()))
+
+    results = [memo[text] for text in texts]
+    out = np.full(len(s), None, dtype=object)
+    out[~missing] = np.array(results, dtype=object)[codes]
+    # Same dtype inference as .apply(), done on the distinct results only
+    dtype = pd.Series(results + [None] * bool(missing.any())).dtype if len(s) else s.dtype
+    return pd.Series(out, index=s.index, dtype=dtype)
+
+
+def normalize_bosch_part_no_column(s: pd.Series, memo: dict | None = None) -> pd.Series:
+    """Columnar normalize_bosch_part_no (same index; missing → None)."""
+    return _normalize_column(s, _bosch_text, memo)
+
+
+def normalize_nissan_bosch_pn_column(s: pd.Series, memo: dict | None = None) -> pd.Series:
+    """Columnar normalize_nissan_bosch_pn (same index; missing → None)."""
+    return _normalize_column(s, _nissan_text, memo)
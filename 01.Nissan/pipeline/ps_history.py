@@ -0,0 +1,491 @@
+"""
+Nissan warranty judge — incremental PS history (sections 4.1 / 5 / 6.1).
+
+The cleaned PS Nissan history is kept as one processed partition per SAP
+month (Parquet snapshot + JSON manifest, see pipeline.excel_cache).
+Every cleaning step of these sections only combines rows of the same
+Objection ID (Reference No.[:8]): Reference No. dedupe, status merge,
+conflicting-status resolution. A run therefore only re-cleans the
+Objection IDs whose input rows changed and rewrites the months they
+touch; all other partitions are reused as they are.
+
+Each partition manifest also carries mergeable aggregates (counts, sums,
+mean / M2 moments). The statistics used downstream (TCA mean / std, DPR
+ratio table, EZKL mode lookup, registration → failure lag) are merged
+from these per-month summaries instead of rescanning the history.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pipeline.date_normalize import convert_to_date_column
+from pipeline.excel_cache import read_snapshot, write_snapshot
+from pipeline.nissan_prep import count_pairs, mode_lookup_from_counts, resolve_duplicates
+
+STORE_VERSION = 1
+
+# Columns of the burden / objection tables merged into the PS history
+BURDEN_MERGE_COLUMNS = ["EZKL Name", "Standard Burden Ratio", "Current Burden Ratio", "New BR Date"]
+OBJECTION_MERGE_COLUMNS = ["Objection ID", "Total Claimed Amount", "Status"]
+
+# Objection result → claim status (7.3)
+CLAIM_STATUS_BY_OBJECTION = {"Accepted": "Denied Claim", "Rejected": "Denied Paid Claim"}
+
+# Group key used for missing Objection IDs (NaN rows are merged / deduped together)
+_NA_KEY = "\x00NA"
+
+_STATE_FILE = "_state.json"
+_GROUPS_FILE = "_groups.parquet"
+_GROUP_MONTHS_FILE = "_group_months.parquet"
+
+
+# ============================================================
+# CLEANING (4.1 / 5 / 6.1)
+# ============================================================
+
+def clean_ps_history(
+    df_ps_nissan: pd.DataFrame,
+    df_burden_nissan: pd.DataFrame,
+    df_obj_nissan: pd.DataFrame,
+    claim_date_ts: pd.Timestamp,
+    history_start: pd.Timestamp,
+    replacements: dict,
+    excluded_parts_names: list,
+    drop_columns: list,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Clean (a subset of Objection IDs of) the raw PS Nissan rows.
+    Returns (end of 4.1 — used for the EZKL lookup, end of 6.1).
+
+    - df_burden_nissan: burden table *before* the Control Unit row is added
+    - df_obj_nissan: objection status table (4.4)
+    """
+    # --- 4.1 ---
+    df_ps_nissan = df_ps_nissan.copy()
+
+    # Ensure SAP Date is datetime before any filtering
+    df_ps_nissan["SAP Date"] = pd.to_datetime(df_ps_nissan["SAP Date"], errors="coerce")
+
+    # Filter for Nissan-related data (normally already pushed down at load time)
+    df_ps_nissan = df_ps_nissan[df_ps_nissan["OEM Name"] == "日産"]
+    df_ps_nissan = df_ps_nissan[df_ps_nissan["Key No."] != "M"]
+    df_ps_nissan = df_ps_nissan[df_ps_nissan["SAP Date"] >= history_start]
+
+    df_ps_nissan["Objection ID"] = df_ps_nissan["Reference No."].str[:8]
+    df_ps_nissan["Bosch Parts No. Prefix"] = df_ps_nissan["Bosch Parts No."].str[:10]
+
+    # Exclude irrelevant cases
+    df_ps_nissan = df_ps_nissan[~df_ps_nissan["Bosch Parts Name"].isin(excluded_parts_names)]
+    df_ps_nissan = df_ps_nissan[~df_ps_nissan["EZKL Name"].str.contains(r"\(S\)")]
+
+    # Replace EZKL Names based on replacement dictionary
+    df_ps_nissan["EZKL Name"] = df_ps_nissan["EZKL Name"].replace(replacements)
+
+    # Drop unnecessary columns (normally already skipped at load time)
+    df_ps_nissan = df_ps_nissan.drop(columns=drop_columns, errors="ignore")
+
+    # Drop duplicate Reference No., keeping most recent SAP Date
+    df_sorted = df_ps_nissan.sort_values(by=["Reference No.", "SAP Date"], ascending=[True, False])
+    df_ps_nissan = df_sorted.drop_duplicates(subset="Reference No.", keep="first")
+
+    # Filter to exclude the current claim month from PS database
+    df_ps_nissan["SAP Date"] = pd.to_datetime(df_ps_nissan["SAP Date"], errors="coerce")
+    df_ps_nissan = df_ps_nissan.loc[df_ps_nissan["SAP Date"] < claim_date_ts]
+
+    # Convert installation date to datetime
+    df_ps_nissan["Parts Warranty Installation Date"] = convert_to_date_column(
+        df_ps_nissan["Parts Warranty Installation Date"]
+    )
+    df_stage_4 = df_ps_nissan
+    df_ps_nissan = df_ps_nissan.copy()
+
+    # --- 5. Control unit normalization + merges ---
+    name_col = df_ps_nissan["Bosch Parts Name"].fillna("").str.lower()
+    if "EZKL Name" not in df_ps_nissan.columns:
+        df_ps_nissan["EZKL Name"] = None
+    df_ps_nissan.loc[name_col.str.contains("control unit"), "EZKL Name"] = "Control Unit"
+
+    df_ps_nissan = df_ps_nissan.merge(df_burden_nissan[BURDEN_MERGE_COLUMNS], on="EZKL Name", how="left")
+    df_ps_nissan = df_ps_nissan.merge(
+        df_obj_nissan[OBJECTION_MERGE_COLUMNS],
+        on=["Objection ID", "Total Claimed Amount"],
+        how="left",
+    )
+
+    # --- 6.1 Merging duplicates issue ---
+    df_ps_nissan = resolve_duplicates(df_ps_nissan)
+
+    return df_stage_4, df_ps_nissan
+
+
+# ============================================================
+# MERGEABLE AGGREGATES
+# ============================================================
+
+def _moments(s: pd.Series) -> list:
+    """[n, mean, M2] of the non-missing values (M2 = sum of squared deviations)."""
+    values = pd.to_numeric(s, errors="coerce").dropna().to_numpy(dtype=float)
+    if len(values) == 0:
+        return [0, 0.0, 0.0]
+    mean = float(values.mean())
+    return [len(values), mean, float(((values - mean) ** 2).sum())]
+
+
+def _merge_moments(a: list, b: list) -> list:
+    """Combine two [n, mean, M2] summaries (Chan et al. parallel variance)."""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return [0, 0.0, 0.0]
+    delta = mean_b - mean_a
+    return [n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n]
+
+
+def _mean_std(moments: list) -> tuple[float, float]:
+    """(mean, sample std with ddof=1) like Series.mean() / Series.std()."""
+    n, mean, m2 = moments
+    if n == 0:
+        return np.nan, np.nan
+    return mean, (float(np.sqrt(m2 / (n - 1))) if n > 1 else np.nan)
+
+
+def _datetime_total(s: pd.Series) -> list:
+    """[n, sum of ns since epoch] as exact Python ints (no int64 overflow)."""
+    ns = s.dropna().astype("datetime64[ns]").astype("int64").to_numpy()
+    seconds, remainder = np.divmod(ns, 10**9)
+    return [len(ns), int(seconds.sum()) * 10**9 + int(remainder.sum())]
+
+
+def _datetime_mean(total: list):
+    n, total_ns = total
+    return pd.Timestamp(round(total_ns / n)) if n else pd.NaT
+
+
+def summarize_month(df_stage_4: pd.DataFrame, df_final: pd.DataFrame) -> dict:
+    """Mergeable aggregates of one month of cleaned PS history."""
+    tca = df_final["Total Claimed Amount"]
+    location = df_final["Domestic/Overseas"]
+
+    claim_status = df_final["Status"].replace(CLAIM_STATUS_BY_OBJECTION).fillna("Paid Claim")
+    status = (
+        pd.crosstab(df_final["EZKL Name"], claim_status)
+        .reindex(columns=["Denied Paid Claim", "Denied Claim"], fill_value=0)
+    )
+    ezkl_counts = count_pairs(df_stage_4, "Bosch Parts No. Prefix", "EZKL Name")
+
+    return {
+        "tca": {
+            "all": _moments(tca),
+            "dom": _moments(tca[location == "1"]),
+            "over": _moments(tca[location == "2"]),
+        },
+        "failure_date": _datetime_total(df_final["Vehicle Failure Date"]),
+        "registration_date": _datetime_total(df_final["Vehicle Registration Date"]),
+        "status_counts": [[str(k), int(dp), int(d)] for k, (dp, d) in zip(status.index, status.to_numpy())],
+        "ezkl_counts": [[str(p), str(e), int(c)] for p, e, c in ezkl_counts.itertuples(index=False)],
+    }
+
+
+def _ratio_frame(status_counts: pd.DataFrame) -> pd.DataFrame:
+    """ratio_df of 7.3 from summed per-EZKL status counts."""
+    denied_paid_counts = status_counts.loc[
+        status_counts["Denied Paid Count"] > 0, ["EZKL Name", "Denied Paid Count"]
+    ].reset_index(drop=True)
+    denied_counts = status_counts.loc[
+        status_counts["Denied Count"] > 0, ["EZKL Name", "Denied Count"]
+    ].reset_index(drop=True)
+
+    ratio_df = pd.merge(denied_paid_counts, denied_counts, on="EZKL Name", how="outer").fillna(0)
+    ratio_df["Denied Paid Ratio"] = np.where(
+        (ratio_df["Denied Count"] == 0) & (ratio_df["Denied Paid Count"] == 0),
+        0,
+        ratio_df["Denied Paid Count"] / (ratio_df["Denied Count"] + ratio_df["Denied Paid Count"]),
+    )
+    return ratio_df
+
+
+# ============================================================
+# PARTITIONED STORE
+# ============================================================
+
+def _group_keys(objection_ids: pd.Series) -> np.ndarray:
+    return objection_ids.astype(object).where(objection_ids.notna(), _NA_KEY).astype(str).to_numpy()
+
+
+def _sap_month(sap_dates: pd.Series) -> np.ndarray:
+    return pd.to_datetime(sap_dates, errors="coerce").dt.strftime("%Y-%m").to_numpy(dtype=object)
+
+
+def _summed_hashes(df: pd.DataFrame, keys: np.ndarray, name: str) -> pd.Series:
+    """Order-independent fingerprint per key (sum of row hashes, mod 2**64)."""
+    if df.empty:
+        return pd.Series(dtype="uint64", name=name)
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return pd.Series(hashes).groupby(keys, sort=False).sum().rename(name)
+
+
+def _group_fingerprints(df_raw: pd.DataFrame, df_obj_nissan: pd.DataFrame, claim_date_ts) -> pd.DataFrame:
+    """
+    (raw_hash, obj_hash) per Objection ID: everything the cleaning of that
+    ID depends on, incl. which of its rows fall before the claim date.
+    """
+    raw = df_raw.assign(
+        _before_claim=(pd.to_datetime(df_raw["SAP Date"], errors="coerce") < claim_date_ts).to_numpy()
+    )
+    raw_hash = _summed_hashes(raw, _group_keys(df_raw["Reference No."].str[:8]), "raw_hash")
+    obj = df_obj_nissan[OBJECTION_MERGE_COLUMNS]
+    obj_hash = _summed_hashes(obj, _group_keys(obj["Objection ID"]), "obj_hash")
+
+    keys = raw_hash.index.union(obj_hash.index)
+    groups = pd.DataFrame(
+        {
+            "raw_hash": raw_hash.reindex(keys, fill_value=0),
+            "obj_hash": obj_hash.reindex(keys, fill_value=0),
+        },
+        index=pd.Index(keys, name="key"),
+    )
+    return groups.reset_index()
+
+
+def _context_fingerprint(df_burden_nissan: pd.DataFrame, **settings) -> str:
+    """Inputs shared by every Objection ID; any change forces a full rebuild."""
+    burden = df_burden_nissan[BURDEN_MERGE_COLUMNS]
+    payload = {
+        "version": STORE_VERSION,
+        "burden": int(pd.util.hash_pandas_object(burden, index=True).sum()),
+        "burden_columns": [str(dtype) for dtype in burden.dtypes],
+        **settings,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _partition_paths(store_dir: Path, month: str) -> dict[str, tuple[Path, Path]]:
+    """{"final" | "stage_4": (parquet path, manifest path)} of one month."""
+    return {
+        part: (store_dir / f"sap_month={month}.{part}.parquet", store_dir / f"sap_month={month}.{part}.json")
+        for part in ("final", "stage_4")
+    }
+
+
+def _read_part(paths: tuple[Path, Path]) -> pd.DataFrame | None:
+    parquet_path, manifest_path = paths
+    if not (parquet_path.exists() and manifest_path.exists()):
+        return None
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    return read_snapshot(parquet_path, manifest)
+
+
+def _stored_months(store_dir: Path) -> list[str]:
+    prefix, suffix = "sap_month=", ".final.json"
+    return sorted(p.name[len(prefix):-len(suffix)] for p in store_dir.glob(f"{prefix}*{suffix}"))
+
+
+def _remove_month(store_dir: Path, month: str) -> None:
+    for parquet_path, manifest_path in _partition_paths(store_dir, month).values():
+        for path in (manifest_path, parquet_path):
+            if path.exists():
+                path.unlink()
+
+
+def _write_month(store_dir: Path, month: str, df_stage_4: pd.DataFrame, df_final: pd.DataFrame) -> None:
+    paths = _partition_paths(store_dir, month)
+    summary = summarize_month(df_stage_4, df_final)
+    write_snapshot(df_stage_4.reset_index(drop=True), *paths["stage_4"], {"sap_month": month})
+    # The final manifest is written last: a month counts as stored once it exists
+    write_snapshot(df_final.reset_index(drop=True), *paths["final"], {"sap_month": month, "summary": summary})
+
+
+def _write_table(df: pd.DataFrame, path: Path) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def update_ps_history(
+    df_raw: pd.DataFrame,
+    df_burden_nissan: pd.DataFrame,
+    df_obj_nissan: pd.DataFrame,
+    claim_date_ts: pd.Timestamp,
+    store_dir,
+    history_start: pd.Timestamp,
+    replacements: dict,
+    excluded_parts_names: list,
+    drop_columns: list,
+    verbose: bool = True,
+) -> pd.DataFrame:
+    """
+    Bring the month-partitioned PS history in store_dir up to date with the
+    raw PS Nissan rows (translated, as loaded in 4.1).
+
+    - Objection IDs whose raw rows / objection status rows are unchanged
+      keep their cleaned rows; changed, new and removed IDs are re-cleaned
+      with clean_ps_history and only the months they touch are rewritten.
+    - A different burden table, REPLACEMENTS or other setting rebuilds all.
+    Returns one report row per rewritten month (rows before / after).
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    state_path = store_dir / _STATE_FILE
+    groups_path = store_dir / _GROUPS_FILE
+    months_path = store_dir / _GROUP_MONTHS_FILE
+
+    context = _context_fingerprint(
+        df_burden_nissan,
+        history_start=history_start,
+        replacements=replacements,
+        excluded_parts_names=excluded_parts_names,
+        drop_columns=drop_columns,
+        columns=list(map(str, df_raw.columns)),
+    )
+    groups = _group_fingerprints(df_raw, df_obj_nissan, claim_date_ts)
+
+    state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+    full_rebuild = state.get("context") != context or not (groups_path.exists() and months_path.exists())
+
+    if full_rebuild:
+        for month in _stored_months(store_dir):
+            _remove_month(store_dir, month)
+        changed = set(groups["key"])
+        group_months = pd.DataFrame({"key": pd.Series(dtype=object), "month": pd.Series(dtype=object)})
+    else:
+        previous = pd.read_parquet(groups_path).set_index("key")
+        current = groups.set_index("key")
+        common = current.index.intersection(previous.index)
+        differs = (current.loc[common] != previous.loc[common]).any(axis=1).to_numpy()
+        changed = set(current.index.symmetric_difference(previous.index)) | set(common[differs])
+        group_months = pd.read_parquet(months_path)
+
+    # Re-clean only the changed Objection IDs (raw row order is kept)
+    raw_keys = _group_keys(df_raw["Reference No."].str[:8])
+    df_stage_4, df_final = clean_ps_history(
+        df_raw[np.isin(raw_keys, list(changed))],
+        df_burden_nissan,
+        df_obj_nissan,
+        claim_date_ts,
+        history_start,
+        replacements,
+        excluded_parts_names,
+        drop_columns,
+    )
+    stage_4_months = _sap_month(df_stage_4["SAP Date"])
+    final_months = _sap_month(df_final["SAP Date"])
+
+    stale = group_months["key"].isin(changed)
+    dirty = sorted(set(group_months.loc[stale, "month"]) | set(stage_4_months) | set(final_months))
+
+    changed_keys = list(changed)
+    report = []
+    for month in dirty:
+        paths = _partition_paths(store_dir, month)
+        rows_before = rows_kept = 0
+        merged = {}
+        for part, new_rows in (
+            ("stage_4", df_stage_4[stage_4_months == month]),
+            ("final", df_final[final_months == month]),
+        ):
+            old_rows = _read_part(paths[part])
+            if old_rows is not None:
+                if part == "final":
+                    rows_before = len(old_rows)
+                old_rows = old_rows[~np.isin(_group_keys(old_rows["Objection ID"]), changed_keys)]
+                if part == "final":
+                    rows_kept = len(old_rows)
+            frames = [f for f in (old_rows, new_rows) if f is not None and not f.empty]
+            merged[part] = pd.concat(frames, ignore_index=True) if frames else new_rows.iloc[0:0]
+
+        if merged["stage_4"].empty and merged["final"].empty:
+            _remove_month(store_dir, month)
+            status = "removed"
+        else:
+            _write_month(store_dir, month, merged["stage_4"], merged["final"])
+            status = "rewritten" if rows_before else "added"
+        report.append(
+            {
+                "sap_month": month,
+                "status": status,
+                "rows_before": rows_before,
+                "rows_kept": rows_kept,
+                "rows_after": len(merged["final"]),
+            }
+        )
+
+    # Bookkeeping: fingerprints and months per Objection ID
+    new_group_months = pd.DataFrame(
+        {
+            "key": np.concatenate([_group_keys(df_stage_4["Objection ID"]), _group_keys(df_final["Objection ID"])]),
+            "month": np.concatenate([stage_4_months, final_months]),
+        }
+    ).drop_duplicates()
+    group_months = pd.concat([group_months[~stale], new_group_months], ignore_index=True)
+    _write_table(groups, groups_path)
+    _write_table(group_months, months_path)
+    state_path.write_text(json.dumps({"version": STORE_VERSION, "context": context}), encoding="utf-8")
+
+    report = pd.DataFrame(report, columns=["sap_month", "status", "rows_before", "rows_kept", "rows_after"])
+    if verbose:
+        n_months = len(_stored_months(store_dir))
+        print(
+            f"PS history: {len(changed)}/{len(groups)} Objection IDs re-cleaned, "
+            f"{len(report)}/{n_months} months rewritten{' (full rebuild)' if full_rebuild else ''}"
+        )
+    return report
+
+
+def read_ps_history(store_dir) -> pd.DataFrame:
+    """Cleaned PS Nissan history (end of 6.1), all months in SAP month order."""
+    store_dir = Path(store_dir)
+    frames = [_read_part(_partition_paths(store_dir, month)["final"]) for month in _stored_months(store_dir)]
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    # A month re-cleaned from a few Objection IDs can hold an all-missing
+    # object column (e.g. Status) where the other months hold text
+    return pd.concat(frames, ignore_index=True).infer_objects()
+
+
+def ps_history_aggregates(store_dir) -> dict:
+    """
+    Downstream statistics merged from the per-month summaries:
+    - mean_amount / std_amount (+ _dom / _over): Total Claimed Amount
+    - mean_reg_fal_time: mean failure date − mean registration date
+    - ratio_df: Denied Paid Ratio per EZKL Name (7.3)
+    - ezkl_by_prefix: most common EZKL Name per Bosch Parts No. Prefix (4.2)
+    Means / stds are merged from per-month moments and dates from exact
+    integer sums, so they can differ from a full-column pandas computation
+    by floating-point rounding only.
+    """
+    store_dir = Path(store_dir)
+    tca = {"all": [0, 0.0, 0.0], "dom": [0, 0.0, 0.0], "over": [0, 0.0, 0.0]}
+    failure, registration = [0, 0], [0, 0]
+    status_rows, ezkl_rows = [], []
+
+    for month in _stored_months(store_dir):
+        _, manifest_path = _partition_paths(store_dir, month)["final"]
+        summary = json.loads(manifest_path.read_text(encoding="utf-8"))["summary"]
+        for part in tca:
+            tca[part] = _merge_moments(tca[part], summary["tca"][part])
+        failure = [a + b for a, b in zip(failure, summary["failure_date"])]
+        registration = [a + b for a, b in zip(registration, summary["registration_date"])]
+        status_rows.extend(summary["status_counts"])
+        ezkl_rows.extend(summary["ezkl_counts"])
+
+    status_counts = (
+        pd.DataFrame(status_rows, columns=["EZKL Name", "Denied Paid Count", "Denied Count"])
+        .groupby("EZKL Name", as_index=False)
+        .sum()
+    )
+    ezkl_counts = pd.DataFrame(ezkl_rows, columns=["Bosch Parts No. Prefix", "EZKL Name", "_count"])
+
+    aggregates = {}
+    for part, suffix in (("all", ""), ("dom", "_dom"), ("over", "_over")):
+        aggregates[f"mean_amount{suffix}"], aggregates[f"std_amount{suffix}"] = _mean_std(tca[part])
+    aggregates["mean_reg_fal_time"] = _datetime_mean(failure) - _datetime_mean(registration)
+    aggregates["ratio_df"] = _ratio_frame(status_counts)
+    aggregates["ezkl_by_prefix"] = mode_lookup_from_counts(ezkl_counts, "Bosch Parts No. Prefix", "EZKL Name")
+    return aggregates
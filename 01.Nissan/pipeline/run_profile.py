@@ -0,0 +1,156 @@
+"""
+Run profile for the monthly pipeline: one record per timed stage.
+
+Records are plain dicts appended to a list owned by the caller, so the
+script can print or save them with the other run outputs.
+
+Per stage:
+- wall_s / cpu_s: elapsed and process CPU seconds (CPU includes stages
+  running at the same time and native worker threads)
+- rss_mb / rss_delta_mb: resident memory after the stage and its change
+- peak_rss_mb: process high-water mark so far (grows when a stage sets a
+  new peak)
+- py_peak_mb: peak Python / numpy allocations above the stage start, only
+  while tracemalloc is tracing (start_memory_tracing)
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:  # RSS from the resource module (POSIX) or not at all
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_COLUMNS = [
+    "stage", "source", "rows_in", "rows_out", "wall_s", "cpu_s",
+    "rss_mb", "rss_delta_mb", "peak_rss_mb", "py_peak_mb",
+]
+
+
+# ============================================================
+# MEMORY PROBES
+# ============================================================
+
+def _rss_mb() -> float | None:
+    """Current resident set size (MB); None without psutil."""
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def _peak_rss_mb() -> float | None:
+    """Process peak resident set size so far (MB)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kB on Linux, bytes on macOS
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+    if psutil is not None:
+        return getattr(psutil.Process().memory_info(), "peak_wset", 0) / 1e6 or None
+    return None
+
+
+def start_memory_tracing() -> None:
+    """Trace Python / numpy allocations (py_peak_mb); slows the run down."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+# ============================================================
+# PROFILE RECORDS
+# ============================================================
+
+@contextmanager
+def profile_stage(profile: list, stage: str, **info):
+    """
+    Profile the enclosed block and append {"stage", **info, timings, memory}
+    to profile. The yielded record can be updated inside the block
+    (e.g. rows_out).
+    """
+    record = {"stage": stage, **info}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        traced_start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    rss_start = _rss_mb()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_s"] = round(time.perf_counter() - wall_start, 3)
+        record["cpu_s"] = round(time.process_time() - cpu_start, 3)
+        rss_end = _rss_mb()
+        if rss_end is not None:
+            record["rss_mb"] = round(rss_end, 1)
+            record["rss_delta_mb"] = round(rss_end - rss_start, 1)
+        peak = _peak_rss_mb()
+        if peak is not None:
+            record["peak_rss_mb"] = round(peak, 1)
+        if tracing and tracemalloc.is_tracing():
+            record["py_peak_mb"] = round((tracemalloc.get_traced_memory()[1] - traced_start) / 1e6, 1)
+        profile.append(record)
+
+
+def profile_table(profile: list) -> pd.DataFrame:
+    """Run profile as a DataFrame (one row per stage, in execution order)."""
+    table = pd.DataFrame(profile)
+    known = [c for c in PROFILE_COLUMNS if c in table.columns]
+    return table[known + [c for c in table.columns if c not in known]]
+
+
+def profile_summary(profile: list) -> pd.DataFrame:
+    """
+    Summary printed at the end of a run: stages by wall time with their
+    share of the summed stage time, plus a TOTAL row (time sums, memory
+    maxima). Concurrent stages overlap, so TOTAL wall_s can exceed the
+    elapsed run time.
+    """
+    table = profile_table(profile)
+    if table.empty:
+        return table
+    table = table.sort_values("wall_s", ascending=False, kind="stable").reset_index(drop=True)
+    table["wall_pct"] = (100 * table["wall_s"] / table["wall_s"].sum()).round(1)
+
+    total = {"stage": "TOTAL"}
+    for column in ("wall_s", "cpu_s", "wall_pct"):
+        if column in table.columns:
+            total[column] = table[column].sum()
+    for column in ("rss_mb", "peak_rss_mb", "py_peak_mb"):
+        if column in table.columns:
+            total[column] = table[column].max()
+    summary = pd.concat([table, pd.DataFrame([total])], ignore_index=True)
+    for column in ("rows_in", "rows_out"):
+        if column in summary.columns:
+            summary[column] = summary[column].astype("Int64")
+    return summary
+
+
+def save_profile(profile: list, path, **run_info) -> Path:
+    """
+    Write the run log next to the results: one row per stage plus the
+    run_info columns (claim date, start time, ...) on every row.
+    - .parquet → Parquet; anything else → JSON (list of records)
+    """
+    path = Path(path)
+    table = profile_table(profile)
+    for key, value in run_info.items():
+        table[key] = value if not isinstance(value, pd.Timestamp) else value.isoformat()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".parquet":
+        table.to_parquet(path, index=False)
+    else:
+        records = json.loads(table.to_json(orient="records", date_format="iso"))
+        path.write_text(json.dumps(records, ensure_ascii=False, indent=1), encoding="utf-8")
+    return path
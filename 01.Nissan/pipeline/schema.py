@@ -0,0 +1,117 @@
+"""
+Compact dtypes for the text columns of the Nissan frames.
+
+Key columns that are merged / grouped / compared again and again become
+'category' (integer codes + one copy of each label); free-text columns
+become Arrow-backed strings. Values are never changed: a column only gets
+the string dtype when every present value already is a str, otherwise it
+is left alone and reported as kept. Likewise object columns mixing value
+types (1 / 1.0 / '1') are not made categorical, which would merge them.
+"""
+
+import numpy as np
+import pandas as pd
+
+# column → "category" | "string"
+NISSAN_SCHEMA = {
+    "EZKL Name": "category",
+    "Objection ID": "category",
+    "Domestic/Overseas": "category",
+    "Status": "category",
+    "類別区分": "category",
+    "Bosch Parts Name": "string",
+    "Customer Parts No.": "string",
+    "Reference No.": "string",
+}
+
+
+def string_dtype() -> pd.StringDtype:
+    """
+    Arrow-backed string dtype with NaN as missing value (pandas' 'str').
+    NaN (not pd.NA) keeps comparisons returning plain bool masks.
+    """
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except TypeError:  # pandas < 2.3
+        return pd.StringDtype("pyarrow_numpy")
+
+
+def _target_dtype(s: pd.Series, kind: str):
+    """dtype for one column, or None when the column has to stay as it is."""
+    if kind == "category":
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            return None
+        if s.dtype == object and pd.api.types.infer_dtype(s, skipna=True).startswith("mixed"):
+            return None
+        return "category"
+    if kind == "string":
+        target = string_dtype()
+        if s.dtype == target:
+            return None
+        if s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+            inferred = pd.api.types.infer_dtype(s, skipna=True)
+            return target if inferred in ("string", "empty") else None
+        return None
+    raise ValueError(f"Unknown schema kind {kind!r} (use 'category' or 'string')")
+
+
+def apply_schema(
+    df: pd.DataFrame,
+    schema: dict = NISSAN_SCHEMA,
+    columns: list | None = None,
+    name: str = "",
+    verbose: bool = True,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Cast the schema columns present in df; returns (df, memory report).
+    - columns: restrict to these schema columns (default: all)
+    - report: one row per column with dtype before / after and MB saved
+    """
+    df = df.copy(deep=False)
+    rows = []
+    for column, kind in schema.items():
+        if column not in df.columns or (columns is not None and column not in columns):
+            continue
+        before = df[column]
+        target = _target_dtype(before, kind)
+        if target is not None:
+            df[column] = before.astype(target)
+        rows.append(
+            {
+                "frame": name,
+                "column": column,
+                "before": str(before.dtype),
+                "after": str(df[column].dtype) if target is not None else f"{before.dtype} (kept)",
+                "before_mb": before.memory_usage(deep=True, index=False) / 1e6,
+                "after_mb": df[column].memory_usage(deep=True, index=False) / 1e6,
+            }
+        )
+
+    report = pd.DataFrame(rows, columns=["frame", "column", "before", "after", "before_mb", "after_mb"])
+    report["saved_mb"] = report["before_mb"] - report["after_mb"]
+    if verbose and not report.empty:
+        print(report.round(2).to_string(index=False))
+        print(f"Schema {name}: {report['saved_mb'].sum():.1f} MB saved")
+    return df, report
+
+
+def union_categories(frames: list[pd.DataFrame], column: str) -> list[pd.DataFrame]:
+    """
+    Give `column` the same categorical dtype (union of all labels) in every
+    frame, so merges / joins on it run on the integer codes.
+    """
+    labels = pd.Index([])
+    for df in frames:
+        values = df[column]
+        labels = labels.union(
+            values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else pd.Index(values.dropna().unique()),
+            sort=False,
+        )
+    dtype = pd.CategoricalDtype(labels)
+
+    out = []
+    for df in frames:
+        df = df.copy(deep=False)
+        df[column] = df[column].astype(dtype)
+        out.append(df)
+    return out
@@ -0,0 +1,342 @@
+"""
+Small dependency-tracked stage runner for the monthly pipeline.
+
+A stage is a plain dict:
+- name     unique stage name (e.g. "7.9 HDEV6 flags")
+- func     function called with the stage inputs, in order
+- inputs   names of the values it reads (default: func's parameter names)
+- outputs  names of the values it produces; func returns one value, or a
+           tuple in this order when there are several
+- cache    True (default) → outputs are pickled under cache_dir and reused
+           while the stage fingerprint is unchanged; False → always run
+           (stages reading external files or writing results)
+
+Fingerprints:
+- a cached stage: its name, the source of func, the values of the globals
+  func reads (config constants, compiled patterns, arrays, helper
+  functions — recursively for functions of tracked modules) and the
+  fingerprints of its inputs
+- an output of an uncached stage: a hash of its content
+
+So editing the code or a constant used by 7.9 reruns 7.9 and the stages
+downstream of it; everything upstream comes from the cache. Stages whose
+inputs are ready run concurrently in a thread pool.
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+import re
+import types
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+from pipeline.run_profile import profile_stage
+
+STAGE_CACHE_VERSION = 1
+
+# Functions from these modules are fingerprinted by source (recursively)
+TRACKED_MODULES = ("__main__", "pipeline")
+
+
+# ============================================================
+# FINGERPRINTS
+# ============================================================
+
+def _digest(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def value_fingerprint(value) -> str:
+    """Content hash of a stage value (DataFrame / Series / picklable object)."""
+    if isinstance(value, pd.DataFrame):
+        try:
+            rows = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        except TypeError:  # unhashable cells (lists, dicts)
+            return _digest("pickle", pickle.dumps(value, protocol=4))
+        return _digest("frame", list(map(str, value.columns)), list(map(str, value.dtypes)), rows.tobytes())
+    if isinstance(value, pd.Series):
+        return value_fingerprint(value.to_frame(name=str(value.name)))
+    if isinstance(value, dict):
+        return _digest("dict", *(f"{key!r}={value_fingerprint(item)}" for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return _digest(type(value).__name__, *(value_fingerprint(item) for item in value))
+    if isinstance(value, (set, frozenset)):
+        # Iteration order of str sets changes between processes (hash seed)
+        return _digest(type(value).__name__, *sorted(value_fingerprint(item) for item in value))
+    if isinstance(value, re.Pattern):
+        return _digest("pattern", value.pattern, value.flags)
+    if isinstance(value, types.FunctionType):
+        # By name: lambdas do not pickle and their repr holds an address
+        return _digest("function", value.__module__, value.__qualname__)
+    try:
+        return _digest("pickle", pickle.dumps(value, protocol=4))
+    except Exception:
+        return _digest("repr", repr(value))
+
+
+def _is_tracked(func) -> bool:
+    module = getattr(func, "__module__", None) or ""
+    return any(module == name or module.startswith(name + ".") for name in TRACKED_MODULES)
+
+
+def _global_names(code: types.CodeType) -> set:
+    """Names a code object (and its nested lambdas / comprehensions) may read."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def code_fingerprint(func, untracked=(), _seen: set | None = None) -> str:
+    """
+    Hash of a function's source plus the global values (constants, compiled
+    patterns, arrays, ...) and tracked helper functions it reads. Modules,
+    classes and untracked functions are left out. Unchanged code + config
+    → same fingerprint.
+    - untracked: global names never hashed (memo dicts, run logs)
+    """
+    seen = set() if _seen is None else _seen
+    if id(func) in seen:
+        return "recursive"
+    seen.add(id(func))
+
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        code = func.__code__
+        source = code.co_code + repr(code.co_consts).encode("utf-8")
+
+    parts = [source]
+    namespace = getattr(func, "__globals__", {})
+    for name in sorted(_global_names(func.__code__)):
+        if name not in namespace or name in untracked:
+            continue
+        value = namespace[name]
+        if isinstance(value, types.FunctionType) and _is_tracked(value):
+            parts.append(f"{name}:fn:{code_fingerprint(value, untracked, seen)}")
+        elif not (callable(value) or isinstance(value, types.ModuleType)):
+            parts.append(f"{name}:{value_fingerprint(value)}")
+    return _digest(*parts)
+
+
+# ============================================================
+# GRAPH
+# ============================================================
+
+def _normalize(stage: dict) -> dict:
+    stage = {"cache": True, **stage}
+    if "inputs" not in stage:
+        stage["inputs"] = list(inspect.signature(stage["func"]).parameters)
+    stage["inputs"] = list(stage["inputs"])
+    stage["outputs"] = list(stage["outputs"])
+    return stage
+
+
+def stage_order(stages: list[dict], provided=()) -> list[dict]:
+    """
+    Stages in dependency order (declaration order among ready stages).
+    Every input must be provided or produced by exactly one stage.
+    """
+    stages = [_normalize(stage) for stage in stages]
+    names = [stage["name"] for stage in stages]
+    duplicated = {n for n in names if names.count(n) > 1}
+    if duplicated:
+        raise ValueError(f"Duplicate stage names: {sorted(duplicated)}")
+
+    producer = {}
+    for stage in stages:
+        for output in stage["outputs"]:
+            if output in producer or output in provided:
+                raise ValueError(f"Value {output!r} is produced more than once ({stage['name']!r})")
+            producer[output] = stage["name"]
+
+    for stage in stages:
+        missing = [i for i in stage["inputs"] if i not in producer and i not in provided]
+        if missing:
+            raise ValueError(f"Stage {stage['name']!r}: no stage produces {missing}")
+
+    ordered, done = [], set(provided)
+    pending = list(stages)
+    while pending:
+        ready = [stage for stage in pending if all(i in done for i in stage["inputs"])]
+        if not ready:
+            raise ValueError(f"Cycle between stages {[stage['name'] for stage in pending]}")
+        for stage in ready:
+            ordered.append(stage)
+            done.update(stage["outputs"])
+            pending.remove(stage)
+    return ordered
+
+
+def _needed(stages: list[dict], targets) -> list[dict]:
+    """Stages needed to produce targets (all stages when targets is None)."""
+    if targets is None:
+        return stages
+    producer = {output: stage for stage in stages for output in stage["outputs"]}
+    wanted, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        stage = producer.get(name)
+        if stage is None or stage["name"] in wanted:
+            continue
+        wanted.add(stage["name"])
+        todo.extend(stage["inputs"])
+    return [stage for stage in stages if stage["name"] in wanted]
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+def _cache_path(cache_dir: Path, stage: dict, fingerprint: str) -> Path:
+    slug = "".join(ch if ch.isalnum() else "_" for ch in stage["name"]).strip("_")
+    return cache_dir / slug / f"{fingerprint[:32]}.pkl"
+
+
+def _read_cached(path: Path):
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as fh:
+            payload = pickle.load(fh)
+    except Exception:
+        return None
+    return payload if payload.get("version") == STAGE_CACHE_VERSION else None
+
+
+def _write_cached(path: Path, values: dict) -> None:
+    """Pickle the stage outputs (tmp file, then replace); older entries go."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        pickle.dump({"version": STAGE_CACHE_VERSION, "values": values}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    for old in path.parent.glob("*.pkl"):
+        if old != path:
+            old.unlink(missing_ok=True)
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+def _copy_on_write() -> bool:
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    return bool(pd.get_option("mode.copy_on_write"))
+
+
+def _isolated(value):
+    """Stage input protected from in-place changes by the stage."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=not _copy_on_write())
+    return value
+
+
+def _rows(value) -> int:
+    return len(value) if isinstance(value, (pd.DataFrame, pd.Series)) else 0
+
+
+def _call(stage: dict, values: dict) -> dict:
+    result = stage["func"](*(_isolated(values[name]) for name in stage["inputs"]))
+    outputs = stage["outputs"]
+    if len(outputs) == 1:
+        return {outputs[0]: result}
+    if not isinstance(result, tuple) or len(result) != len(outputs):
+        raise ValueError(f"Stage {stage['name']!r} must return a tuple of {len(outputs)} values {outputs}")
+    return dict(zip(outputs, result))
+
+
+def run_stages(
+    stages: list[dict],
+    values: dict | None = None,
+    cache_dir=None,
+    targets: list | None = None,
+    max_workers: int | None = None,
+    profile: list | None = None,
+    untracked=(),
+    verbose: bool = True,
+) -> tuple[dict, pd.DataFrame]:
+    """
+    Run the stage graph; returns (all values by name, stage report).
+    - values: values provided up front (fingerprinted by content)
+    - cache_dir: where cached stage outputs are kept (None → no caching)
+    - targets: only run the stages needed for these values
+    - profile: run_profile list; one record per executed / cached stage
+      (pipeline.run_profile: time, memory, input / output rows)
+    - untracked: globals left out of the code fingerprints (see code_fingerprint)
+    The report has one row per stage: source ('run' / 'cache'),
+    fingerprint, wall seconds and the outputs.
+    """
+    values = dict(values or {})
+    ordered = _needed(stage_order(stages, provided=values), targets)
+    cache_dir = Path(cache_dir) if cache_dir is not None else None
+    profile = [] if profile is None else profile
+
+    fingerprints = {name: value_fingerprint(value) for name, value in values.items()}
+    code_fingerprints = {stage["name"]: code_fingerprint(stage["func"], untracked) for stage in ordered}
+    report = {}
+
+    def execute(stage: dict) -> dict:
+        fingerprint = _digest(
+            stage["name"], code_fingerprints[stage["name"]], *(f"{i}={fingerprints[i]}" for i in stage["inputs"])
+        )
+        use_cache = stage["cache"] and cache_dir is not None
+        path = _cache_path(cache_dir, stage, fingerprint) if use_cache else None
+
+        rows_in = sum(_rows(values[i]) for i in stage["inputs"])
+        with profile_stage(profile, stage["name"], rows_in=rows_in) as record:
+            cached = _read_cached(path) if use_cache else None
+            if cached is not None:
+                outputs, source = cached["values"], "cache"
+            else:
+                outputs, source = _call(stage, values), "run"
+                if use_cache:
+                    _write_cached(path, outputs)
+            record["source"] = source
+            record["rows_out"] = sum(_rows(value) for value in outputs.values())
+
+        if stage["cache"]:
+            output_fingerprints = {name: _digest(fingerprint, name) for name in outputs}
+        else:
+            output_fingerprints = {name: value_fingerprint(value) for name, value in outputs.items()}
+        report[stage["name"]] = {
+            "stage": stage["name"],
+            "source": source,
+            "fingerprint": fingerprint[:12],
+            "wall_s": record["wall_s"],
+            "outputs": ", ".join(stage["outputs"]),
+        }
+        return outputs, output_fingerprints
+
+    pending = list(ordered)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            ready = [s for s in pending if all(i in values and i in fingerprints for i in s["inputs"])]
+            for stage in ready:
+                pending.remove(stage)
+                running[pool.submit(execute, stage)] = stage
+            if not running:
+                raise RuntimeError(f"Stages cannot run: {[s['name'] for s in pending]}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                outputs, output_fingerprints = future.result()
+                values.update(outputs)
+                fingerprints.update(output_fingerprints)
+
+    report = pd.DataFrame([report[stage["name"]] for stage in ordered])
+    if verbose:
+        print(report.to_string(index=False))
+        print(f"Stages: {(report['source'] == 'run').sum()} run, {(report['source'] == 'cache').sum()} from cache")
+    return values, report
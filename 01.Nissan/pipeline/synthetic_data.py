@@ -1,5 +1,56 @@
+"""
+Synthetic warranty claims (Claim_ID / Part_Group / Total_Cost schema).
+
+- generate_synthetic_warranty_data: original small in-memory generator
+- iter_synthetic_warranty_data / synthetic_warranty_rows: chunked,
+  vectorized generator for large stress-test datasets
+- write_synthetic_warranty_dataset: the chunked generator fanned out over
+  a process pool; each worker writes its shard straight into a Parquet
+  dataset partitioned by claim month (also a CLI, see main)
+
+The chunked generator draws row i from RNG block i // RNG_BLOCK_ROWS.
+Every block has its own child stream of SeedSequence(random_state)
+(SeedSequence.spawn keys), so the rows for a given (random_state, n_rows)
+are the same whatever the chunk size or the number of workers.
+"""
+
+import argparse
+import os
+import shutil
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Rows drawn from one child RNG stream
+RNG_BLOCK_ROWS = 1 << 16
+
+PART_GROUPS = ["Engine", "Brakes", "Electronics", "Body", "Chassis"]
+SUBPARTS = {
+    "Engine": ["ENG_A", "ENG_B", "ENG_C"],
+    "Brakes": ["BRK_A", "BRK_B"],
+    "Electronics": ["ELEC_A", "ELEC_B", "ELEC_C"],
+    "Body": ["BODY_A", "BODY_B"],
+    "Chassis": ["CHS_A", "CHS_B"],
+}
+FAILURE_MODES = ["Leak", "Noise", "No_Start", "Vibration", "Electrical_Issue"]
+
+# Subpart lookup table: row = part group, values = codes into SUBPART_CODES
+# (padded with -1 to the longest subpart list)
+SUBPART_CODES = [sp for pg in PART_GROUPS for sp in SUBPARTS[pg]]
+_SUBPART_COUNTS = np.array([len(SUBPARTS[pg]) for pg in PART_GROUPS])
+_SUBPART_TABLE = np.array(
+    [
+        [SUBPART_CODES.index(sp) for sp in SUBPARTS[pg]] + [-1] * (_SUBPART_COUNTS.max() - len(SUBPARTS[pg]))
+        for pg in PART_GROUPS
+    ]
+)
 
 
 def generate_synthetic_warranty_data(n_rows: int = 5000, random_state: int = 42) -> pd.DataFrame:
@@ -93,3 +144,224 @@ def save_synthetic_warranty_data(
 ) -> None:
     df = generate_synthetic_warranty_data(n_rows=n_rows, random_state=random_state)
     df.to_csv(output_path, index=False)
+
+
+# ============================================================
+# CHUNKED GENERATOR
+# ============================================================
+
+def claim_id_array(start: int, stop: int) -> pd.Series:
+    """Claim IDs CLM_000001 … for rows [start, stop), as an Arrow string column."""
+    numbers = pc.cast(pa.array(np.arange(start + 1, stop + 1, dtype=np.int64)), pa.string())
+    ids = pc.binary_join_element_wise("CLM_", pc.utf8_lpad(numbers, 6, "0"), "")
+    return pd.Series(pd.arrays.ArrowStringArray(ids), index=pd.RangeIndex(start, stop))
+
+
+def _block_rng(random_state: int, block: int) -> np.random.Generator:
+    """Child stream `block` of SeedSequence(random_state) (= .spawn(n)[block])."""
+    return np.random.default_rng(np.random.SeedSequence(random_state, spawn_key=(block,)))
+
+
+def _synthetic_block(block: int, n_rows: int, random_state: int) -> pd.DataFrame:
+    """
+    All rows of one RNG block: same distributions as
+    generate_synthetic_warranty_data, text columns as categoricals.
+    """
+    start = block * RNG_BLOCK_ROWS
+    stop = min(start + RNG_BLOCK_ROWS, n_rows)
+    size = stop - start
+    rng = _block_rng(random_state, block)
+
+    base_date = np.datetime64("2022-01-01")
+    claim_dates = base_date + rng.integers(0, 3 * 365, size=size)
+    vehicle_reg_dates = claim_dates - rng.integers(100, 3000, size=size)
+    vehicle_fail_dates = claim_dates - rng.integers(1, 60, size=size)
+    vehicle_mfd_year = vehicle_reg_dates.astype("datetime64[Y]").astype(int) + 1970
+
+    use_years = (claim_dates - vehicle_reg_dates).astype("timedelta64[D]").astype(float) / 365
+    mileage = np.clip(use_years * rng.normal(15000, 5000, size=size), 0, None)
+
+    # Part group, then a uniform subpart of that group from the lookup table
+    group_codes = rng.integers(0, len(PART_GROUPS), size=size)
+    subpart_codes = (rng.random(size) * _SUBPART_COUNTS[group_codes]).astype(np.int64)
+
+    failure_modes = rng.integers(0, len(FAILURE_MODES), size=size)
+    customer_type = (rng.random(size) >= 0.7).astype(np.int8)  # Retail 70% / Fleet 30%
+    region = rng.integers(0, 3, size=size)
+
+    labor_cost = rng.gamma(shape=2.0, scale=80.0, size=size)
+    material_cost = rng.gamma(shape=2.0, scale=120.0, size=size)
+    total_cost = labor_cost + material_cost
+    burden_ratio = rng.uniform(0.2, 1.0, size=size)
+
+    p_approve = np.clip(0.75 - 0.04 * use_years - 0.000002 * mileage - 0.15 * (total_cost > 1800), 0.05, 0.95)
+    final_decision = (rng.random(size) >= p_approve).astype(np.int8)  # Approve / Reject
+    p_dpr = np.clip(p_approve - 0.1, 0.05, 0.95)
+    dpr_decision = (rng.random(size) >= p_dpr).astype(np.int8)
+
+    # Text columns as categoricals built from the drawn codes (no per-row strings)
+    def labels(codes, categories):
+        return pd.Categorical.from_codes(codes, categories=categories)
+
+    index = pd.RangeIndex(start, stop)
+    return pd.DataFrame(
+        {
+            "Claim_ID": claim_id_array(start, stop),
+            "Claim_Date": claim_dates,
+            "Vehicle_Registration_Date": vehicle_reg_dates,
+            "Vehicle_Failure_Date": vehicle_fail_dates,
+            "Vehicle_MFD_Year": vehicle_mfd_year,
+            "Mileage_km": mileage,
+            "Part_Group": labels(group_codes, PART_GROUPS),
+            "Subpart_Code": labels(_SUBPART_TABLE[group_codes, subpart_codes], SUBPART_CODES),
+            "Failure_Mode": labels(failure_modes, FAILURE_MODES),
+            "Customer_Type": labels(customer_type, ["Retail", "Fleet"]),
+            "Region": labels(region, ["Region_1", "Region_2", "Region_3"]),
+            "Labor_Cost": labor_cost,
+            "Material_Cost": material_cost,
+            "Total_Cost": total_cost,
+            "Burden_Ratio": burden_ratio,
+            "Final_Claim_Decision": labels(final_decision, ["Approve", "Reject"]),
+            "Final_DPR_Decision": labels(dpr_decision, ["Approve", "Reject"]),
+        },
+        index=index,
+    )
+
+
+def synthetic_warranty_rows(start: int, stop: int, n_rows: int, random_state: int = 42) -> pd.DataFrame:
+    """
+    Rows [start, stop) of the n_rows-row synthetic dataset for random_state
+    (index = global row numbers). Shards of one dataset can be generated
+    independently, e.g. in separate processes.
+    """
+    stop = min(stop, n_rows)
+    if start >= stop:
+        return _synthetic_block(0, 0, random_state)
+    blocks = range(start // RNG_BLOCK_ROWS, (stop - 1) // RNG_BLOCK_ROWS + 1)
+    frames = [_synthetic_block(block, n_rows, random_state) for block in blocks]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames)
+    return df.loc[start:stop - 1]
+
+
+def iter_synthetic_warranty_data(
+    n_rows: int,
+    chunk_size: int = 1_000_000,
+    random_state: int = 42,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the n_rows-row synthetic dataset in chunks of chunk_size rows.
+    The concatenated chunks are the same for any chunk_size; each RNG block
+    is generated once.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    n_blocks = -(-n_rows // RNG_BLOCK_ROWS)
+    pending = []
+    for block in range(n_blocks):
+        pending.append(_synthetic_block(block, n_rows, random_state))
+        buffered = sum(len(df) for df in pending)
+        while buffered >= chunk_size or (block == n_blocks - 1 and buffered):
+            df = pd.concat(pending) if len(pending) > 1 else pending[0]
+            yield df.iloc[:chunk_size]
+            rest = df.iloc[chunk_size:]
+            pending = [rest] if len(rest) else []
+            buffered = len(rest)
+
+
+# ============================================================
+# PARALLEL PARQUET DATASET
+# ============================================================
+
+def _write_shard(output_dir: str, shard: int, start: int, stop: int, n_rows: int, random_state: int, chunk_size: int) -> dict:
+    """Worker: generate rows [start, stop) chunk by chunk, write them under output_dir."""
+    began = time.perf_counter()
+    for i, chunk_start in enumerate(range(start, stop, chunk_size)):
+        df = synthetic_warranty_rows(chunk_start, min(chunk_start + chunk_size, stop), n_rows, random_state)
+        # YYYY-MM labels of the few distinct months (strftime per row is slow)
+        months, distinct = pd.factorize(df["Claim_Date"].to_numpy().astype("datetime64[M]"))
+        df["Claim_Month"] = pd.Categorical.from_codes(months, np.datetime_as_string(distinct, unit="M"))
+        pq.write_to_dataset(
+            pa.Table.from_pandas(df, preserve_index=False),
+            output_dir,
+            partition_cols=["Claim_Month"],
+            basename_template=f"shard-{shard:05d}-{i:04d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+    seconds = time.perf_counter() - began
+    return {
+        "shard": shard,
+        "pid": os.getpid(),
+        "rows": stop - start,
+        "seconds": round(seconds, 3),
+        "rows_per_s": round((stop - start) / seconds) if seconds else None,
+    }
+
+
+def write_synthetic_warranty_dataset(
+    output_dir,
+    n_rows: int,
+    random_state: int = 42,
+    shard_rows: int = 5_000_000,
+    chunk_size: int = 1_000_000,
+    max_workers: int | None = None,
+    overwrite: bool = False,
+    verbose: bool = True,
+) -> pd.DataFrame:
+    """
+    Generate the n_rows-row synthetic dataset in shards of shard_rows on a
+    process pool; every worker writes its shard directly to output_dir as
+    Parquet partitioned by Claim_Month (Claim_Month=YYYY-MM/...). The rows
+    are the same as iter_synthetic_warranty_data for the seed, whatever
+    shard_rows / max_workers are.
+    Returns one report row per shard (worker pid, rows, seconds, rows/s).
+    """
+    output_dir = Path(output_dir)
+    if output_dir.exists() and any(output_dir.iterdir()):
+        if not overwrite:
+            raise FileExistsError(f"{output_dir} is not empty (pass overwrite=True to replace it)")
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    shards = [
+        (str(output_dir), shard, start, min(start + shard_rows, n_rows), n_rows, random_state, chunk_size)
+        for shard, start in enumerate(range(0, n_rows, shard_rows))
+    ]
+    began = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        rows = list(pool.map(_write_shard, *zip(*shards))) if shards else []
+    elapsed = time.perf_counter() - began
+
+    report = pd.DataFrame(rows, columns=["shard", "pid", "rows", "seconds", "rows_per_s"])
+    if verbose:
+        workers = report.groupby("pid").agg(shards=("shard", "size"), rows=("rows", "sum"), seconds=("seconds", "sum"))
+        workers["rows_per_s"] = (workers["rows"] / workers["seconds"]).round()
+        print(workers.to_string())
+        print(f"{n_rows} rows in {elapsed:.1f} s ({n_rows / elapsed:,.0f} rows/s) → {output_dir}")
+    return report
+
+
+def main(argv=None) -> None:
+    """CLI: python -m pipeline.synthetic_data OUTPUT_DIR --rows N [--workers W] ..."""
+    parser = argparse.ArgumentParser(description="Write a partitioned synthetic warranty Parquet dataset.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shard-rows", type=int, default=5_000_000)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args(argv)
+
+    write_synthetic_warranty_dataset(
+        args.output_dir,
+        n_rows=args.rows,
+        random_state=args.seed,
+        shard_rows=args.shard_rows,
+        chunk_size=args.chunk_size,
+        max_workers=args.workers,
+        overwrite=args.overwrite,
+    )
+
+
+if __name__ == "__main__":
+    main()
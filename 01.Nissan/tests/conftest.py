@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Make 01.Nissan/pipeline importable as `pipeline` (same as the notebooks)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
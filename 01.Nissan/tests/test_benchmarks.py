@@ -0,0 +1,74 @@
+"""Benchmark suite: records per case and scale, baseline comparison, optional baseline check."""
+
+import os
+
+import pandas as pd
+import pytest
+
+from pipeline.benchmarks import (
+    BENCHMARK_CASES,
+    DEFAULT_BASELINE,
+    compare_benchmarks,
+    load_benchmarks,
+    nissan_rule_rows,
+    run_benchmarks,
+    update_baseline,
+)
+from pipeline.nissan_rules import apply_subpart_filter
+from pipeline.nissan_synthetic import SUBPARTS
+from pipeline.part_groups import build_prefix_index
+
+
+def test_every_case_runs_at_a_small_scale(tmp_path):
+    results = run_benchmarks(scales=[500], repeats=1, work_dir=tmp_path, verbose=False)
+    assert [r["stage"] for r in results] == [case["name"] for case in BENCHMARK_CASES]
+    for record in results:
+        assert record["scale"] == "500"
+        assert record["wall_s"] >= 0
+        assert record["py_peak_mb"] >= 0
+
+    path = update_baseline(results, tmp_path / "baseline.json")
+    update_baseline(results[:2], path)
+    baseline = load_benchmarks(path)
+    assert len(baseline) == len(BENCHMARK_CASES)
+    assert {"python", "pandas", "numpy"} <= set(baseline.columns)
+
+
+def test_compare_flags_real_regressions_only():
+    baseline = pd.DataFrame(
+        [
+            {"stage": "clean_data", "scale": "1M", "wall_s": 1.0, "py_peak_mb": 100.0},
+            {"stage": "classify", "scale": "1M", "wall_s": 0.002, "py_peak_mb": 0.5},
+        ]
+    )
+    results = [
+        {"stage": "clean_data", "scale": "1M", "wall_s": 1.5, "py_peak_mb": 110.0},
+        # 3x slower but only by 4 ms
+        {"stage": "classify", "scale": "1M", "wall_s": 0.006, "py_peak_mb": 0.5},
+        {"stage": "new_case", "scale": "1M", "wall_s": 9.0, "py_peak_mb": 1.0},
+    ]
+    comparison = compare_benchmarks(results, baseline, threshold=0.25)
+    flagged = comparison[comparison["regression"]]
+    assert list(zip(flagged["stage"], flagged["metric"])) == [("clean_data", "wall_s")]
+    assert "new_case" not in set(comparison["stage"])
+
+
+def test_subpart_filter_on_generated_rows():
+    rows = nissan_rule_rows(2_000)
+    out = apply_subpart_filter(rows, build_prefix_index(list(SUBPARTS.items()), verbose=False))
+    assert set(out["Subpart"].dropna()) <= {"OK", "To object?"}
+    bad_refs = out.loc[out["Subpart"] == "To object?", "Reference No."]
+    main_parts = out[(out["Parts Distinction"] == 1) & out["Reference No."].isin(bad_refs)]
+    assert main_parts["Subpart"].eq("To object?").all()
+
+
+@pytest.mark.skipif(
+    not os.environ.get("WARRANTY_BENCHMARK_SCALES"),
+    reason="set WARRANTY_BENCHMARK_SCALES (e.g. '10k 1M') to check against the stored baseline",
+)
+def test_no_regression_against_baseline():
+    scales = os.environ["WARRANTY_BENCHMARK_SCALES"].split()
+    results = run_benchmarks(scales=scales, repeats=3, verbose=False)
+    comparison = compare_benchmarks(results, load_benchmarks(DEFAULT_BASELINE))
+    regressions = comparison[comparison["regression"]]
+    assert regressions.empty, regressions.to_string(index=False)
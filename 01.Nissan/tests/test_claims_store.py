@@ -0,0 +1,90 @@
+"""Claims store: same Power BI view as the old read-modify-write, month-local rewrites."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import claims_store
+from pipeline.claims_store import (
+    import_claims_workbook,
+    materialize_claims,
+    read_claims_store,
+    stored_claim_dates,
+    write_claims_months,
+)
+
+
+def month_results(ai_date: str, n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "Reference No.": [f"{ai_date}-{i}" for i in range(n)],
+            "EZKL Name": rng.choice(["HDEV5", "LS", "CRI"], n),
+            "Total Claimed Amount": rng.choice([100.0, 250.0, np.nan], n),
+            "claim": rng.integers(0, 2, n),
+            "AI_DATE": pd.Timestamp(ai_date),
+        }
+    )
+
+
+def old_section_9(all_claims: pd.DataFrame, results: pd.DataFrame) -> pd.DataFrame:
+    all_claims = all_claims[~all_claims["AI_DATE"].isin(results["AI_DATE"].unique())]
+    all_claims = pd.concat([all_claims, results], ignore_index=True)
+    return all_claims.sort_values(
+        by=["AI_DATE", "EZKL Name", "Total Claimed Amount"], ascending=False
+    ).reset_index(drop=True)
+
+
+def test_same_view_as_read_modify_write(tmp_path):
+    store = tmp_path / "store"
+    expected = pd.DataFrame(columns=month_results("2025-01-01", 1, 0).columns).astype({"AI_DATE": "datetime64[ns]"})
+    runs = [("2025-09-01", 0), ("2025-10-01", 1), ("2025-11-01", 2), ("2025-10-01", 3)]  # last one reruns October
+    for ai_date, seed in runs:
+        results = month_results(ai_date, 40, seed)
+        expected = old_section_9(expected, results)
+        write_claims_months(results, store, verbose=False)
+
+    assert stored_claim_dates(store) == ["2025-11-01", "2025-10-01", "2025-09-01"]
+    pd.testing.assert_frame_equal(read_claims_store(store), expected, check_dtype=False)
+
+
+def test_rewrite_touches_one_partition(tmp_path):
+    store = tmp_path / "store"
+    write_claims_months(pd.concat([month_results("2025-09-01", 5, 0), month_results("2025-10-01", 5, 1)]), store, verbose=False)
+    september = sorted(p.name for p in store.glob("ai_date=2025-09-01*"))
+
+    report = write_claims_months(month_results("2025-10-01", 3, 2), store, verbose=False)
+    assert report.to_dict("records") == [{"ai_date": "2025-10-01", "rows_before": 5, "rows_after": 3}]
+    assert sorted(p.name for p in store.glob("ai_date=2025-09-01*")) == september
+    # One data file per partition, old versions removed
+    assert len(list(store.glob("ai_date=2025-10-01.*.parquet"))) == 1
+    assert len(read_claims_store(store, dates=["2025-10-01"])) == 3
+
+
+def test_failed_write_keeps_previous_version(tmp_path, monkeypatch):
+    store = tmp_path / "store"
+    write_claims_months(month_results("2025-10-01", 5, 0), store, verbose=False)
+
+    def crash(*args, **kwargs):
+        raise OSError("share went away")
+
+    monkeypatch.setattr(claims_store, "write_snapshot", crash)
+    with pytest.raises(OSError):
+        write_claims_months(month_results("2025-10-01", 2, 1), store, verbose=False)
+    assert len(read_claims_store(store)) == 5
+
+
+def test_import_and_materialize(tmp_path):
+    legacy = pd.concat([month_results("2025-09-01", 4, 0), month_results("2025-10-01", 4, 1)], ignore_index=True)
+    legacy.to_excel(tmp_path / "AI_validated_claims.xlsx", index=False)
+
+    store = tmp_path / "store"
+    import_claims_workbook(tmp_path / "AI_validated_claims.xlsx", store, verbose=False)
+    with pytest.raises(ValueError):
+        import_claims_workbook(tmp_path / "AI_validated_claims.xlsx", store, verbose=False)
+
+    all_claims, paths = materialize_claims(store, tmp_path / "view.xlsx", formats=("xlsx", "parquet"))
+    assert len(all_claims) == 8
+    assert list(all_claims["AI_DATE"].drop_duplicates()) == [pd.Timestamp("2025-10-01"), pd.Timestamp("2025-09-01")]
+    assert [p.suffix for p in paths] == [".xlsx", ".parquet"]
+    assert len(pd.read_excel(paths[0])) == 8
@@ -0,0 +1,87 @@
+"""Equivalence of the columnar date decoders with the scalar originals."""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.date_normalize import (
+    clean_vehicle_mfd,
+    clean_vehicle_mfd_column,
+    convert_to_date,
+    convert_to_date_column,
+)
+
+SERIAL_VALUES = [
+    45000, 45000.7, -5, 0, True, np.nan, None, "45000", "４５０００", "2023/04", "2023/4", "2023/13",
+    "abc", "", pd.Timestamp("2023-04-01"), np.int64(45000),
+]
+MFD_VALUES = [
+    2018, 2018.0, 2018.6, "2018", " 2019/5 ", "2019/05", "2019/13", "May 2020", "２０１８", "abc", "",
+    pd.Timestamp("2020-03-15"), datetime(2021, 7, 1, 8, 30), np.nan, None,
+]
+
+
+def scalar_reference(values: pd.Series, func) -> pd.Series:
+    """The scalar function applied per value, as a datetime64[ns] column."""
+    return pd.Series([func(v) for v in values], index=values.index, dtype="datetime64[ns]")
+
+
+def random_values(pool: list, n_rows: int, seed: int) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    values = np.empty(len(pool), dtype=object)
+    values[:] = pool
+    return pd.Series(values[rng.integers(0, len(pool), n_rows)], index=rng.permutation(n_rows) + 10, dtype=object)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_convert_to_date_column_matches_scalar(seed):
+    s = random_values(SERIAL_VALUES, 1_000, seed)
+    pd.testing.assert_series_equal(convert_to_date_column(s), scalar_reference(s, convert_to_date))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_clean_vehicle_mfd_column_matches_scalar(seed):
+    s = random_values(MFD_VALUES, 1_000, seed)
+    pd.testing.assert_series_equal(clean_vehicle_mfd_column(s), scalar_reference(s, clean_vehicle_mfd))
+
+
+@pytest.mark.parametrize(
+    "s",
+    [
+        pd.Series([45000, 44000, 0]),
+        pd.Series([45000.5, np.nan]),
+        pd.Series(["45000", "2023/04", None], dtype="str"),
+        pd.Series(pd.to_datetime(["2023-01-01", None])),
+    ],
+    ids=["int", "float", "str", "datetime"],
+)
+def test_convert_to_date_typed_columns(s):
+    pd.testing.assert_series_equal(convert_to_date_column(s), scalar_reference(s.astype(object), convert_to_date))
+
+
+@pytest.mark.parametrize(
+    "s",
+    [
+        pd.Series([2018, 2020]),
+        pd.Series([2018.0, np.nan]),
+        pd.Series(["2018", "2019/05", None], dtype="str"),
+        pd.Series(pd.to_datetime(["2023-01-01", None])),
+    ],
+    ids=["int", "float", "str", "datetime"],
+)
+def test_clean_vehicle_mfd_typed_columns(s):
+    pd.testing.assert_series_equal(clean_vehicle_mfd_column(s), scalar_reference(s.astype(object), clean_vehicle_mfd))
+
+
+def test_dates_outside_datetime64_ns_become_nat():
+    # Documented difference: the scalar versions return the out-of-range date,
+    # the columnar versions keep datetime64[ns] and give NaT instead
+    assert convert_to_date(1_000_000) == datetime(4637, 11, 26)
+    assert convert_to_date_column(pd.Series([1_000_000, 45000], dtype=object)).isna().tolist() == [True, False]
+
+    for year in (3000, "3000", 1500):
+        assert clean_vehicle_mfd(year).year == int(year)
+    mfd = clean_vehicle_mfd_column(pd.Series([3000, "3000", 1500, 2018], dtype=object))
+    assert mfd.isna().tolist() == [True, True, True, False]
@@ -0,0 +1,175 @@
+"""Excel snapshot cache: invalidation, mixed-type round trip, pushed-down filters and projection."""
+
+import json
+import os
+from datetime import date, time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.excel_cache import (
+    FILTER_OPS,
+    apply_selection,
+    lookup_cached_sheet,
+    read_excel_cached,
+    read_snapshot,
+    write_snapshot,
+)
+
+
+def snapshot_round_trip(df: pd.DataFrame, tmp_path, columns=None, filters=None) -> pd.DataFrame:
+    parquet_path, manifest_path = tmp_path / "sheet.parquet", tmp_path / "sheet.json"
+    write_snapshot(df, parquet_path, manifest_path, {})
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    return read_snapshot(parquet_path, manifest, columns, filters)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "PS_Database.xlsx"
+    pd.DataFrame({"Bosch Parts No.": ["0261500001", "0258030002"], "Amount": [100, 250]}).to_excel(path, index=False)
+    return path
+
+
+def test_cache_hit_while_the_workbook_is_unchanged(workbook, tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = read_excel_cached(workbook, cache_dir=cache_dir, verbose=False)
+    cached, _ = lookup_cached_sheet(workbook, cache_dir=cache_dir, verbose=False)
+    pd.testing.assert_frame_equal(cached, first)
+
+
+def test_touched_file_with_same_content_is_still_a_hit(workbook, tmp_path):
+    cache_dir = tmp_path / "cache"
+    read_excel_cached(workbook, cache_dir=cache_dir, verbose=False)
+    manifest_path = next(cache_dir.glob("*.json"))
+
+    stat = workbook.stat()
+    os.utime(workbook, (stat.st_atime, stat.st_mtime + 60))
+    cached, fingerprint = lookup_cached_sheet(workbook, cache_dir=cache_dir, verbose=False)
+    assert cached is not None
+    # sha256 was needed to decide; the manifest now carries the new mtime
+    assert "sha256" in fingerprint
+    assert json.loads(manifest_path.read_text(encoding="utf-8"))["mtime"] == stat.st_mtime + 60
+
+
+def test_changed_content_invalidates(workbook, tmp_path):
+    cache_dir = tmp_path / "cache"
+    read_excel_cached(workbook, cache_dir=cache_dir, verbose=False)
+
+    stat = workbook.stat()
+    pd.DataFrame({"Bosch Parts No.": ["0445110003"], "Amount": [999]}).to_excel(workbook, index=False)
+    os.utime(workbook, (stat.st_atime, stat.st_mtime + 60))
+    assert lookup_cached_sheet(workbook, cache_dir=cache_dir, verbose=False)[0] is None
+    assert read_excel_cached(workbook, cache_dir=cache_dir, verbose=False)["Amount"].tolist() == [999]
+
+
+def test_sha256_mismatch_invalidates(workbook, tmp_path):
+    cache_dir = tmp_path / "cache"
+    read_excel_cached(workbook, cache_dir=cache_dir, verbose=False)
+    manifest_path = next(cache_dir.glob("*.json"))
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+
+    # Same stat → trusted without hashing; stat changed → the hash decides
+    manifest["sha256"] = "0" * 64
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+    assert lookup_cached_sheet(workbook, cache_dir=cache_dir, verbose=False)[0] is not None
+    manifest["size"] += 1
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+    assert lookup_cached_sheet(workbook, cache_dir=cache_dir, verbose=False)[0] is None
+
+
+def test_read_options_are_part_of_the_key(workbook, tmp_path):
+    cache_dir = tmp_path / "cache"
+    read_excel_cached(workbook, cache_dir=cache_dir, verbose=False)
+    assert lookup_cached_sheet(workbook, cache_dir=cache_dir, verbose=False, dtype={"Amount": float})[0] is None
+
+
+def test_mixed_object_columns_round_trip(tmp_path):
+    values = [1, 1.0, "1", pd.Timestamp("2023-04-01 12:30"), True, date(2023, 4, 1), time(8, 15), None, np.nan, "2023/04"]
+    df = pd.DataFrame(
+        {
+            "Customer Parts No.": pd.Series(values, dtype=object),
+            "Vehicle MFD": pd.Series([2019, "2019/05", np.nan, 2020.0, "x"] * 2, dtype=object),
+            "Amount": np.arange(10, dtype=float),
+        }
+    )
+    restored = snapshot_round_trip(df, tmp_path)
+
+    assert list(restored.columns) == list(df.columns)
+    assert restored.dtypes.equals(df.dtypes)
+    for column in ["Customer Parts No.", "Vehicle MFD"]:
+        for got, expected in zip(restored[column], df[column]):
+            if pd.isna(expected):
+                assert pd.isna(got)
+            else:
+                assert type(got) is type(expected) and got == expected, (column, got, expected)
+    pd.testing.assert_series_equal(restored["Amount"], df["Amount"])
+
+
+# ============================================================
+# PUSHED-DOWN FILTERS AND PROJECTION
+# ============================================================
+
+def filter_frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 400
+    sap = pd.Series(pd.Timestamp("2020-11-01") + pd.to_timedelta(rng.integers(0, 200, n) * 7, unit="D"))
+    sap[rng.random(n) < 0.1] = pd.NaT
+    return pd.DataFrame(
+        {
+            "OEM Name": pd.Series(rng.choice(["日産", "トヨタ", "マツダ", None], n)),
+            "Key No.": pd.Series(rng.choice(["M", "A", "B"], n), dtype=object),
+            "Amount": rng.choice([100, 250, 999, 5], n),
+            "Ratio": rng.choice([0.5, 1.0, np.nan], n),
+            "SAP Date": sap,
+            # Mixed column: only string (in)equality is pushed down
+            "Customer Parts No.": pd.Series(rng.choice(np.array([12345, "12345", "A1", 7.5, np.nan], dtype=object), n)),
+        }
+    )
+
+
+FILTER_CASES = [
+    ("OEM Name", "日産"),
+    ("Key No.", "M"),
+    ("Amount", 250),
+    ("Ratio", 0.5),
+    ("SAP Date", pd.Timestamp("2022-01-01")),
+    ("Customer Parts No.", "12345"),
+    ("Customer Parts No.", 12345),
+]
+
+
+# Ordering filters only on numeric / date columns (text ordering is not used)
+ORDERED_COLUMNS = ("Amount", "Ratio", "SAP Date")
+
+
+@pytest.mark.parametrize(
+    "column, value, op",
+    [(column, value, op) for column, value in FILTER_CASES for op in FILTER_OPS
+     if column in ORDERED_COLUMNS or op not in ("<", "<=", ">", ">=")],
+)
+def test_filters_match_pandas_mask(tmp_path, column, value, op):
+    df = filter_frame()
+    if op in ("in", "not in"):
+        value = [value, df[column].dropna().iloc[-1]]
+    filters = [(column, op, value)]
+
+    got = snapshot_round_trip(df, tmp_path, filters=filters)
+    expected = apply_selection(df, filters=filters)
+    pd.testing.assert_frame_equal(got, expected)
+
+
+def test_and_filters_and_projection(tmp_path):
+    df = filter_frame()
+    filters = [("OEM Name", "==", "日産"), ("Key No.", "!=", "M"), ("SAP Date", ">=", pd.Timestamp("2021-01-01"))]
+    columns = ["SAP Date", "Amount"]
+
+    got = snapshot_round_trip(df, tmp_path, columns=columns, filters=filters)
+    assert list(got.columns) == columns
+    pd.testing.assert_frame_equal(got, apply_selection(df, columns, filters))
+    assert len(got) > 0
+
+    assert list(snapshot_round_trip(df, tmp_path, columns=["Ratio"]).columns) == ["Ratio"]
+    with pytest.raises(KeyError):
+        snapshot_round_trip(df, tmp_path, columns=["Nope"])
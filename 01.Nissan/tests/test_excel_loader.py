@@ -0,0 +1,160 @@
+"""Manifest loader: Excel engine choice, column pruning, pools started from a script."""
+
+import importlib.util
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from pipeline import excel_loader
+from pipeline.excel_loader import load_excel_manifest, pick_excel_engine
+
+
+@pytest.fixture
+def no_calamine(monkeypatch):
+    real_find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        excel_loader.importlib.util,
+        "find_spec",
+        lambda name, *args: None if name == "python_calamine" else real_find_spec(name, *args),
+    )
+
+
+def test_engine_falls_back_to_openpyxl_without_calamine(no_calamine):
+    assert pick_excel_engine() == "openpyxl"
+    assert pick_excel_engine("calamine") == "calamine"
+
+
+def test_engine_prefers_calamine_when_installed(monkeypatch):
+    monkeypatch.setattr(excel_loader.importlib.util, "find_spec", lambda name, *args: object())
+    assert pick_excel_engine() == "calamine"
+    # pandas < 2.2 has no calamine engine
+    monkeypatch.setattr(excel_loader.pd, "__version__", "2.1.4")
+    assert pick_excel_engine() == "openpyxl"
+
+
+def test_load_without_calamine_prunes_columns(no_calamine, tmp_path):
+    path = tmp_path / "status.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"参照番号": ["N1", "N2"], "状態": ["却下", "受理"], "備考": ["a", "b"]}).to_excel(
+            writer, sheet_name="Nissan", index=False
+        )
+        pd.DataFrame({"JP": ["参照番号", "状態", "備考"], "EN": ["Reference No.", "Status", "Note"]}).to_excel(
+            writer, sheet_name="Translation", index=False
+        )
+    specs = [
+        {"name": "obj", "path": path, "sheet_name": "Nissan", "drop_columns": ["Note"],
+         "translation": {"sheet": "obj_translation", "from": "JP", "to": "EN"}},
+        {"name": "obj_translation", "path": path, "sheet_name": "Translation"},
+    ]
+    frames, report = load_excel_manifest(specs, executor="serial", verbose=False)
+    assert set(report["source"]) == {"openpyxl"}
+    assert list(frames["obj"].columns) == ["参照番号", "状態"]
+
+
+
+@pytest.mark.parametrize("cache", [False, True], ids=["uncached", "no-cache-dir"])
+def test_specs_of_one_sheet_share_a_parse(tmp_path, monkeypatch, cache):
+    path = tmp_path / "PS_Database.xlsx"
+    ps = pd.DataFrame(
+        {"OEM Name": ["日産", "他社", "日産"], "EZKL Name": ["LS", "CRI", "HDEV5"], "Division": ["P", "CC", "P"]}
+    )
+    with pd.ExcelWriter(path) as writer:
+        ps.to_excel(writer, sheet_name="PS_Data", index=False)
+        ps.to_excel(writer, sheet_name="Other", index=False)
+    parses = []
+    real_parse = pd.ExcelFile.parse
+
+    def counting_parse(self, *args, **kwargs):
+        parses.append(kwargs["sheet_name"])
+        return real_parse(self, *args, **kwargs)
+
+    monkeypatch.setattr(pd.ExcelFile, "parse", counting_parse)
+
+    ps_spec = {"path": path, "sheet_name": "PS_Data", "drop_columns": ["Division"], "cache": cache}
+    specs = [
+        {**ps_spec, "name": "ps_ezkl", "columns": ["EZKL Name"]},
+        {**ps_spec, "name": "ps_nissan", "filters": [("OEM Name", "==", "日産")]},
+        {**ps_spec, "name": "ps_all"},
+        {"name": "other", "path": path, "sheet_name": "Other"},
+    ]
+    frames, report = load_excel_manifest(specs, cache_dir=None, executor="serial", verbose=False)
+
+    assert parses == ["PS_Data", "Other"]
+    assert frames["ps_ezkl"]["EZKL Name"].tolist() == ["LS", "CRI", "HDEV5"]
+    assert frames["ps_nissan"]["EZKL Name"].tolist() == ["LS", "HDEV5"]
+    assert list(frames["ps_all"].columns) == ["OEM Name", "EZKL Name"]
+    assert frames["ps_all"] is not frames["ps_ezkl"] and len(frames["ps_all"]) == 3
+    assert list(report["rows"]) == [3, 2, 3, 3]
+
+# ============================================================
+# SCRIPT-STYLE ENTRY POINTS
+# ============================================================
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Workers are started with spawn (the Windows default) and re-import the
+# script as __mp_main__; a top-level load would then run again in every worker
+SCRIPT_HEADER = """
+import multiprocessing
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, {root!r})
+from pipeline.excel_loader import load_excel_manifest
+
+multiprocessing.set_start_method("spawn", force=True)
+print("module body ran in", multiprocessing.current_process().name, flush=True)
+SPECS = [
+    {{"name": "new", "path": Path({tmp!r}) / "new.xlsx"}},
+    {{"name": "burden", "path": Path({tmp!r}) / "burden.xlsx"}},
+]
+"""
+
+
+def run_script(tmp_path, body: str) -> subprocess.CompletedProcess:
+    for name in ("new", "burden"):
+        pd.DataFrame({"Reference No.": [f"{name}-1", f"{name}-2"]}).to_excel(tmp_path / f"{name}.xlsx", index=False)
+    script = tmp_path / "monthly_run.py"
+    script.write_text(
+        SCRIPT_HEADER.format(root=str(PROJECT_ROOT), tmp=str(tmp_path)) + textwrap.dedent(body), encoding="utf-8"
+    )
+    return subprocess.run([sys.executable, str(script)], cwd=tmp_path, capture_output=True, text=True, timeout=120)
+
+
+def test_default_executor_is_safe_at_module_top_level(tmp_path):
+    result = run_script(
+        tmp_path,
+        """
+        frames, report = load_excel_manifest(SPECS, verbose=False)
+        print("loaded", sorted(frames), flush=True)
+        """,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.count("module body ran") == 1
+    assert "loaded ['burden', 'new']" in result.stdout
+
+
+def test_process_executor_behind_main_guard(tmp_path):
+    result = run_script(
+        tmp_path,
+        """
+        def main():
+            frames, report = load_excel_manifest(SPECS, executor="process", max_workers=2, verbose=False)
+            print("loaded", sorted(frames), flush=True)
+
+
+        if __name__ == "__main__":
+            main()
+        """,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "loaded ['burden', 'new']" in result.stdout
+    # Workers re-imported the module body but did not load again
+    assert result.stdout.count("module body ran") > 1
+    assert result.stdout.count("loaded") == 1
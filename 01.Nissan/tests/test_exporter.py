@@ -0,0 +1,77 @@
+"""Exports: streaming xlsx matches to_excel; atomic writes; template alignment."""
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import exporter
+from pipeline.exporter import align_to_template, align_to_template_reference, export_table, write_table
+
+
+@pytest.fixture
+def results():
+    return pd.DataFrame(
+        {
+            "Reference No.": ["RAB001", "RAB002", None],
+            "EZKL Name": pd.Categorical(["HDEV5", None, "LS"]),
+            "Total Claimed Amount": [1.5, np.nan, 3.0],
+            "claim": [1, 0, 1],
+            "AI_DATE": pd.to_datetime(["2025-11-01", None, "2025-11-01"]),
+            "判定.1": [True, False, True],
+        }
+    )
+
+
+def test_xlsx_same_cells_as_to_excel(tmp_path, results):
+    results.to_excel(tmp_path / "pandas.xlsx", index=False)
+    write_table(results, tmp_path / "stream.xlsx")
+    pd.testing.assert_frame_equal(pd.read_excel(tmp_path / "stream.xlsx"), pd.read_excel(tmp_path / "pandas.xlsx"))
+
+
+def test_export_formats(tmp_path, results):
+    paths = export_table(results, tmp_path / "out" / "results.xlsx", formats=("xlsx", "parquet", "csv"))
+    assert [p.name for p in paths] == ["results.xlsx", "results.parquet", "results.csv"]
+    assert not list((tmp_path / "out").glob("*.tmp"))
+
+    pd.testing.assert_frame_equal(pd.read_parquet(paths[1]), results)
+    csv = pd.read_csv(paths[2], encoding="utf-8-sig")
+    assert list(csv.columns) == list(results.columns)
+
+    with pytest.raises(ValueError):
+        export_table(results, tmp_path / "results.xlsx", formats=("json",))
+
+
+@pytest.mark.parametrize("default", [np.nan, "", 0])
+def test_align_matches_reference(tmp_path, results, default):
+    template = tmp_path / "template.xlsx"
+    pd.DataFrame(columns=["AI_DATE", "判定.1", "Subpart", "claim", "Reference No."]).to_excel(template, index=False)
+    df = results.drop(columns=["判定.1"]).set_index(pd.Index([0, 0, 1]))
+    df["extra"] = 1
+    mapping = {"判定.1": "claim"}
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        aligned = align_to_template(df, template, column_mapping=mapping, default_value=default)
+    pd.testing.assert_frame_equal(aligned, align_to_template_reference(df.copy(), template, mapping, default))
+    assert "判定.1" not in df.columns
+
+
+def test_template_header_cached_per_version(tmp_path, monkeypatch):
+    template = tmp_path / "template.xlsx"
+    pd.DataFrame(columns=["a", "b"]).to_excel(template, index=False)
+    reads = []
+    read_excel = pd.read_excel
+    monkeypatch.setattr(exporter.pd, "read_excel", lambda *a, **k: reads.append(a) or read_excel(*a, **k))
+
+    assert exporter.template_columns(template) == ["a", "b"]
+    assert exporter.template_columns(template) == ["a", "b"]
+    assert len(reads) == 1
+
+    pd.DataFrame(columns=["a", "b", "c"]).to_excel(template, index=False)
+    stat = template.stat()
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert exporter.template_columns(template) == ["a", "b", "c"]
+    assert len(reads) == 2
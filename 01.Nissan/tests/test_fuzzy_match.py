@@ -0,0 +1,47 @@
+"""Batched pair scoring vs per-row fuzz.ratio, and the persistent score cache."""
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz
+
+from pipeline.fuzzy_match import is_similar_reference, load_pair_scores, pair_scores, save_pair_scores
+
+
+def synthetic_pairs(n_rows: int, seed: int = 0) -> tuple[pd.Series, pd.Series]:
+    rng = np.random.default_rng(seed)
+    a = rng.choice(["high pressure pump", "Injection Valve", "o-ring", "unassigned", "nan", "", "Rail"], n_rows)
+    b = rng.choice(["high pressure pump", "injection valve", "o-ring", "unknown", "rail"], n_rows)
+    return pd.Series(a, dtype=object), pd.Series(b, dtype=object)
+
+
+def test_scores_match_row_wise_ratio():
+    a, b = synthetic_pairs(3000)
+    scores = {}
+    out = pair_scores(a, b, scores)
+
+    assert out.tolist() == [fuzz.ratio(x.lower(), y.lower()) for x, y in zip(a, b)]
+    assert ((out >= 90) == np.array([is_similar_reference(x, y) for x, y in zip(a, b)])).all()
+    assert len(scores) == len(set(zip(a, b)))
+
+
+def test_cache_round_trip_skips_known_pairs(tmp_path):
+    path = tmp_path / "scores.parquet"
+    a, b = synthetic_pairs(500)
+    scores = {}
+    first = pair_scores(a, b, scores)
+    save_pair_scores(scores, path)
+
+    cached = load_pair_scores(path)
+    assert cached == scores
+    # Poisoned cached score proves the cached value is used, not recomputed
+    pair = (a[0], b[0])
+    cached[pair] = -1.0
+    again = pair_scores(a, b, cached)
+    assert (again[(a == a[0]) & (b == b[0])] == -1.0).all()
+    assert (again[~((a == a[0]) & (b == b[0]))] == first[~((a == a[0]) & (b == b[0]))]).all()
+
+
+def test_missing_cache_and_empty_input(tmp_path):
+    assert load_pair_scores(tmp_path / "none.parquet") == {}
+    assert load_pair_scores(None) == {}
+    assert pair_scores(pd.Series([], dtype=object), pd.Series([], dtype=object)).size == 0
@@ -0,0 +1,89 @@
+"""Equivalence of the vectorized 6.1 duplicate resolution with the original logic."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.nissan_prep import resolve_duplicates, resolve_duplicates_reference
+
+
+def synthetic_duplicates(n_rows: int, seed: int) -> pd.DataFrame:
+    """PS-like rows with many duplicated Objection IDs / amounts / SAP Dates."""
+    rng = np.random.default_rng(seed)
+    n_ids = max(n_rows // 2, 1)
+    ids = pd.Series([f"N{i:07d}" for i in rng.integers(0, n_ids, n_rows)], dtype=object)
+    ids[rng.random(n_rows) < 0.03] = np.nan
+
+    sap = pd.Series(
+        pd.to_datetime("2021-01-01") + pd.to_timedelta(rng.integers(0, 40, n_rows) * 30, unit="D")
+    )
+    sap[rng.random(n_rows) < 0.03] = pd.NaT
+
+    return pd.DataFrame(
+        {
+            "Reference No.": [f"R{i}" for i in range(n_rows)],
+            "Objection ID": ids,
+            "Total Claimed Amount": rng.choice([100.0, 250.0, 250.0, 999.5, np.nan], n_rows),
+            "SAP Date": sap,
+            "Status": rng.choice(["却下", "受理", "申請中", None], n_rows, p=[0.3, 0.3, 0.05, 0.35]),
+            "EZKL Name": rng.choice(["HDEV5", "CRI", "EKPT"], n_rows),
+        },
+        index=rng.permutation(n_rows) + 1000,  # merges upstream may leave any index
+    )
+
+
+def assert_same_rows(result: pd.DataFrame, expected: pd.DataFrame) -> None:
+    """
+    Same rows, order, index and values. The reference's extra merge
+    re-infers the dtype of an all-missing Status column (object → str),
+    so dtypes are only compared on the randomized frames.
+    """
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_resolve_duplicates_matches_reference(seed):
+    df = synthetic_duplicates(2_000, seed)
+    pd.testing.assert_frame_equal(resolve_duplicates(df), resolve_duplicates_reference(df))
+
+
+@pytest.mark.parametrize(
+    "statuses, expected_rows",
+    [
+        (["却下", "受理"], 1),   # conflicting statuses → earliest SAP Date only
+        (["却下", None], 1),     # missing status always conflicts
+        ([None, None], 1),
+        (["却下", "却下"], 2),   # same status → both kept
+    ],
+)
+def test_two_row_conflicts(statuses, expected_rows):
+    df = pd.DataFrame(
+        {
+            "Objection ID": ["N0000001", "N0000001"],
+            "Total Claimed Amount": [100.0, 200.0],
+            "SAP Date": pd.to_datetime(["2023-02-01", "2023-01-01"]),
+            "Status": statuses,
+        }
+    )
+    result = resolve_duplicates(df)
+    assert_same_rows(result, resolve_duplicates_reference(df))
+    assert len(result) == expected_rows
+
+
+def test_three_rows_are_not_a_conflict():
+    df = pd.DataFrame(
+        {
+            "Objection ID": ["N0000001"] * 3,
+            "Total Claimed Amount": [100.0, 200.0, 300.0],
+            "SAP Date": pd.to_datetime(["2023-03-01", "2023-02-01", "2023-01-01"]),
+            "Status": ["却下", "受理", None],
+        }
+    )
+    result = resolve_duplicates(df)
+    assert_same_rows(result, resolve_duplicates_reference(df))
+    assert len(result) == 3
+
+
+def test_empty_frame():
+    df = synthetic_duplicates(10, 0).iloc[0:0]
+    assert_same_rows(resolve_duplicates(df), resolve_duplicates_reference(df))
@@ -0,0 +1,120 @@
+"""Equivalence of the Nissan preparation helpers (EZKL lookups, Vehicle MFD fill) with their row-wise originals."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.date_normalize import clean_vehicle_mfd_column
+from pipeline.nissan_prep import (
+    build_mode_lookup,
+    count_pairs,
+    fill_vehicle_mfd_reference,
+    get_most_common_ezkl,
+    impute_vehicle_mfd,
+    mode_lookup_from_counts,
+)
+
+
+# ============================================================
+# EZKL LOOKUPS
+# ============================================================
+
+def synthetic_ezkl_table(n_rows: int, seed: int) -> pd.DataFrame:
+    """Prefix → EZKL rows with ties, missing prefixes and missing EZKL names."""
+    rng = np.random.default_rng(seed)
+    prefixes = pd.Series(rng.choice(np.array([f"02615{i:02d}" for i in range(30)] + [None], dtype=object), n_rows))
+    ezkl = pd.Series(rng.choice(np.array(["HDEV5", "HDEV6", "LS", "CRI", "EKPT", None], dtype=object), n_rows))
+    return pd.DataFrame({"Bosch Parts No. Prefix": prefixes, "EZKL Name": ezkl})
+
+
+def reference_lookup(df: pd.DataFrame) -> dict:
+    """get_most_common_ezkl for every non-missing prefix (None when it has no EZKL)."""
+    out = {}
+    for prefix in df["Bosch Parts No. Prefix"].dropna().unique():
+        try:
+            out[prefix] = get_most_common_ezkl(df, prefix)
+        except KeyError:  # all EZKL names missing → empty mode()
+            out[prefix] = None
+    return out
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_mode_lookup_matches_get_most_common_ezkl(seed):
+    df = synthetic_ezkl_table(300, seed)
+    lookup = build_mode_lookup(df, "Bosch Parts No. Prefix", "EZKL Name")
+    for prefix, expected in reference_lookup(df).items():
+        assert lookup.get(prefix) == expected, prefix
+    assert None not in lookup and not any(pd.isna(k) for k in lookup)
+
+
+def test_ties_and_missing_values():
+    df = pd.DataFrame(
+        {
+            "Bosch Parts No. Prefix": ["A", "A", "B", "B", "B", "C", None],
+            "EZKL Name": ["LS", "CRI", "LS", None, None, None, "HDEV5"],
+        }
+    )
+    lookup = build_mode_lookup(df, "Bosch Parts No. Prefix", "EZKL Name")
+    # Tie → smallest value, like Series.mode()[0]; missing values never win
+    assert lookup == {"A": "CRI", "B": "LS"}
+    assert get_most_common_ezkl(df, "A") == "CRI"
+    assert get_most_common_ezkl(df, "B") == "LS"
+    assert df["Bosch Parts No. Prefix"].map(lookup).isna().tolist() == [False] * 5 + [True, True]
+
+
+def test_counts_of_disjoint_slices_add_up():
+    df = synthetic_ezkl_table(600, 1)
+    counts = pd.concat([count_pairs(part, "Bosch Parts No. Prefix", "EZKL Name") for part in (df[:250], df[250:])])
+    assert mode_lookup_from_counts(counts, "Bosch Parts No. Prefix", "EZKL Name") == build_mode_lookup(
+        df, "Bosch Parts No. Prefix", "EZKL Name"
+    )
+
+
+# ============================================================
+# 6.2 VEHICLE MFD IMPUTATION
+# ============================================================
+
+def synthetic_vehicle_dates(n_rows: int, seed: int) -> pd.DataFrame:
+    """Vehicle MFD as typed in the sheets (years, yyyy/mm, dates, junk, missing) + the fill sources."""
+    rng = np.random.default_rng(seed)
+    mfd_pool = np.empty(8, dtype=object)
+    mfd_pool[:] = [2018, "2019/05", pd.Timestamp("2020-03-01"), "abc", 3000, np.nan, None, np.nan]
+
+    def dates(missing_share):
+        values = pd.Series(pd.Timestamp("2018-01-01") + pd.to_timedelta(rng.integers(0, 2_000, n_rows), unit="D"))
+        values[rng.random(n_rows) < missing_share] = pd.NaT
+        return values.to_numpy()
+
+    return pd.DataFrame(
+        {
+            "Vehicle MFD": mfd_pool[rng.integers(0, len(mfd_pool), n_rows)],
+            "Vehicle Registration Date": dates(0.4),
+            "Vehicle Failure Date": dates(0.2),
+        },
+        index=rng.permutation(n_rows) + 50,
+    )
+
+
+@pytest.mark.parametrize("registration_as_year", [False, True])
+@pytest.mark.parametrize("mean_lag", [pd.Timedelta(days=420), pd.NaT])
+@pytest.mark.parametrize("seed", range(3))
+def test_impute_matches_row_by_row_fill(seed, mean_lag, registration_as_year):
+    df = synthetic_vehicle_dates(1_000, seed)
+    expected = clean_vehicle_mfd_column(fill_vehicle_mfd_reference(df, mean_lag, registration_as_year))
+    result = impute_vehicle_mfd(df, mean_lag, registration_as_year)
+    pd.testing.assert_series_equal(result, expected, check_names=False)
+
+
+def test_impute_fill_order_and_unparseable_values():
+    df = pd.DataFrame(
+        {
+            "Vehicle MFD": pd.Series([np.nan, np.nan, np.nan, "abc", 3000], dtype=object),
+            "Vehicle Registration Date": pd.to_datetime(["2019-05-20", None, None, "2019-05-20", "2019-05-20"]),
+            "Vehicle Failure Date": pd.to_datetime(["2021-01-10", "2021-01-10", None, "2021-01-10", "2021-01-10"]),
+        }
+    )
+    lag = pd.Timedelta(days=10)
+    assert impute_vehicle_mfd(df, lag).tolist()[:2] == [pd.Timestamp("2019-05-20"), pd.Timestamp("2020-12-31")]
+    assert impute_vehicle_mfd(df, lag, registration_as_year=True)[0] == pd.Timestamp("2019-01-01")
+    # Nothing to fill from; present but unparseable / out-of-range (year 3000) stays NaT
+    assert impute_vehicle_mfd(df, lag).isna().tolist() == [False, False, True, True, True]
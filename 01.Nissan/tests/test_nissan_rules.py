@@ -0,0 +1,135 @@
+"""Equivalence of the column-wise Nissan rules with the row-wise originals."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.nissan_rules import (
+    CLAIM_FLAGS,
+    CLAIM_RULES,
+    HDEV5_FIXED_BR_PARTS,
+    HDEV5_H_TYPE_PARTS,
+    apply_claim_rules,
+    check_burden_ratio,
+    check_burden_ratio_frame,
+    generate_claim,
+    generate_claim_DPR,
+)
+
+
+# ============================================================
+# 7.7 BURDEN RATIO CONTRACT
+# ============================================================
+
+def synthetic_br_rows(n_rows: int, seed: int, text_ratios: bool = False) -> pd.DataFrame:
+    """Objection rows hitting every branch of check_burden_ratio (incl. TypeError cases)."""
+    rng = np.random.default_rng(seed)
+
+    def pick(values):
+        return pd.Series(rng.choice(np.array(values, dtype=object), n_rows), dtype=object)
+
+    parts = [*HDEV5_H_TYPE_PARTS, *HDEV5_FIXED_BR_PARTS, "166001VA0D", "226A05CA0A"]
+    # 2021-06-30 12:00 falls in the gap between the two H-type MFD ranges
+    dates = pd.to_datetime(
+        ["2020-01-01", "2021-06-30", "2021-06-30 12:00", "2021-07-01", "2023-05-01", None], format="ISO8601"
+    )
+    ratios = [2.4, 3.0, 3.4, 3.5, 5, 5.5, 6, 6.5, 25, 30, 49.5, 50, 50.5, np.nan]
+
+    burden_ratio = pick(ratios + ["5.5", "50%"]) if text_ratios else pd.Series(rng.choice(ratios, n_rows))
+    return pd.DataFrame(
+        {
+            "EZKL Name": pick(["HDEV5", "HDEV5", "LUFT", "LS", "CRI", None]),
+            # Non-strings in the string columns raise TypeError in the original
+            "Customer Parts No.": pick([*parts, f"X{parts[0]}Y", 166001, np.nan]),
+            "類別区分": pick(["HA1", "HZ", "K12", "", 7, np.nan]),
+            "Vehicle MFD": pd.Series(rng.choice(dates, n_rows)),
+            "Burden Ratio": burden_ratio,
+            "Standard Burden Ratio": pick([25, 30, 50, 5.5, "5.5\n(一部50%)", np.nan]),
+            "Current Burden Ratio": pick([25, 30, 50, 5.5, np.nan]),
+            "New BR Date": pd.Series(rng.choice(dates, n_rows)),
+            "SAP Date": pd.Series(rng.choice(dates, n_rows)),
+        },
+        index=rng.permutation(n_rows) + 100,
+    )
+
+
+def reference_br_check(df: pd.DataFrame) -> pd.DataFrame:
+    """check_burden_ratio through the script's TypeError → 0 wrapper, plus the row flag it sets."""
+    contract, irregular = [], []
+    for _, row in df.iterrows():
+        row = row.copy()
+        try:
+            contract.append(check_burden_ratio(row))
+        except TypeError:
+            contract.append(0)
+        irregular.append(int(row.get("Irregular case BR", 0) == 1))
+    return pd.DataFrame({"BR Contract": contract, "Irregular case BR": irregular}, index=df.index)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("text_ratios", [False, True])
+def test_br_contract_matches_row_wise_check(seed, text_ratios):
+    df = synthetic_br_rows(1_500, seed, text_ratios)
+    pd.testing.assert_frame_equal(check_burden_ratio_frame(df), reference_br_check(df))
+
+
+def test_br_contract_branches():
+    df = pd.DataFrame(
+        {
+            "EZKL Name": ["HDEV5", "HDEV5", "HDEV5", "HDEV5", "LS", "LS"],
+            "Customer Parts No.": ["166001VA0A", "166001VA0A", "166005CA0A", "166001VA0D", "x", "x"],
+            "類別区分": ["HA", "HA", "K", "K", "K", "K"],
+            "Vehicle MFD": pd.to_datetime(["2021-01-01", "2022-01-01", None, None, None, None]),
+            "Burden Ratio": [3.0, 3.0, 5.5, 99.0, 30.0, 30.0],
+            "Standard Burden Ratio": [np.nan] * 4 + [30.0, 30.0],
+            "Current Burden Ratio": [np.nan] * 4 + [25.0, 25.0],
+            "New BR Date": pd.to_datetime([None] * 4 + ["2024-01-01", "2024-01-01"]),
+            "SAP Date": pd.to_datetime([None] * 4 + ["2023-12-01", "2024-02-01"]),
+        }
+    )
+    result = check_burden_ratio_frame(df)
+    assert result["BR Contract"].tolist() == [0, 1, 0, 0, 0, 1]
+    assert result["Irregular case BR"].tolist() == [0, 0, 0, 1, 0, 0]
+
+
+# ============================================================
+# 8.1 CLAIM DECISION
+# ============================================================
+
+def synthetic_flags(n_rows: int, seed: int) -> pd.DataFrame:
+    """Flag columns with 0 / 1, NaN and values other than 1 (not raised)."""
+    rng = np.random.default_rng(seed)
+    columns = ["Right_Month", "High Denied Paid Ratio", *CLAIM_FLAGS]
+    return pd.DataFrame(
+        {column: rng.choice([0, 0, 0, 1, 2, np.nan], n_rows) for column in columns},
+        index=rng.permutation(n_rows) + 100,
+    )
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_claim_rules_match_row_wise_decisions(seed):
+    df = synthetic_flags(2_000, seed)
+    result = apply_claim_rules(df)
+    assert list(result.columns) == ["claim", "claim_DPR"]
+    pd.testing.assert_series_equal(result["claim"], df.apply(generate_claim, axis=1).astype(int), check_names=False)
+    pd.testing.assert_series_equal(result["claim_DPR"], df.apply(generate_claim_DPR, axis=1).astype(int), check_names=False)
+
+
+def test_claim_rule_labels_on_request():
+    df = pd.DataFrame(
+        {
+            "Right_Month": [1, 0, 0, 0],
+            "High Denied Paid Ratio": [0, 1, 0, 0],
+            **{flag: [1, 1, 0, 0] for flag in CLAIM_FLAGS},
+        }
+    )
+    df.loc[2, "BR Contract"] = 1
+    result = apply_claim_rules(df, CLAIM_RULES, explain=True)
+    assert result["claim"].tolist() == [0, 0, 1, 0]
+    assert result["claim_DPR"].tolist() == [0, 1, 1, 0]
+    assert result["claim_rule"].tolist() == [
+        "blocked: Right_Month", "blocked: High Denied Paid Ratio", "flag: BR Contract", "no rule"
+    ]
+    assert result["claim_DPR_rule"].tolist() == [
+        "blocked: Right_Month", "flag: TCA Outlier EZKL", "flag: BR Contract", "no rule"
+    ]
@@ -0,0 +1,81 @@
+"""Synthetic Nissan inputs: production schema, loader-equivalent slices, PS history cleaning."""
+
+import pandas as pd
+import pytest
+
+from pipeline.excel_loader import load_excel_manifest
+from pipeline.nissan_synthetic import generate_nissan_sheets, manifest_inputs, write_nissan_workbooks
+from pipeline.ps_history import clean_ps_history
+
+CLAIM_DATE = pd.Timestamp("2025-11-01")
+
+MANIFEST = [
+    {"name": "ps_ezkl", "path": r"\\share\PS_Database.xlsm", "sheet_name": "PS_Data", "header": 1, "cache": False,
+     "columns": ["Bosch Parts No.", "EZKL Name"]},
+    {"name": "ps_nissan", "path": r"\\share\PS_Database.xlsm", "sheet_name": "PS_Data", "header": 1, "cache": False,
+     "drop_columns": ["Product Code(DS)", "Product Code", "Sequence No.", "c3", "Division"],
+     "filters": [("OEM Name", "==", "日産"), ("Key No.", "!=", "M"), ("SAP Date", ">=", pd.Timestamp("2021-01-01"))]},
+    {"name": "ps_translation", "path": r"\\share\PS_Database.xlsm", "sheet_name": "Translation", "header": 0, "cache": False},
+    {"name": "new", "path": r"\\share\nissan_2511_GB.xlsx", "sheet_name": "For_sap_C", "header": 0, "cache": False},
+    {"name": "new_translation", "path": r"\\share\translated_forAI.xlsx", "sheet_name": 0, "header": 0, "cache": False},
+    {"name": "burden", "path": r"\\share\burden.xlsx", "sheet_name": "2021", "header": 4, "cache": False},
+    {"name": "obj", "path": r"\\share\status.xlsx", "sheet_name": "Nissan", "header": 1, "cache": False},
+    {"name": "obj_translation", "path": r"\\share\status.xlsx", "sheet_name": "Translation", "header": 0, "cache": False},
+]
+
+
+@pytest.fixture(scope="module")
+def sheets():
+    return generate_nissan_sheets(CLAIM_DATE, n_ps_rows=3_000, n_new_claims=300, random_state=7)
+
+
+def test_deterministic_and_production_columns(sheets):
+    again = generate_nissan_sheets(CLAIM_DATE, n_ps_rows=3_000, n_new_claims=300, random_state=7)
+    for name, df in sheets.items():
+        assert df.equals(again[name]), name
+
+    new = sheets["new"]
+    for column in ["Reference No.", "Bosch Parts No.", "Burden Ratio", "類別区分", "Parts Distinction", "期間", "EDP Date"]:
+        assert column in new.columns
+    assert set(new["Parts Distinction"]) == {1, 2}
+    assert new["Reference No."].str.len().eq(10).all()
+    # Mostly this month's letter (J = November) in the 3rd character
+    assert new["Reference No."].str[2].eq("J").mean() > 0.9
+    assert "5.5\n(一部50%)" in set(sheets["burden"]["現状負担率\nBosch"])
+    assert set(sheets["obj"]["Status"]) == {"却下", "受理", "申請中"}
+
+
+def test_manifest_inputs_match_the_loader(sheets, tmp_path):
+    inputs = manifest_inputs(sheets, MANIFEST)
+    assert set(inputs["ps_nissan"]["OEM Name"]) == {"日産"}
+    assert list(inputs["ps_ezkl"].columns) == ["Bosch Parts No.", "EZKL Name"]
+    assert "Division" not in inputs["ps_nissan"].columns
+
+    local = write_nissan_workbooks(sheets, MANIFEST, tmp_path)
+    assert sorted(p.name for p in tmp_path.glob("*.xlsx")) == [
+        "PS_Database.xlsx", "burden.xlsx", "nissan_2511_GB.xlsx", "status.xlsx", "translated_forAI.xlsx"
+    ]
+    loaded, _ = load_excel_manifest(local, executor="serial", verbose=False)
+    for name in ["ps_nissan", "new", "burden", "obj"]:
+        assert loaded[name].shape == inputs[name].shape, name
+        assert list(loaded[name].columns) == list(inputs[name].columns), name
+
+
+def test_ps_history_cleans_with_objection_statuses(sheets):
+    inputs = manifest_inputs(sheets, MANIFEST)
+    burden = inputs["burden"].rename(
+        columns={"製品名\n（EZKL名称）": "EZKL Name", "基準負担率\nBosch": "Standard Burden Ratio",
+                 "現状負担率\nBosch": "Current Burden Ratio", "適用開始日": "New BR Date"}
+    )
+    obj = inputs["obj"][inputs["obj"]["Status"].isin(["却下", "受理"])].copy()
+    obj["Objection ID"] = obj["Reference No."].str[:8]
+
+    _, cleaned = clean_ps_history(
+        inputs["ps_nissan"], burden[burden["メーカー"] == "NISSAN"], obj, CLAIM_DATE,
+        history_start=pd.Timestamp("2021-01-01"), replacements={"HDEV": "HDEV5", "EKP/T": "EKPT"},
+        excluded_parts_names=["CP1H recall"], drop_columns=[],
+    )
+    assert len(cleaned) > 0
+    assert cleaned["SAP Date"].max() < CLAIM_DATE
+    assert set(cleaned["Status"].dropna()) == {"Accepted", "Rejected"}
+    assert not cleaned["EZKL Name"].isin(["HDEV", "EKP/T", "HDEV5(S)"]).any()
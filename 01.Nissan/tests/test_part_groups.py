@@ -0,0 +1,49 @@
+"""Prefix index for part groups vs the original sorted-prefix scan."""
+
+import numpy as np
+import pandas as pd
+
+from pipeline.part_groups import (
+    assign_group,
+    assign_group_reference,
+    assign_groups,
+    build_prefix_index,
+    prefix_duplicates,
+)
+
+PATTERNS = [
+    ("17520", "High Pressure Pump"),
+    ("1752", "Pump family"),
+    ("175206", "Pump special"),
+    ("A6600", "INJECTOR"),
+    ("17520", "Supporting Disc"),
+    ("1", "Anything with 1"),
+]
+
+
+def test_duplicate_prefix_reported_and_last_wins(capsys):
+    index = build_prefix_index(PATTERNS)
+
+    assert "'17520' listed 2x (conflicting groups" in capsys.readouterr().out
+    assert prefix_duplicates(PATTERNS) == {"17520": ["High Pressure Pump", "Supporting Disc"]}
+    assert assign_group("17520HY00A", index) == "Supporting Disc"
+    assert list(index) == [6, 5, 4, 1]
+
+
+def test_column_matches_reference():
+    rng = np.random.default_rng(0)
+    stems = ["17520", "1752", "175206", "A6600", "1", "2", "", "A66", "17"]
+    values = [rng.choice(stems) + "".join(rng.choice(list("0123456789AB"), rng.integers(0, 5))) for _ in range(2000)]
+    values += [17520.0, 175206, None, np.nan]
+    s = pd.Series(values, dtype=object)
+
+    index = build_prefix_index(PATTERNS, verbose=False)
+    expected = [assign_group_reference(v, dict(PATTERNS)) for v in values]
+
+    assert assign_groups(s, index).tolist() == expected
+    assert [assign_group(v, index) for v in values] == expected
+
+
+def test_empty_column():
+    out = assign_groups(pd.Series([], dtype=object), build_prefix_index(PATTERNS, verbose=False))
+    assert out.empty
@@ -0,0 +1,51 @@
+"""Columnar part-number normalizers vs the scalar originals (.apply)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.part_numbers import (
+    normalize_bosch_part_no,
+    normalize_bosch_part_no_column,
+    normalize_nissan_bosch_pn,
+    normalize_nissan_bosch_pn_column,
+)
+
+PAIRS = [
+    (normalize_bosch_part_no, normalize_bosch_part_no_column),
+    (normalize_nissan_bosch_pn, normalize_nissan_bosch_pn_column),
+]
+
+CASES = {
+    "mixed": pd.Series(
+        [
+            " 0 986 435 021.0 ", "0986435021", 986435021.0, 986435021, -0.0, 0.0, 1e16, 1.5,
+            "12.0.0", "A-B.C 1234-5678KB", "１２３", None, np.nan, pd.NaT, True, np.float32(0.1),
+            np.int64(7), pd.Timestamp("2024-01-01"), "x\n.0", "ab.0 ", "", " ", "0986-435-021T00",
+        ],
+        dtype=object,
+    ),
+    "float": pd.Series([1.0, 2.5, np.nan, -0.0, 123456789012.0]),
+    "int": pd.Series([1, 2, 3]),
+    "str": pd.Series(["a .0", None, "b"]),
+    "all_missing": pd.Series([None, np.nan], dtype=object),
+    "empty": pd.Series([], dtype=object),
+}
+
+
+@pytest.mark.parametrize("scalar, column", PAIRS)
+@pytest.mark.parametrize("case", list(CASES))
+def test_column_matches_apply(scalar, column, case):
+    s = CASES[case]
+    memo = {}
+    expected = s.apply(scalar)
+
+    pd.testing.assert_series_equal(column(s, memo), expected)
+    # Second call is served from the memo
+    pd.testing.assert_series_equal(column(s, memo), expected)
+
+
+def test_memo_is_keyed_by_text():
+    memo = {}
+    normalize_bosch_part_no_column(pd.Series([986435021.0, "0986435021"], dtype=object), memo)
+    assert memo == {"986435021.0": "986435021", "0986435021": "0986435021"}
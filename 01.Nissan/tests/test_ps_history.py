@@ -0,0 +1,139 @@
+"""Incremental PS history store: same rows and statistics as a full re-clean."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.nissan_prep import build_mode_lookup
+from pipeline.nissan_synthetic import generate_nissan_sheets, manifest_inputs
+from pipeline.ps_history import clean_ps_history, ps_history_aggregates, read_ps_history, update_ps_history
+
+HISTORY_START = pd.Timestamp("2021-01-01")
+SETTINGS = {
+    "history_start": HISTORY_START,
+    "replacements": {"HDEV": "HDEV5", "EKP/T": "EKPT"},
+    "excluded_parts_names": ["CP1H recall"],
+    "drop_columns": [],
+}
+
+MANIFEST = [
+    {"name": "ps_nissan", "path": r"\\share\PS_Database.xlsm", "sheet_name": "PS_Data", "header": 1,
+     "drop_columns": ["Product Code(DS)", "Product Code", "Sequence No.", "c3", "Division"],
+     "filters": [("OEM Name", "==", "日産"), ("Key No.", "!=", "M"), ("SAP Date", ">=", HISTORY_START)]},
+    {"name": "burden", "path": r"\\share\burden.xlsx", "sheet_name": "2021", "header": 4},
+    {"name": "obj", "path": r"\\share\status.xlsx", "sheet_name": "Nissan", "header": 1},
+]
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    """Raw PS Nissan rows, Nissan burden table and decided objection statuses (as in 4.1–4.4)."""
+    loaded = manifest_inputs(
+        generate_nissan_sheets(pd.Timestamp("2025-11-01"), n_ps_rows=4_000, n_new_claims=50, random_state=3), MANIFEST
+    )
+    burden = loaded["burden"].rename(
+        columns={"製品名\n（EZKL名称）": "EZKL Name", "基準負担率\nBosch": "Standard Burden Ratio",
+                 "現状負担率\nBosch": "Current Burden Ratio", "適用開始日": "New BR Date"}
+    )
+    obj = loaded["obj"][loaded["obj"]["Status"].isin(["却下", "受理"])].copy()
+    obj["Objection ID"] = obj["Reference No."].str[:8]
+    return loaded["ps_nissan"], burden[burden["メーカー"] == "NISSAN"].reset_index(drop=True), obj
+
+
+def update(store, raw, burden, obj, claim_date):
+    return update_ps_history(raw, burden, obj, claim_date, store, verbose=False, **SETTINGS)
+
+
+def assert_store_matches_full_clean(store, raw, burden, obj, claim_date):
+    """Stored rows = clean_ps_history on all rows (order aside); aggregates = direct pandas."""
+    df_stage_4, expected = clean_ps_history(raw, burden, obj, claim_date, **SETTINGS)
+
+    def by_reference(df):
+        return df.sort_values("Reference No.", kind="stable").reset_index(drop=True)
+
+    stored = read_ps_history(store)
+    assert len(stored) == len(expected) > 0
+    pd.testing.assert_frame_equal(by_reference(stored), by_reference(expected), check_dtype=False)
+
+    aggregates = ps_history_aggregates(store)
+    tca = expected["Total Claimed Amount"]
+    for suffix, mask in (("", slice(None)), ("_dom", expected["Domestic/Overseas"] == "1"),
+                         ("_over", expected["Domestic/Overseas"] == "2")):
+        assert aggregates[f"mean_amount{suffix}"] == pytest.approx(tca[mask].mean(), rel=1e-12, nan_ok=True)
+        assert aggregates[f"std_amount{suffix}"] == pytest.approx(tca[mask].std(), rel=1e-9, nan_ok=True)
+    lag = expected["Vehicle Failure Date"].mean() - expected["Vehicle Registration Date"].mean()
+    # pandas averages datetimes through float64; the store sums exact integers
+    assert abs(aggregates["mean_reg_fal_time"] - lag) < pd.Timedelta(microseconds=1)
+    assert aggregates["ezkl_by_prefix"] == build_mode_lookup(df_stage_4, "Bosch Parts No. Prefix", "EZKL Name")
+
+    # 7.3 ratio table, computed the original way
+    claim_status = expected["Status"].replace({"Accepted": "Denied Claim", "Rejected": "Denied Paid Claim"})
+    claim_status = claim_status.fillna("Paid Claim")
+    counts = {
+        name: expected.loc[claim_status == status].groupby("EZKL Name").size().reset_index(name=name)
+        for name, status in (("Denied Paid Count", "Denied Paid Claim"), ("Denied Count", "Denied Claim"))
+    }
+    ratio_df = pd.merge(counts["Denied Paid Count"], counts["Denied Count"], on="EZKL Name", how="outer").fillna(0)
+    ratio_df["Denied Paid Ratio"] = ratio_df["Denied Paid Count"] / (ratio_df["Denied Count"] + ratio_df["Denied Paid Count"])
+    pd.testing.assert_frame_equal(
+        aggregates["ratio_df"].sort_values("EZKL Name").reset_index(drop=True),
+        ratio_df.sort_values("EZKL Name").reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_first_build(inputs, tmp_path):
+    raw, burden, obj = inputs
+    claim_date = pd.Timestamp("2025-11-01")
+    report = update(tmp_path, raw, burden, obj, claim_date)
+    assert set(report["status"]) == {"added"}
+    assert report["sap_month"].max() == "2025-10"
+    assert_store_matches_full_clean(tmp_path, raw, burden, obj, claim_date)
+
+
+def test_new_month_and_no_op_rerun(inputs, tmp_path):
+    raw, burden, obj = inputs
+    september = raw[raw["SAP Date"] < pd.Timestamp("2025-09-01")]
+    update(tmp_path, september, burden, obj, pd.Timestamp("2025-10-01"))
+    n_months = len(update(tmp_path, september, burden, obj, pd.Timestamp("2025-10-01")))
+    assert n_months == 0  # nothing changed → nothing rewritten
+
+    claim_date = pd.Timestamp("2025-11-01")
+    report = update(tmp_path, raw, burden, obj, claim_date)
+    assert {"2025-09", "2025-10"} <= set(report.loc[report["status"] == "added", "sap_month"])
+    # Older months are only touched by Objection IDs that got new rows
+    assert len(report) < raw["SAP Date"].dt.strftime("%Y-%m").nunique() / 2
+    assert_store_matches_full_clean(tmp_path, raw, burden, obj, claim_date)
+
+    assert update(tmp_path, raw, burden, obj, claim_date).empty
+
+
+def test_status_change_rewrites_its_months_only(inputs, tmp_path):
+    raw, burden, obj = inputs
+    claim_date = pd.Timestamp("2025-11-01")
+    update(tmp_path, raw, burden, obj, claim_date)
+
+    changed = obj.copy()
+    flipped = changed.index[:5]
+    changed.loc[flipped, "Status"] = changed.loc[flipped, "Status"].map({"却下": "受理", "受理": "却下"})
+    report = update(tmp_path, raw, burden, changed, claim_date)
+
+    touched = raw.loc[raw["Reference No."].str[:8].isin(changed.loc[flipped, "Objection ID"]), "SAP Date"]
+    assert set(report["sap_month"]) <= set(touched.dt.strftime("%Y-%m"))
+    assert set(report["status"]) == {"rewritten"}
+    assert_store_matches_full_clean(tmp_path, raw, burden, changed, claim_date)
+
+
+def test_removed_rows(inputs, tmp_path):
+    raw, burden, obj = inputs
+    claim_date = pd.Timestamp("2025-11-01")
+    update(tmp_path, raw, burden, obj, claim_date)
+
+    # Drop a whole month and a few single rows elsewhere
+    months = raw["SAP Date"].dt.strftime("%Y-%m")
+    rng = np.random.default_rng(0)
+    removed = (months == "2023-03").to_numpy() | (rng.random(len(raw)) < 0.01)
+    report = update(tmp_path, raw[~removed], burden, obj, claim_date)
+
+    assert report.loc[report["sap_month"] == "2023-03", "status"].tolist() == ["removed"]
+    assert_store_matches_full_clean(tmp_path, raw[~removed], burden, obj, claim_date)
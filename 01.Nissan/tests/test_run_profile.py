@@ -0,0 +1,56 @@
+"""Run profile: per-stage records, summary table and the saved run log."""
+
+import json
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.run_profile import profile_stage, profile_summary, save_profile
+
+
+def _profile():
+    profile = []
+    with profile_stage(profile, "fast", rows_in=10) as record:
+        record["rows_out"] = 5
+    with profile_stage(profile, "slow", rows_in=5) as record:
+        sum(range(200_000))
+        record["rows_out"] = 5
+    return profile
+
+
+def test_records_and_summary():
+    profile = _profile()
+    assert [r["stage"] for r in profile] == ["fast", "slow"]
+    for record in profile:
+        assert record["wall_s"] >= 0 and record["cpu_s"] >= 0
+        assert "peak_rss_mb" in record or "rss_mb" not in record
+
+    summary = profile_summary(profile)
+    assert list(summary["stage"]) == ["slow", "fast", "TOTAL"]
+    assert summary["wall_s"].iloc[-1] == pytest.approx(summary["wall_s"].iloc[:-1].sum())
+
+
+def test_python_memory_peak():
+    profile = []
+    tracemalloc.start()
+    try:
+        with profile_stage(profile, "alloc"):
+            block = np.ones(2_000_000)  # 16 MB
+            del block
+    finally:
+        tracemalloc.stop()
+    assert profile[0]["py_peak_mb"] >= 15
+
+
+@pytest.mark.parametrize("suffix", [".json", ".parquet"])
+def test_save_profile(tmp_path, suffix):
+    path = save_profile(_profile(), tmp_path / f"run_log{suffix}", claim_date=pd.Timestamp("2025-11-01"))
+    if suffix == ".json":
+        table = pd.DataFrame(json.loads(path.read_text(encoding="utf-8")))
+    else:
+        table = pd.read_parquet(path)
+    assert list(table["stage"]) == ["fast", "slow"]
+    assert list(table["rows_out"]) == [5, 5]
+    assert set(table["claim_date"]) == {"2025-11-01T00:00:00"}
@@ -0,0 +1,46 @@
+"""Schema layer: dtype changes never change values; categorical merges stay categorical."""
+
+import numpy as np
+import pandas as pd
+
+from pipeline.nissan_rules import _str_mask
+from pipeline.schema import NISSAN_SCHEMA, apply_schema, union_categories
+
+
+def test_values_kept_and_mixed_columns_left_alone():
+    df = pd.DataFrame(
+        {
+            "EZKL Name": ["HDEV5", "LS", None, "HDEV5"],
+            "Customer Parts No.": ["166006RC1C", 1660061, None, "x"],
+            "Reference No.": pd.Series(["RAB001", "RAB002", None, "RAB004"], dtype=object),
+            "Domestic/Overseas": [1, 1.0, "1", None],
+            "Other": [1, 2, 3, 4],
+        }
+    )
+    out, report = apply_schema(df, NISSAN_SCHEMA, verbose=False)
+
+    assert isinstance(out["EZKL Name"].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_string_dtype(out["Reference No."].dtype)
+    assert out["Customer Parts No."].dtype == object
+    assert out["Domestic/Overseas"].dtype == object
+    assert out["Other"].dtype == df["Other"].dtype
+    pd.testing.assert_frame_equal(out.astype(object).where(out.notna(), None), df.astype(object).where(df.notna(), None))
+    assert list(report["column"]) == ["EZKL Name", "Domestic/Overseas", "Customer Parts No.", "Reference No."]
+    # Input frame untouched
+    assert df["EZKL Name"].dtype != "category"
+
+
+def test_union_categories_merge_on_codes():
+    left, _ = apply_schema(pd.DataFrame({"EZKL Name": ["A", "B", None]}), verbose=False)
+    right = pd.DataFrame({"EZKL Name": ["B", "C"], "v": [1, 2]})
+    left, right = union_categories([left, right], "EZKL Name")
+
+    merged = left.merge(right, on="EZKL Name", how="left")
+    assert isinstance(merged["EZKL Name"].dtype, pd.CategoricalDtype)
+    assert merged["v"].iloc[1] == 1
+    assert merged["v"].iloc[[0, 2]].isna().all()
+
+
+def test_str_mask_on_categorical():
+    s = pd.Series(["H1", 3, None, "x", np.nan], dtype=object)
+    assert (_str_mask(s.astype("category")) == _str_mask(s)).all()
@@ -0,0 +1,130 @@
+"""Stage graph: dependency order, cache reuse, code-change invalidation, concurrency."""
+
+import re
+import threading
+
+import pandas as pd
+import pytest
+
+from pipeline import part_numbers
+from pipeline.stage_graph import code_fingerprint, run_stages, stage_order
+
+CALLS = []
+FACTOR = 2
+
+
+def _load():
+    CALLS.append("load")
+    return pd.DataFrame({"a": [1, 2, 3]})
+
+
+def _scale(df):
+    CALLS.append("scale")
+    df["a"] = df["a"] * FACTOR
+    return df
+
+
+def _total(df):
+    CALLS.append("total")
+    return int(df["a"].sum())
+
+
+STAGES = [
+    {"name": "total", "func": _total, "inputs": ["scaled"], "outputs": ["total"]},
+    {"name": "scale", "func": _scale, "inputs": ["raw"], "outputs": ["scaled"]},
+    {"name": "load", "func": _load, "outputs": ["raw"]},
+]
+
+
+def test_order_and_validation():
+    assert [s["name"] for s in stage_order(STAGES)] == ["load", "scale", "total"]
+
+    cycle = [
+        {"name": "a", "func": _total, "inputs": ["y"], "outputs": ["x"]},
+        {"name": "b", "func": _total, "inputs": ["x"], "outputs": ["y"]},
+    ]
+    with pytest.raises(ValueError, match="Cycle"):
+        stage_order(cycle)
+    with pytest.raises(ValueError, match="no stage produces"):
+        stage_order(STAGES[:2])
+
+
+def test_cache_reuse_and_invalidation(tmp_path, monkeypatch):
+    CALLS.clear()
+    values, report = run_stages(STAGES, cache_dir=tmp_path, verbose=False)
+    assert values["total"] == 12
+    # Stage inputs are not changed in place
+    assert list(values["raw"]["a"]) == [1, 2, 3]
+    assert CALLS == ["load", "scale", "total"]
+
+    CALLS.clear()
+    values, report = run_stages(STAGES, cache_dir=tmp_path, verbose=False)
+    assert values["total"] == 12
+    assert CALLS == []
+    assert set(report["source"]) == {"cache"}
+
+    # A changed constant reruns the stage reading it and everything below
+    monkeypatch.setitem(globals(), "FACTOR", 3)
+    CALLS.clear()
+    values, report = run_stages(STAGES, cache_dir=tmp_path, verbose=False)
+    assert values["total"] == 18
+    assert CALLS == ["scale", "total"]
+    assert dict(zip(report["stage"], report["source"])) == {"load": "cache", "scale": "run", "total": "run"}
+
+
+def _part_numbers():
+    CALLS.append("part_numbers")
+    return part_numbers.normalize_bosch_part_no_column(pd.Series(["0261 520 1.0", "0261S02.00"]))
+
+
+def test_pattern_in_tracked_helper_reruns_stage(tmp_path, monkeypatch):
+    stages = [{"name": "part numbers", "func": _part_numbers, "outputs": ["pn"]}]
+    before = code_fingerprint(_part_numbers)
+    run_stages(stages, cache_dir=tmp_path, verbose=False)
+
+    # Edited normalization rule (compiled regex read by a helper of the helper)
+    monkeypatch.setattr(part_numbers, "_FLOAT_ARTIFACT", re.compile(r"\.0+\Z"))
+    assert code_fingerprint(_part_numbers) != before
+    CALLS.clear()
+    values, report = run_stages(stages, cache_dir=tmp_path, verbose=False)
+    assert CALLS == ["part_numbers"] and list(report["source"]) == ["run"]
+    assert values["pn"].tolist() == ["02615201", "0261S02"]
+
+    # Same pattern compiled again → same fingerprint, cache hit
+    monkeypatch.setattr(part_numbers, "_FLOAT_ARTIFACT", re.compile(r"\.0+\Z"))
+    CALLS.clear()
+    run_stages(stages, cache_dir=tmp_path, verbose=False)
+    assert CALLS == []
+
+
+def test_targets_and_profile(tmp_path):
+    CALLS.clear()
+    profile = []
+    values, _ = run_stages(STAGES, targets=["raw"], profile=profile, verbose=False)
+    assert CALLS == ["load"] and "total" not in values
+    assert [record["stage"] for record in profile] == ["load"]
+    assert profile[0]["rows_in"] == 0 and profile[0]["rows_out"] == 3
+
+
+def test_untracked_globals_ignored():
+    assert code_fingerprint(_scale) != code_fingerprint(_scale, untracked=("FACTOR",))
+
+
+def test_independent_stages_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def left():
+        barrier.wait()
+        return 1
+
+    def right():
+        barrier.wait()
+        return 2
+
+    stages = [
+        {"name": "left", "func": left, "outputs": ["l"]},
+        {"name": "right", "func": right, "outputs": ["r"]},
+        {"name": "sum", "func": lambda l, r: l + r, "outputs": ["s"]},
+    ]
+    values, _ = run_stages(stages, max_workers=2, verbose=False)
+    assert values["s"] == 3
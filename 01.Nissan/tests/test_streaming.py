@@ -0,0 +1,66 @@
+"""Streaming runner: same output as the in-memory pipeline, approximate median, bounded memory."""
+
+import tracemalloc
+
+import pandas as pd
+import pytest
+
+from pipeline.classifier import classify
+from pipeline.clean_normalize import clean_data
+from pipeline.feature_engineering import build_features
+from pipeline.load_data import load_synthetic_data
+from pipeline.streaming import iter_input_chunks, run_streaming_pipeline, streaming_median
+
+
+@pytest.fixture(scope="module")
+def raw():
+    df = load_synthetic_data(30_001)
+    # Negative values exercise the clipping before the median
+    df.loc[::97, "mileage_km"] = -5
+    return df
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_exact_mode_matches_in_memory_pipeline(raw, tmp_path, suffix):
+    source = tmp_path / f"claims{suffix}"
+    if suffix == ".csv":
+        raw.to_csv(source, index=False)
+    else:
+        raw.to_parquet(source, index=False, row_group_size=4_000)
+
+    report = run_streaming_pipeline(source, tmp_path / f"scored{suffix}", chunk_size=2_500, verbose=False)
+    expected = classify(build_features(clean_data(raw)))
+    scored = pd.read_csv(tmp_path / "scored.csv") if suffix == ".csv" else pd.read_parquet(tmp_path / "scored.parquet")
+
+    assert report["rows"] == len(raw)
+    assert report["chunks"] > 10
+    assert report["usage_threshold"] == expected["usage_intensity"].median()
+    pd.testing.assert_frame_equal(scored, expected, check_dtype=False)
+
+
+def test_chunks_are_bounded_and_approx_median_is_close(raw, tmp_path):
+    source = tmp_path / "claims.parquet"
+    raw.to_parquet(source, index=False)
+    assert max(len(chunk) for chunk in iter_input_chunks(source, 1_000)) <= 1_000
+
+    median = build_features(clean_data(raw))["usage_intensity"].median()
+    approx = streaming_median(source, chunk_size=1_000, exact=False)
+    assert approx == pytest.approx(median, rel=0.01)
+
+
+def test_peak_memory_follows_chunk_size(tmp_path):
+    raw = load_synthetic_data(400_000)
+    source = tmp_path / "claims.parquet"
+    raw.to_parquet(source, index=False, row_group_size=20_000)
+    del raw
+
+    tracemalloc.start()
+    try:
+        classify(build_features(clean_data(pd.read_parquet(source))))
+        in_memory_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        run_streaming_pipeline(source, tmp_path / "scored.parquet", chunk_size=20_000, verbose=False)
+        streaming_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert streaming_peak < in_memory_peak / 4
@@ -0,0 +1,64 @@
+"""Chunked synthetic generator: same rows for any chunk size / shard split / worker count."""
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pytest
+
+from pipeline import synthetic_data
+from pipeline.synthetic_data import (
+    SUBPARTS,
+    iter_synthetic_warranty_data,
+    synthetic_warranty_rows,
+    write_synthetic_warranty_dataset,
+)
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(synthetic_data, "RNG_BLOCK_ROWS", 1000)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 333, 1000, 2500, 10**6])
+def test_chunk_size_independent(small_blocks, chunk_size):
+    n_rows = 3001 if chunk_size > 1 else 20
+    full = synthetic_warranty_rows(0, n_rows, n_rows, random_state=7)
+    chunks = list(iter_synthetic_warranty_data(n_rows, chunk_size, random_state=7))
+
+    assert all(len(chunk) == chunk_size for chunk in chunks[:-1])
+    assert pd.concat(chunks).equals(full)
+    assert list(full.index) == list(range(n_rows))
+
+
+def test_shards_and_seeds(small_blocks):
+    n_rows = 3001
+    full = synthetic_warranty_rows(0, n_rows, n_rows)
+    shards = [synthetic_warranty_rows(start, start + 700, n_rows) for start in range(0, n_rows, 700)]
+    assert pd.concat(shards).equals(full)
+    assert not synthetic_warranty_rows(0, n_rows, n_rows, random_state=8).equals(full)
+
+
+def test_columns_and_lookup(small_blocks):
+    df = synthetic_warranty_rows(0, 5000, 5000)
+    reference = synthetic_data.generate_synthetic_warranty_data(n_rows=10)
+    assert list(df.columns) == list(reference.columns)
+    assert list(df["Claim_ID"].iloc[[0, -1]]) == ["CLM_000001", "CLM_005000"]
+    for group, subparts in df.groupby("Part_Group", observed=True)["Subpart_Code"]:
+        assert set(subparts) == set(SUBPARTS[group])
+
+
+def test_parallel_dataset(tmp_path):
+    n_rows = 3000
+    report = write_synthetic_warranty_dataset(
+        tmp_path / "ds", n_rows, shard_rows=700, chunk_size=300, max_workers=2, verbose=False
+    )
+    assert list(report["rows"]) == [700, 700, 700, 700, 200]
+
+    table = ds.dataset(tmp_path / "ds", format="parquet", partitioning="hive").to_table().to_pandas()
+    table = table.sort_values("Claim_ID").reset_index(drop=True)
+    expected = synthetic_warranty_rows(0, n_rows, n_rows)
+    assert (table["Claim_ID"].astype(str) == expected["Claim_ID"].astype(str)).all()
+    assert (table["Total_Cost"] == expected["Total_Cost"]).all()
+    assert (table["Claim_Month"].astype(str) == expected["Claim_Date"].dt.strftime("%Y-%m")).all()
+
+    with pytest.raises(FileExistsError):
+        write_synthetic_warranty_dataset(tmp_path / "ds", n_rows, verbose=False)
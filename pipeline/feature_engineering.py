@@ -1,10 +1,21 @@
 import pandas as pd
 
-def build_features(df: pd.DataFrame) -> pd.DataFrame:
-    """Feature engineering logic for demonstration."""
+def usage_intensity(df: pd.DataFrame) -> pd.Series:
+    """Mileage per month of vehicle age."""
+    return df["mileage_km"] / (df["vehicle_age_months"] + 1)
+
+
+def build_features(df: pd.DataFrame, usage_threshold: float | None = None) -> pd.DataFrame:
+    """
+    Feature engineering logic for demonstration.
+    - usage_threshold: is_high_usage cut-off; None → median of df (pass the
+      median of the whole dataset when df is one chunk of it)
+    """
     df = df.copy()
-    
-    df["usage_intensity"] = df["mileage_km"] / (df["vehicle_age_months"] + 1)
-    df["is_high_usage"] = df["usage_intensity"] > df["usage_intensity"].median()
+
+    df["usage_intensity"] = usage_intensity(df)
+    if usage_threshold is None:
+        usage_threshold = df["usage_intensity"].median()
+    df["is_high_usage"] = df["usage_intensity"] > usage_threshold
 
     return df
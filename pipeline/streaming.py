@@ -0,0 +1,225 @@
+"""
+Streaming runner: clean_data → build_features → classify over a CSV or
+Parquet input in bounded-memory chunks, output written chunk by chunk.
+
+Only the usage_intensity median in build_features needs the whole dataset.
+It is computed before the transform pass from the two columns it reads:
+- median="exact": a quantile sketch pass brackets the median, a second
+  pass keeps only the values inside the bracket (≈ 2 · MEDIAN_WINDOW of
+  the rows) and selects the exact median; the output equals the in-memory
+  pipeline
+- median="approx": the sketch pass only (rank error ≈ 1 / SKETCH_POINTS)
+- usage_threshold=...: a known cut-off, no statistics pass
+
+Peak memory follows chunk_size (plus the small sketch and bracket),
+not the dataset size.
+"""
+
+import argparse
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from pipeline.classifier import classify
+from pipeline.clean_normalize import clean_data
+from pipeline.feature_engineering import build_features, usage_intensity
+
+# Quantile points kept per chunk by the sketch
+SKETCH_POINTS = 1001
+
+# Half-width (share of rows) of the bracket around the median in the exact pass
+MEDIAN_WINDOW = 0.002
+
+USAGE_COLUMNS = ["mileage_km", "vehicle_age_months"]
+
+
+# ============================================================
+# INPUT / OUTPUT
+# ============================================================
+
+def iter_input_chunks(path, chunk_size: int = 500_000, columns=None) -> Iterator[pd.DataFrame]:
+    """
+    Yield the input in chunks of at most chunk_size rows.
+    - .csv → pandas chunked reader
+    - anything else → Parquet file or directory (hive partitions such as
+      Claim_Month=YYYY-MM/ become columns)
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    path = Path(path)
+    if path.suffix == ".csv":
+        with pd.read_csv(path, chunksize=chunk_size, usecols=columns) as reader:
+            yield from reader
+        return
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    for batch in dataset.to_batches(columns=columns, batch_size=chunk_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+class _ChunkWriter:
+    """Append chunks to a .csv (header once) or a Parquet file (schema of the first chunk)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._parquet = None
+        self._first = True
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.path.suffix == ".csv":
+            df.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=False)
+        else:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        self._first = False
+
+    def close(self) -> None:
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+# ============================================================
+# USAGE-INTENSITY MEDIAN
+# ============================================================
+
+def _usage_values(path, chunk_size: int) -> Iterator[np.ndarray]:
+    """usage_intensity of every chunk after clean_data (NaN dropped, as Series.median does)."""
+    for chunk in iter_input_chunks(path, chunk_size, columns=USAGE_COLUMNS):
+        values = usage_intensity(clean_data(chunk)).to_numpy(dtype=float)
+        yield values[~np.isnan(values)]
+
+
+def _sketch(path, chunk_size: int) -> tuple[np.ndarray, np.ndarray, int]:
+    """Per-chunk quantile points with their row weights; total non-missing rows."""
+    points, weights, n = [], [], 0
+    for values in _usage_values(path, chunk_size):
+        if not len(values):
+            continue
+        points.append(np.quantile(values, np.linspace(0, 1, min(SKETCH_POINTS, len(values)))))
+        weights.append(np.full(len(points[-1]), len(values) / len(points[-1])))
+        n += len(values)
+    if not n:
+        return np.array([]), np.array([]), 0
+    points, weights = np.concatenate(points), np.concatenate(weights)
+    order = np.argsort(points, kind="stable")
+    return points[order], weights[order], n
+
+
+def _sketch_quantile(points: np.ndarray, weights: np.ndarray, q: float) -> float:
+    cumulative = np.cumsum(weights)
+    return points[min(np.searchsorted(cumulative, q * cumulative[-1]), len(points) - 1)]
+
+
+def streaming_median(path, chunk_size: int = 500_000, exact: bool = True) -> float:
+    """
+    Median of usage_intensity over the whole input (after clean_data).
+    exact=False → sketch estimate; exact=True → bracket from the sketch,
+    then exact selection inside it (the bracket is widened and the pass
+    repeated in the rare case it misses the median).
+    """
+    points, weights, n = _sketch(path, chunk_size)
+    if not n:
+        return np.nan
+    if not exact:
+        return float(_sketch_quantile(points, weights, 0.5))
+
+    # 0-based ranks of the middle value(s), averaged like Series.median
+    ranks = [(n - 1) // 2, n // 2]
+    window = MEDIAN_WINDOW
+    while True:
+        low = _sketch_quantile(points, weights, 0.5 - window) if window < 0.5 else -np.inf
+        high = _sketch_quantile(points, weights, 0.5 + window) if window < 0.5 else np.inf
+        below, inside = 0, []
+        for values in _usage_values(path, chunk_size):
+            below += int((values < low).sum())
+            inside.append(values[(values >= low) & (values <= high)])
+        inside = np.concatenate(inside)
+        if below <= ranks[0] and ranks[1] < below + len(inside):
+            middle = np.partition(inside, [r - below for r in ranks])[[r - below for r in ranks]]
+            return float(middle.mean())
+        window *= 4
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+def run_streaming_pipeline(
+    input_path,
+    output_path,
+    chunk_size: int = 500_000,
+    median: str = "exact",
+    usage_threshold: float | None = None,
+    verbose: bool = True,
+) -> dict:
+    """
+    clean_data → build_features → classify chunk by chunk from input_path
+    (.csv or Parquet) to output_path (.csv, else one Parquet file).
+    - median: "exact" / "approx" is_high_usage cut-off (see module docstring),
+      ignored when usage_threshold is given
+    Returns a report: rows, chunks, usage_threshold, seconds.
+    """
+    if median not in ("exact", "approx"):
+        raise ValueError(f"median must be 'exact' or 'approx', got {median!r}")
+    began = time.perf_counter()
+    if usage_threshold is None:
+        usage_threshold = streaming_median(input_path, chunk_size, exact=median == "exact")
+    stats_seconds = time.perf_counter() - began
+
+    writer = _ChunkWriter(output_path)
+    rows = chunks = 0
+    try:
+        for chunk in iter_input_chunks(input_path, chunk_size):
+            scored = classify(build_features(clean_data(chunk), usage_threshold=usage_threshold))
+            writer.write(scored)
+            rows += len(scored)
+            chunks += 1
+    finally:
+        writer.close()
+
+    report = {
+        "rows": rows,
+        "chunks": chunks,
+        "usage_threshold": usage_threshold,
+        "median": median,
+        "stats_seconds": round(stats_seconds, 3),
+        "seconds": round(time.perf_counter() - began, 3),
+    }
+    if verbose:
+        print(
+            f"{rows} rows in {chunks} chunks, usage threshold {usage_threshold:.3f} ({median}), "
+            f"{report['seconds']:.1f} s → {output_path}"
+        )
+    return report
+
+
+def main(argv=None) -> None:
+    """CLI: python -m pipeline.streaming INPUT OUTPUT [--chunk-size N] [--median exact|approx]"""
+    parser = argparse.ArgumentParser(description="Score a large CSV / Parquet claims input in chunks.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--chunk-size", type=int, default=500_000)
+    parser.add_argument("--median", choices=["exact", "approx"], default="exact")
+    parser.add_argument("--usage-threshold", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    run_streaming_pipeline(
+        args.input,
+        args.output,
+        chunk_size=args.chunk_size,
+        median=args.median,
+        usage_threshold=args.usage_threshold,
+    )
+
+
+if __name__ == "__main__":
+    main()